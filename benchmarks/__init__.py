@@ -0,0 +1,7 @@
+"""
+Performance Benchmarks
+Standalone scripts that run against a throwaway test database
+
+Run from the project root, e.g.:
+    python -m benchmarks.cart_storage
+"""
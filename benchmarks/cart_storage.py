@@ -0,0 +1,85 @@
+"""
+Cart Storage Benchmark
+Compares per-request latency and database writes for each cart storage backend
+
+Usage:
+    python -m benchmarks.cart_storage [--requests 200] [--lines 5]
+"""
+
+import argparse
+from .utils import test_database, summarize, time_call, count_writes, print_table
+
+
+BACKENDS = [
+    'cart.storage.SessionCartStorage',
+    'cart.storage.SignedCookieCartStorage',
+    'cart.storage.CacheCartStorage',
+    'cart.storage.DatabaseCartStorage',
+]
+
+
+def run(requests, lines):
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+    from store.models import Category, Product
+
+    category = Category.objects.create(name='Benchmark')
+    products = [
+        Product.objects.create(
+            category=category,
+            name=f'Benchmark product {i}',
+            description='Benchmark',
+            price=10,
+            stock=10_000,
+        )
+        for i in range(lines)
+    ]
+    User.objects.create_user('bench', password='bench-password')
+
+    results = []
+    for backend in BACKENDS:
+        with override_settings(CART_STORAGE=backend):
+            client = Client()
+            if backend.endswith('DatabaseCartStorage'):
+                client.login(username='bench', password='bench-password')
+            for product in products:
+                client.post(f'/cart/add/{product.id}/', {'quantity': 1})
+
+            # A cart mutation followed by a cart page read, per request pair.
+            # The quantity alternates so every update really changes the cart.
+            product = products[0]
+            state = {'quantity': 1}
+
+            def cycle():
+                state['quantity'] = 3 - state['quantity']
+                client.post(f'/cart/update/{product.id}/', {'quantity': state['quantity']})
+                client.get('/cart/')
+
+            samples = time_call(cycle, repeat=requests)
+            with CaptureQueriesContext(connection) as queries:
+                cycle()
+
+        results.append({
+            'backend': backend.rsplit('.', 1)[-1],
+            **summarize(samples),
+            'queries': len(queries.captured_queries),
+            'db_writes': count_writes(queries.captured_queries),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='Timed update+view cycles per backend')
+    parser.add_argument('--lines', type=int, default=5, help='Number of cart lines')
+    args = parser.parse_args()
+
+    with test_database():
+        results = run(args.requests, args.lines)
+    print_table(results, ['backend', 'runs', 'mean_ms', 'p50_ms', 'p95_ms', 'queries', 'db_writes'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Checkout Benchmark
+Measures checkout (order placement) latency and query counts by cart size
+
+Usage:
+    python -m benchmarks.checkout [--runs 20] [--sizes 1 10 100]
+"""
+
+import argparse
+import json
+import time
+from .utils import test_database, summarize, print_table
+
+
+SHIPPING = {
+    'first_name': 'Bench',
+    'last_name': 'Mark',
+    'email': 'bench@example.com',
+    'phone': '5550100',
+    'address': '1 Benchmark Way',
+    'city': 'Testville',
+    'state': 'TS',
+    'postal_code': '00000',
+    'country': 'Nowhere',
+}
+
+
+def run(runs, sizes):
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from store.models import Category, Product
+
+    category = Category.objects.create(name='Benchmark')
+    products = Product.objects.bulk_create([
+        Product(
+            category=category,
+            name=f'Benchmark product {i}',
+            slug=f'benchmark-product-{i}',
+            description='Benchmark',
+            price=10,
+            stock=1_000_000,
+        )
+        for i in range(max(sizes))
+    ])
+    User.objects.create_user('bench', password='bench-password')
+
+    results = []
+    for size in sizes:
+        client = Client()
+        client.login(username='bench', password='bench-password')
+        client.post(
+            '/cart/batch/',
+            json.dumps({'operations': [
+                {'op': 'add', 'product_id': product.id, 'quantity': 1}
+                for product in products[:size]
+            ]}),
+            content_type='application/json',
+        )
+
+        def new_order():
+            # Forget the pending order so each run places a fresh one
+            session = client.session
+            session.pop('order_id', None)
+            session.save()
+
+        samples = []
+        for _ in range(runs):
+            new_order()
+            start = time.perf_counter()
+            client.post('/orders/checkout/', SHIPPING)
+            samples.append((time.perf_counter() - start) * 1000)
+
+        new_order()
+        with CaptureQueriesContext(connection) as queries:
+            client.post('/orders/checkout/', SHIPPING)
+        with CaptureQueriesContext(connection) as resubmit:
+            client.post('/orders/checkout/', SHIPPING)
+
+        results.append({
+            'lines': size,
+            **summarize(samples),
+            'queries': len(queries.captured_queries),
+            'resubmit_queries': len(resubmit.captured_queries),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help='Timed checkouts per cart size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100], help='Cart sizes (lines)')
+    args = parser.parse_args()
+
+    with test_database():
+        results = run(args.runs, args.sizes)
+    print_table(results, ['lines', 'runs', 'mean_ms', 'p50_ms', 'p95_ms', 'queries', 'resubmit_queries'])
+
+
+if __name__ == '__main__':
+    main()
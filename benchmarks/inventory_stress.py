@@ -0,0 +1,143 @@
+"""
+Inventory Stress Test
+Hammers stock reservation from many threads and checks nothing is oversold
+
+Every thread repeatedly reserves stock for its own pending orders against a
+small pool of scarce products. At the end the script verifies that:
+    - no product's stock went negative,
+    - the stock taken equals the quantity held by reservations,
+    - exactly the initial stock was sold when demand exceeds supply.
+It also reports reservation throughput.
+
+Runs on SQLite (a temporary file database) by default; set DATABASE_URL to
+a PostgreSQL database to run it there (a test database is created).
+
+Usage:
+    python -m benchmarks.inventory_stress [--threads 16] [--orders 50] [--stock 200]
+"""
+
+import argparse
+import sys
+import threading
+import time
+from .utils import test_database
+
+
+def run(threads, orders_per_thread, stock, products_count):
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, connection, connections
+    from django.db.models import Sum
+    from orders import inventory
+    from orders.models import Order, OrderItem, StockReservation
+    from store.models import Category, Product
+
+    category = Category.objects.create(name='Stress')
+    products = [
+        Product.objects.create(
+            category=category, name=f'Scarce {i}', description='Stress', price=1, stock=stock,
+        )
+        for i in range(products_count)
+    ]
+    user = User.objects.create_user('stress')
+
+    # One order per attempt; each wants one unit of every scarce product
+    orders = []
+    for _ in range(threads * orders_per_thread):
+        order = Order.objects.create(
+            user=user, first_name='S', last_name='T', email='s@example.com', phone='1',
+            address='a', city='c', state='s', postal_code='p', country='x', total_amount=0,
+        )
+        orders.append(order)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, price=1, quantity=1)
+        for order in orders for product in products
+    ])
+
+    counts = {'reserved': 0, 'rejected': 0, 'retries': 0}
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads)
+
+    def worker(batch):
+        start_barrier.wait()
+        try:
+            for order in batch:
+                while True:
+                    try:
+                        inventory.reserve(order)
+                        outcome = 'reserved'
+                    except inventory.InsufficientStock:
+                        outcome = 'rejected'
+                    except OperationalError:
+                        # SQLite "database is locked" under heavy contention
+                        with lock:
+                            counts['retries'] += 1
+                        continue
+                    break
+                with lock:
+                    counts[outcome] += 1
+        finally:
+            connections.close_all()
+
+    batches = [orders[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=worker, args=(batch,)) for batch in batches]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    held = dict(
+        StockReservation.objects.filter(status='held')
+        .values_list('product_id')
+        .annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total')
+    )
+    failures = []
+    for product in Product.objects.filter(id__in=[p.id for p in products]):
+        taken = stock - product.stock
+        if product.stock < 0:
+            failures.append(f'{product.name}: negative stock {product.stock}')
+        if taken != held.get(product.id, 0):
+            failures.append(f'{product.name}: took {taken} but reservations hold {held.get(product.id, 0)}')
+        if len(orders) >= stock and product.stock != 0:
+            failures.append(f'{product.name}: {product.stock} left although demand exceeded supply')
+
+    attempts = counts['reserved'] + counts['rejected']
+    return {
+        'database': connection.vendor,
+        'threads': threads,
+        'attempts': attempts,
+        'reserved': counts['reserved'],
+        'rejected': counts['rejected'],
+        'lock_retries': counts['retries'],
+        'seconds': round(elapsed, 3),
+        'reservations_per_sec': round(attempts / elapsed, 1) if elapsed else 0,
+        'failures': failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent worker threads')
+    parser.add_argument('--orders', type=int, default=50, help='Reservation attempts per thread')
+    parser.add_argument('--stock', type=int, default=200, help='Initial stock of each product')
+    parser.add_argument('--products', type=int, default=3, help='Scarce products per order')
+    args = parser.parse_args()
+
+    with test_database(file_backed=True):
+        result = run(args.threads, args.orders, args.stock, args.products)
+
+    failures = result.pop('failures')
+    for key, value in result.items():
+        print(f'{key:22} {value}')
+    if failures:
+        print('OVERSOLD:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('No overselling detected.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""
+Page Benchmark
+Latency, query count and peak memory of every store, cart, orders and accounts URL
+
+A throwaway test database is filled with benchmarks.seed at the requested
+scale, then each URL is driven through the Django test client. Store
+pages are requested anonymously; cart, orders and account pages as a
+logged-in customer with a few lines in the cart. Timed runs follow a
+short warm-up, so numbers reflect warm caches. The query count and the
+peak Python memory (tracemalloc) come from one extra request each.
+
+The payment POST is left out because it calls the payment gateway; see
+benchmarks.payment_throughput. The shared cache is cleared before the run.
+
+Results can be written to JSON (--output) and compared with an earlier run
+(--compare), e.g. one file per commit.
+
+Usage:
+    python -m benchmarks.pages [--runs 30] [--products 2000] [--orders 2000]
+        [--only store] [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from .checkout import SHIPPING
+from .utils import test_database, summarize, print_table
+
+
+# Lines in the logged-in customer's cart
+CART_LINES = 5
+
+
+class Scenario:
+    """
+    One request to benchmark
+
+    Args:
+        name: Label in the results, '<app>:<view>[ variant]'
+        method: 'get' or 'post'
+        path: URL path
+        data: Query or form data, or a callable returning it per request
+        content_type: Body content type for JSON posts
+        customer: Send the request as the logged-in customer
+        before: Optional untimed callable(client) run before every request
+    """
+
+    def __init__(self, name, method, path, data=None, content_type=None,
+                 customer=False, before=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.content_type = content_type
+        self.customer = customer
+        self.before = before
+
+    def request(self, client):
+        data = self.data() if callable(self.data) else self.data
+        extra = {'content_type': self.content_type} if self.content_type else {}
+        return getattr(client, self.method)(self.path, data, **extra)
+
+
+def git_commit():
+    """Return the current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_scenarios(customer, order, cart_products):
+    """Build the scenario list from seeded rows"""
+    from django.contrib.auth.tokens import default_token_generator
+    from django.urls import reverse
+    from django.utils.encoding import force_bytes
+    from django.utils.http import urlsafe_base64_encode
+    from store.models import Category, Product
+
+    product = Product.objects.available().first()
+    category = Category.objects.filter(products__available=True).first()
+    cart_product = cart_products[0]
+    usernames = (f'bench_new_{number}' for number in itertools.count())
+
+    def forget_order(client):
+        session = client.session
+        session.pop('order_id', None)
+        session.save()
+
+    def pending_order(client):
+        session = client.session
+        session['order_id'] = order.id
+        session.save()
+
+    def register_data():
+        username = next(usernames)
+        return {
+            'username': username, 'first_name': 'New', 'last_name': 'User',
+            'email': f'{username}@example.com',
+            'password1': 'bench-Pa55word!', 'password2': 'bench-Pa55word!',
+        }
+
+    return [
+        # Store
+        Scenario('store:home', 'get', reverse('store:home')),
+        Scenario('store:product_list', 'get', reverse('store:product_list')),
+        Scenario('store:product_list page 5', 'get', reverse('store:product_list'), {'page': 5}),
+        Scenario('store:product_detail', 'get', product.get_absolute_url()),
+        Scenario('store:category_products', 'get', category.get_absolute_url()),
+        Scenario('store:search', 'get', reverse('store:search'), {'q': 'leather bottle'}),
+
+        # Cart
+        Scenario('cart:cart_detail', 'get', reverse('cart:cart_detail'), customer=True),
+        Scenario(
+            'cart:cart_add', 'post', reverse('cart:cart_add', args=[cart_product.id]),
+            {'quantity': 1}, customer=True,
+        ),
+        Scenario(
+            'cart:cart_update', 'post', reverse('cart:cart_update', args=[cart_product.id]),
+            {'quantity': 2}, customer=True,
+        ),
+        Scenario(
+            'cart:cart_remove', 'post', reverse('cart:cart_remove', args=[cart_product.id]),
+            customer=True,
+            before=lambda client: client.post(
+                reverse('cart:cart_add', args=[cart_product.id]), {'quantity': 1}
+            ),
+        ),
+        Scenario(
+            'cart:cart_batch', 'post', reverse('cart:cart_batch'),
+            json.dumps({'operations': [
+                {'op': 'set', 'product_id': item.id, 'quantity': 2} for item in cart_products
+            ]}),
+            content_type='application/json', customer=True,
+        ),
+
+        # Orders
+        Scenario('orders:checkout', 'get', reverse('orders:checkout'), customer=True),
+        Scenario(
+            'orders:checkout submit', 'post', reverse('orders:checkout'), SHIPPING,
+            customer=True, before=forget_order,
+        ),
+        Scenario(
+            'orders:payment', 'get', reverse('orders:payment'),
+            customer=True, before=pending_order,
+        ),
+        Scenario(
+            'orders:payment_success', 'get', reverse('orders:payment_success', args=[order.id]),
+            customer=True,
+        ),
+        Scenario('orders:payment_failed', 'get', reverse('orders:payment_failed'), customer=True),
+        Scenario('orders:order_history', 'get', reverse('orders:order_history'), customer=True),
+        Scenario(
+            'orders:order_detail', 'get', reverse('orders:order_detail', args=[order.id]),
+            customer=True,
+        ),
+
+        # Accounts
+        Scenario('accounts:register', 'get', reverse('accounts:register')),
+        Scenario('accounts:register submit', 'post', reverse('accounts:register'), register_data),
+        Scenario('accounts:login', 'get', reverse('accounts:login')),
+        Scenario(
+            'accounts:login submit', 'post', reverse('accounts:login'),
+            {'username': customer.username, 'password': 'bench-password'},
+            before=lambda client: client.logout(),
+        ),
+        Scenario(
+            'accounts:logout', 'get', reverse('accounts:logout'),
+            customer=True, before=lambda client: client.force_login(customer),
+        ),
+        Scenario('accounts:profile', 'get', reverse('accounts:profile'), customer=True),
+        Scenario(
+            'accounts:profile submit', 'post', reverse('accounts:profile'),
+            {
+                'username': customer.username, 'first_name': 'Bench',
+                'last_name': 'Customer', 'email': customer.email,
+            },
+            customer=True,
+        ),
+        Scenario('accounts:password_reset', 'get', reverse('accounts:password_reset')),
+        Scenario(
+            'accounts:password_reset submit', 'post', reverse('accounts:password_reset'),
+            {'email': customer.email},
+        ),
+        Scenario('accounts:password_reset_done', 'get', reverse('accounts:password_reset_done')),
+        Scenario(
+            'accounts:password_reset_confirm', 'get',
+            reverse('accounts:password_reset_confirm', args=[
+                urlsafe_base64_encode(force_bytes(customer.pk)),
+                default_token_generator.make_token(customer),
+            ]),
+        ),
+        Scenario(
+            'accounts:password_reset_complete', 'get', reverse('accounts:password_reset_complete')
+        ),
+    ]
+
+
+def measure(scenario, client, runs, warmup):
+    """Time a scenario and capture its query count and peak memory"""
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+
+    def once():
+        if scenario.before:
+            scenario.before(client)
+        start = time.perf_counter()
+        response = scenario.request(client)
+        return response, (time.perf_counter() - start) * 1000
+
+    for _ in range(warmup):
+        once()
+    samples = []
+    for _ in range(runs):
+        response, elapsed = once()
+        samples.append(elapsed)
+
+    if scenario.before:
+        scenario.before(client)
+    # A full query log (it keeps 9000 entries) would hide new queries
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        scenario.request(client)
+    # Read now: the next request resets the log the capture points into
+    query_count = len(queries.captured_queries)
+
+    if scenario.before:
+        scenario.before(client)
+    tracemalloc.start()
+    try:
+        scenario.request(client)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'name': scenario.name,
+        'status': response.status_code,
+        **summarize(samples),
+        'queries': query_count,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run(runs, warmup, scale, random_seed, only=None):
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.db.models import Count
+    from django.test import Client, override_settings
+    from store import search
+    from store.models import Product
+    from . import seed
+
+    # Stale cache entries from an earlier run would skew the first pages
+    cache.clear()
+    counts = seed.seed(random_seed=random_seed, **scale)
+    if search.is_supported():
+        search.rebuild_index()
+
+    # The customer with the most orders, and one of their orders
+    customer = User.objects.annotate(order_count=Count('orders')).order_by('-order_count').first()
+    order = customer.orders.first()
+    cart_products = list(Product.objects.available().order_by('id')[:CART_LINES])
+    Product.objects.filter(id__in=[product.id for product in cart_products]).update(stock=1_000_000)
+
+    def customer_client():
+        client = Client()
+        client.force_login(customer)
+        client.post(
+            '/cart/batch/',
+            json.dumps({'operations': [
+                {'op': 'add', 'product_id': product.id, 'quantity': 1} for product in cart_products
+            ]}),
+            content_type='application/json',
+        )
+        return client
+
+    results = []
+    with override_settings(DEBUG=False):
+        for scenario in build_scenarios(customer, order, cart_products):
+            if only and not any(scenario.name.startswith(prefix) for prefix in only):
+                continue
+            client = customer_client() if scenario.customer else Client()
+            # Keep debugging prints in views (e.g. logout) out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                results.append(measure(scenario, client, runs, warmup))
+    return counts, results
+
+
+def compare(results, baseline_path):
+    """Add the p50 change against an earlier JSON result file to each row"""
+    with open(baseline_path) as handle:
+        baseline = {row['name']: row for row in json.load(handle)['results']}
+    for row in results:
+        previous = baseline.get(row['name'])
+        if previous and previous['p50_ms']:
+            change = (row['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100
+            row['p50_change'] = f'{change:+.1f}%'
+            row['query_change'] = row['queries'] - previous['queries']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=30, help='Timed requests per URL')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per URL first')
+    parser.add_argument('--categories', type=int, default=20, help='Seeded categories')
+    parser.add_argument('--products', type=int, default=2000, help='Seeded products')
+    parser.add_argument('--users', type=int, default=200, help='Seeded users')
+    parser.add_argument('--orders', type=int, default=2000, help='Seeded orders')
+    parser.add_argument('--order-items', type=int, default=20000, help='Seeded order lines')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the data set')
+    parser.add_argument('--only', nargs='+', help='Only URLs whose name starts with these (e.g. store orders:)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Show changes against an earlier --output file')
+    args = parser.parse_args()
+
+    scale = {
+        'categories': args.categories,
+        'products': args.products,
+        'users': args.users,
+        'orders': args.orders,
+        'order_items': args.order_items,
+    }
+    with test_database() as connection:
+        vendor = connection.vendor
+        counts, results = run(args.runs, args.warmup, scale, args.seed, args.only)
+
+    columns = ['name', 'status', 'runs', 'mean_ms', 'p50_ms', 'p95_ms', 'queries', 'peak_kib']
+    if args.compare:
+        compare(results, args.compare)
+        columns += ['p50_change', 'query_change']
+    print_table(results, columns)
+
+    if args.output:
+        import django
+        report = {
+            'commit': git_commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': vendor,
+            'scale': counts,
+            'seed': args.seed,
+            'runs': args.runs,
+            'results': results,
+        }
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
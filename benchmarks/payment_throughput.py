@@ -0,0 +1,149 @@
+"""
+Payment Throughput Benchmark
+Compares concurrent-checkout throughput of the sync and async payment views
+
+A local stub payment server adds fixed gateway latency. The sync view is
+driven by a fixed pool of threads, standing in for gunicorn sync workers;
+the async view is driven by concurrent requests on one event loop, as
+under an ASGI server. Each payment charges a pending order with reserved
+stock.
+
+Usage:
+    python -m benchmarks.payment_throughput [--payments 100] [--workers 4] [--delay 0.2]
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from .utils import test_database, print_table
+from . import stub_payment_server
+
+
+def make_orders(user, product, count):
+    from orders import inventory
+    from orders.models import Order, OrderItem
+
+    orders = []
+    for _ in range(count):
+        order = Order.objects.create(
+            user=user, first_name='P', last_name='T', email='p@example.com', phone='1',
+            address='a', city='c', state='s', postal_code='p', country='x', total_amount=10,
+        )
+        OrderItem.objects.create(order=order, product=product, price=10, quantity=1)
+        inventory.reserve(order)
+        orders.append(order)
+    return orders
+
+
+def session_cookies(user, order):
+    """Log a client in with order_id in its session and return its cookies"""
+    from django.test import Client
+
+    client = Client()
+    client.force_login(user)
+    session = client.session
+    session['order_id'] = order.id
+    session.save()
+    return client.cookies
+
+
+def run_sync(user, orders, workers):
+    from django.db import connections
+    from django.test import Client
+
+    jobs = [session_cookies(user, order) for order in orders]
+    lock = threading.Lock()
+
+    def worker():
+        client = Client()
+        try:
+            while True:
+                with lock:
+                    if not jobs:
+                        return
+                    cookies = jobs.pop()
+                client.cookies = cookies
+                client.post('/bench/payment/sync/', {'stripeToken': 'tok_visa'})
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def run_async(user, orders):
+    from django.test import AsyncClient
+
+    jobs = [session_cookies(user, order) for order in orders]
+
+    async def pay(cookies):
+        client = AsyncClient()
+        client.cookies = cookies
+        await client.post('/bench/payment/async/', {'stripeToken': 'tok_visa'})
+
+    async def main():
+        await asyncio.gather(*(pay(cookies) for cookies in jobs))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - started
+
+
+def run(payments, workers, delay):
+    import stripe
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+    from orders.models import Order
+    from store.models import Category, Product
+
+    server, base_url = stub_payment_server.start(delay=delay)
+    stripe.api_base = base_url
+
+    category = Category.objects.create(name='Payments')
+    product = Product.objects.create(
+        category=category, name='Paid product', description='Benchmark', price=10, stock=1_000_000,
+    )
+    user = User.objects.create_user('payer')
+
+    results = []
+    with override_settings(ROOT_URLCONF='benchmarks.payment_urls', STRIPE_API_BASE=base_url):
+        for label, runner in (
+            (f'sync ({workers} workers)', lambda orders: run_sync(user, orders, workers)),
+            ('async (event loop)', lambda orders: run_async(user, orders)),
+        ):
+            orders = make_orders(user, product, payments)
+            elapsed = runner(orders)
+            paid = Order.objects.filter(
+                id__in=[order.id for order in orders], payment_status='completed'
+            ).count()
+            results.append({
+                'path': label,
+                'payments': payments,
+                'paid': paid,
+                'seconds': round(elapsed, 3),
+                'payments_per_sec': round(payments / elapsed, 1),
+            })
+    server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--payments', type=int, default=100, help='Payments per path')
+    parser.add_argument('--workers', type=int, default=4, help='Sync worker threads (gunicorn workers)')
+    parser.add_argument('--delay', type=float, default=0.2, help='Stub gateway latency (seconds)')
+    args = parser.parse_args()
+
+    with test_database(file_backed=True):
+        results = run(args.payments, args.workers, args.delay)
+    print_table(results, ['path', 'payments', 'paid', 'seconds', 'payments_per_sec'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+"""
+Benchmark URL Configuration
+Project URLs plus both payment views side by side, for benchmarks.payment_throughput
+"""
+
+from django.urls import path
+from ecommerce_project.urls import urlpatterns as project_urlpatterns
+from orders import views
+
+urlpatterns = project_urlpatterns + [
+    path('bench/payment/sync/', views.payment, name='bench_payment_sync'),
+    path('bench/payment/async/', views.payment_async, name='bench_payment_async'),
+]
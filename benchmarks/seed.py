@@ -0,0 +1,322 @@
+"""
+Benchmark Data Generator
+Synthetic categories, products, users, orders and order items at configurable scale
+
+Everything is written with batched bulk_create, so a full-size catalog
+(100k products, 100k orders, 1M order items) loads in minutes rather
+than hours. Product popularity follows a Zipf-like curve and order dates
+are spread over the past year, so listings, order history and sales
+reports see realistic skew instead of uniform data.
+
+Generated rows are marked with a name prefix ('bench' by default), which
+lets clear() remove them again without touching real data.
+"""
+
+import random
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+
+# Shared by every generated user, so hashing happens once
+PASSWORD = 'bench-password'
+
+ADJECTIVES = (
+    'Classic', 'Compact', 'Deluxe', 'Essential', 'Ergonomic', 'Lightweight',
+    'Modern', 'Portable', 'Premium', 'Rugged', 'Smart', 'Vintage', 'Wireless',
+)
+MATERIALS = (
+    'Aluminium', 'Bamboo', 'Canvas', 'Ceramic', 'Cotton', 'Glass', 'Leather',
+    'Linen', 'Oak', 'Steel', 'Walnut', 'Wool',
+)
+NOUNS = (
+    'Backpack', 'Blender', 'Bottle', 'Chair', 'Desk Lamp', 'Headphones',
+    'Jacket', 'Kettle', 'Keyboard', 'Mug', 'Notebook', 'Speaker', 'Sneakers',
+    'Tent', 'Watch',
+)
+DEPARTMENTS = (
+    'Audio', 'Books', 'Camping', 'Fitness', 'Footwear', 'Garden', 'Home',
+    'Kitchen', 'Office', 'Outerwear', 'Stationery', 'Toys', 'Travel',
+)
+CITIES = (
+    ('Austin', 'TX'), ('Boston', 'MA'), ('Chicago', 'IL'), ('Denver', 'CO'),
+    ('Portland', 'OR'), ('Seattle', 'WA'), ('Miami', 'FL'), ('Phoenix', 'AZ'),
+)
+
+# (status, payment_status, weight)
+ORDER_STATES = (
+    ('delivered', 'completed', 55),
+    ('shipped', 'completed', 15),
+    ('processing', 'completed', 10),
+    ('pending', 'pending', 10),
+    ('cancelled', 'refunded', 5),
+    ('pending', 'failed', 5),
+)
+
+# Orders are dated within this many days before now
+ORDER_HISTORY_DAYS = 365
+
+# Popularity exponent: higher values concentrate sales on fewer products
+POPULARITY_SKEW = 0.9
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _backdate(model, objects, batch_size, fields=('created_at',)):
+    """Write generated timestamps that auto_now_add replaced on insert"""
+    model.objects.bulk_update(objects, list(fields), batch_size=batch_size)
+
+
+def clear(prefix='bench'):
+    """
+    Remove previously generated benchmark data
+
+    Rows are deleted with one statement per table. Going through the
+    collector would load every row and fire per-product delete signals,
+    which takes minutes at full scale; the search index and catalog cache
+    are updated once at the end instead.
+
+    Sales roll-ups and product rankings are totals over every order, so
+    they are emptied along with their watermarks; the next refresh
+    rebuilds them from the orders that are left.
+
+    Returns:
+        Number of rows deleted
+    """
+    from cart.models import CartItem
+    from orders import rollups
+    from orders.models import (
+        DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem,
+        RollupWatermark, StockReservation,
+    )
+    from store import catalog, rankings, search
+    from store.models import Category, Product, ProductRanking, ProductSalesScore
+
+    bench_orders = Q(order__user__username__startswith=f'{prefix}_')
+    bench_products = Q(product__category__slug__startswith=f'{prefix}-')
+    products = Product.objects.filter(category__slug__startswith=f'{prefix}-')
+    product_ids = list(products.values_list('id', flat=True))
+
+    deleted = 0
+    with transaction.atomic():
+        # Dependents first; none of these have dependents or signals of
+        # their own, so each delete() is a single DELETE
+        deleted += OrderItem.objects.filter(bench_orders | bench_products).delete()[0]
+        deleted += StockReservation.objects.filter(bench_orders | bench_products).delete()[0]
+        deleted += CartItem.objects.filter(
+            Q(user__username__startswith=f'{prefix}_') | bench_products
+        ).delete()[0]
+        deleted += Order.objects.filter(user__username__startswith=f'{prefix}_').delete()[0]
+        deleted += User.objects.filter(username__startswith=f'{prefix}_').delete()[0]
+        # Derived from the orders; the raw product delete below skips their cascades
+        for model in (DailySales, DailyProductSales, DailyCategorySales,
+                      ProductRanking, ProductSalesScore):
+            deleted += model.objects.all().delete()[0]
+        RollupWatermark.objects.filter(
+            name__in=[
+                rollups.WATERMARK, rollups.REFUNDS_WATERMARK,
+                rankings.WATERMARK, rankings.REFUNDS_WATERMARK,
+            ]
+        ).delete()
+        search.unindex_products(product_ids)
+        deleted += products._raw_delete(products.db)
+        deleted += Category.objects.filter(slug__startswith=f'{prefix}-').delete()[0]
+    catalog.purge_products([])
+    catalog.purge_rankings()
+    return deleted
+
+
+def exists(prefix='bench'):
+    """Check whether benchmark data with this prefix was already generated"""
+    from store.models import Category
+    return Category.objects.filter(slug__startswith=f'{prefix}-').exists()
+
+
+def seed(categories=500, products=100_000, users=100_000, orders=100_000,
+         order_items=1_000_000, batch_size=5000, prefix='bench',
+         random_seed=None, progress=None):
+    """
+    Generate a synthetic catalog with customers and their order history
+
+    Args:
+        categories: Number of categories
+        products: Number of products, spread over the categories
+        users: Number of customer accounts (password: PASSWORD)
+        orders: Number of orders, each placed by a random user
+        order_items: Total order lines; every order gets at least one
+        batch_size: Rows per bulk_create/bulk_update statement batch
+        prefix: Marks generated names, slugs and usernames
+        random_seed: Seed for reproducible data sets
+        progress: Optional callable(stage, done, total)
+
+    Returns:
+        Dict of created row counts per model
+    """
+    from orders.models import Order, OrderItem
+    from store.models import Category, Product
+
+    if order_items < orders:
+        raise ValueError('order_items must be at least the number of orders')
+    if orders and not (users and products):
+        raise ValueError('Orders need at least one user and one product')
+
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    report = progress or (lambda stage, done, total: None)
+
+    # Categories
+    category_objects = []
+    for index in range(categories):
+        name = f'{DEPARTMENTS[index % len(DEPARTMENTS)]} {index + 1}'
+        category_objects.append(Category(
+            name=f'{prefix.title()} {name}',
+            slug=f'{prefix}-{slugify(name)}',
+            description=f'Synthetic {name.lower()} category',
+        ))
+    with transaction.atomic():
+        category_objects = Category.objects.bulk_create(category_objects, batch_size=batch_size)
+    category_ids = [category.id for category in category_objects]
+    report('categories', len(category_ids), categories)
+
+    # Products
+    prices = {}
+    snapshots = {}
+    product_ids = []
+    for start in range(0, products, batch_size):
+        batch = []
+        for index in range(start, min(start + batch_size, products)):
+            name = f'{rng.choice(ADJECTIVES)} {rng.choice(MATERIALS)} {rng.choice(NOUNS)}'
+            price = Decimal(rng.randint(299, 49_999)) / 100
+            discounted = (price * Decimal('0.8')).quantize(Decimal('0.01')) if rng.random() < 0.2 else None
+            batch.append(Product(
+                category_id=category_ids[index % len(category_ids)],
+                name=name,
+                slug=f'{prefix}-{slugify(name)}-{index + 1}',
+                description=f'{name} for everyday use. Synthetic benchmark product #{index + 1}.',
+                price=price,
+                discounted_price=discounted,
+                stock=0 if rng.random() < 0.1 else rng.randint(1, 500),
+                available=rng.random() < 0.97,
+                featured=rng.random() < 0.01,
+                created_at=now - timedelta(seconds=rng.randint(0, ORDER_HISTORY_DAYS * 86400)),
+            ))
+        with transaction.atomic():
+            created_at = [product.created_at for product in batch]
+            batch = Product.objects.bulk_create(batch, batch_size=batch_size)
+            for product, timestamp in zip(batch, created_at):
+                product.created_at = timestamp
+            _backdate(Product, batch, batch_size)
+        for product in batch:
+            product_ids.append(product.id)
+            prices[product.id] = product.discounted_price or product.price
+            snapshots[product.id] = OrderItem.product_snapshot(product)
+        report('products', len(product_ids), products)
+
+    # Users
+    password = make_password(PASSWORD)
+    user_ids = []
+    for start in range(0, users, batch_size):
+        batch = [
+            User(
+                username=f'{prefix}_{index + 1}',
+                email=f'{prefix}_{index + 1}@example.com',
+                first_name='Bench',
+                last_name=f'User{index + 1}',
+                password=password,
+            )
+            for index in range(start, min(start + batch_size, users))
+        ]
+        with transaction.atomic():
+            batch = User.objects.bulk_create(batch, batch_size=batch_size)
+        user_ids.extend(user.id for user in batch)
+        report('users', len(user_ids), users)
+
+    # Lines per order: one each, the rest scattered at random
+    lines_per_order = [1] * orders
+    for _ in range(order_items - orders):
+        lines_per_order[rng.randrange(orders)] += 1
+    # Popular products are picked far more often than the long tail
+    popularity = list(accumulate(1 / (rank + 1) ** POPULARITY_SKEW for rank in range(len(product_ids))))
+    ranked_products = product_ids[:]
+    rng.shuffle(ranked_products)
+    states = [state[:2] for state in ORDER_STATES]
+    state_weights = list(accumulate(state[2] for state in ORDER_STATES))
+
+    created_orders = created_items = 0
+    for start in range(0, orders, batch_size):
+        batch = []
+        lines = []
+        for index in range(start, min(start + batch_size, orders)):
+            picks = set()
+            wanted = min(lines_per_order[index], len(ranked_products))
+            while len(picks) < wanted:
+                picks.add(rng.choices(ranked_products, cum_weights=popularity)[0])
+            order_lines = [(product_id, rng.randint(1, 3)) for product_id in picks]
+            lines.append(order_lines)
+
+            city, state = rng.choice(CITIES)
+            status, payment_status = rng.choices(states, cum_weights=state_weights)[0]
+            created_at = now - timedelta(seconds=rng.randint(0, ORDER_HISTORY_DAYS * 86400))
+            # Paid a few minutes after checkout; refunds follow within two weeks
+            paid_at = refunded_at = None
+            if payment_status in ('completed', 'refunded'):
+                paid_at = created_at + timedelta(seconds=rng.randint(30, 900))
+            if payment_status == 'refunded':
+                refunded_at = min(paid_at + timedelta(seconds=rng.randint(3600, 14 * 86400)), now)
+            batch.append(Order(
+                user_id=rng.choice(user_ids),
+                first_name='Bench',
+                last_name=f'Customer{index + 1}',
+                email=f'{prefix}_customer{index + 1}@example.com',
+                phone='5550100',
+                address=f'{rng.randint(1, 9999)} Benchmark Street',
+                city=city,
+                state=state,
+                postal_code=f'{rng.randint(10000, 99999)}',
+                country='United States',
+                total_amount=sum(prices[product_id] * quantity for product_id, quantity in order_lines),
+                status=status,
+                payment_status=payment_status,
+                created_at=created_at,
+                paid_at=paid_at,
+                refunded_at=refunded_at,
+            ))
+
+        with transaction.atomic():
+            created_at = [order.created_at for order in batch]
+            batch = Order.objects.bulk_create(batch, batch_size=batch_size)
+            for order, timestamp in zip(batch, created_at):
+                order.created_at = timestamp
+            _backdate(Order, batch, batch_size)
+
+            items = [
+                OrderItem(
+                    order_id=order.id, product_id=product_id, price=prices[product_id],
+                    quantity=quantity, **snapshots[product_id]
+                )
+                for order, order_lines in zip(batch, lines)
+                for product_id, quantity in order_lines
+            ]
+            for chunk in _batches(items, batch_size):
+                OrderItem.objects.bulk_create(chunk, batch_size=batch_size)
+
+        created_orders += len(batch)
+        created_items += len(items)
+        report('orders', created_orders, orders)
+
+    return {
+        'categories': len(category_ids),
+        'products': len(product_ids),
+        'users': len(user_ids),
+        'orders': created_orders,
+        'order_items': created_items,
+    }
@@ -0,0 +1,106 @@
+"""
+Stub Payment Server
+A local stand-in for the Stripe charges API, for offline load testing
+
+Answers POST /v1/charges after a configurable delay (simulating gateway
+latency). The token tok_chargeDeclined gets a card_error, and repeated
+Idempotency-Key headers return the original charge.
+
+Usage:
+    python -m benchmarks.stub_payment_server [--port 12111] [--delay 0.2]
+    STRIPE_API_BASE=http://127.0.0.1:12111 python manage.py runserver
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class StubPaymentHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    delay = 0.2
+    charges = {}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+
+        if self.path.rstrip('/') != '/v1/charges':
+            self._send(404, {'error': {'type': 'invalid_request_error', 'message': 'Unknown path'}})
+            return
+
+        time.sleep(self.delay)
+
+        key = self.headers.get('Idempotency-Key')
+        with self.lock:
+            if key and key in self.charges:
+                self._send(200, self.charges[key])
+                return
+
+        if form.get('source') == 'tok_chargeDeclined':
+            self._send(402, {'error': {
+                'type': 'card_error', 'code': 'card_declined', 'message': 'Your card was declined.',
+            }})
+            return
+
+        charge = {
+            'id': f'ch_{uuid.uuid4().hex[:24]}',
+            'object': 'charge',
+            'amount': int(form.get('amount', 0)),
+            'currency': form.get('currency', 'usd'),
+            'description': form.get('description', ''),
+            'paid': True,
+            'status': 'succeeded',
+        }
+        with self.lock:
+            if key:
+                self.charges[key] = charge
+        self._send(200, charge)
+
+
+def start(port=0, delay=0.2):
+    """
+    Start the stub server in a background thread
+
+    Returns:
+        (server, base_url)
+    """
+    handler = type('Handler', (StubPaymentHandler,), {'delay': delay, 'charges': {}})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=12111)
+    parser.add_argument('--delay', type=float, default=0.2, help='Simulated gateway latency (seconds)')
+    args = parser.parse_args()
+
+    server, url = start(args.port, args.delay)
+    print(f'Stub payment server listening on {url} (delay {args.delay}s)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
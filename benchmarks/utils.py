@@ -0,0 +1,99 @@
+"""
+Benchmark Utilities
+Django setup, throwaway test database and timing helpers shared by the benchmarks
+"""
+
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    """Configure Django for a standalone benchmark script"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_project.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database(verbosity=0, file_backed=False):
+    """
+    Create a throwaway test database for the duration of the block
+
+    Benchmarks never touch the configured development database.
+
+    Args:
+        file_backed: On SQLite, use a temporary file instead of the
+            default in-memory test database, so several threads can
+            write to it concurrently with normal locking
+    """
+    setup_django()
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    if file_backed and connection.vendor == 'sqlite':
+        import tempfile
+        directory = tempfile.mkdtemp(prefix='benchmark-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        connection.settings_dict['OPTIONS'].setdefault('timeout', 30)
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, keepdb=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of numbers (nearest rank)"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    """Summarize latency samples in milliseconds"""
+    return {
+        'runs': len(samples_ms),
+        'mean_ms': round(statistics.fmean(samples_ms), 3) if samples_ms else 0.0,
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+    }
+
+
+def time_call(func, repeat=50, warmup=3):
+    """
+    Call func repeatedly and return its latency samples in milliseconds
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def count_writes(queries):
+    """Count INSERT/UPDATE/DELETE statements in captured queries"""
+    return sum(
+        1 for query in queries
+        if query['sql'].lstrip().split(' ', 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE')
+    )
+
+
+def print_table(rows, columns):
+    """Print a list of dicts as an aligned text table"""
+    widths = {
+        column: max(len(column), *(len(str(row.get(column, ''))) for row in rows))
+        for column in columns
+    }
+    print('  '.join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print('  '.join(str(row.get(column, '')).ljust(widths[column]) for column in columns))
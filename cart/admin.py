@@ -1,3 +1,18 @@
+"""
+Cart Admin Configuration
+Read-mostly view of saved carts for logged-in users
+"""
+
 from django.contrib import admin
+from .models import CartItem
+
 
-# Register your models here.
+@admin.register(CartItem)
+class CartItemAdmin(admin.ModelAdmin):
+    """
+    Admin interface for database-persisted cart lines
+    """
+    list_display = ['user', 'product', 'quantity', 'price', 'updated_at']
+    list_filter = ['updated_at']
+    search_fields = ['user__username', 'product__name']
+    raw_id_fields = ['user', 'product']
@@ -1,29 +1,40 @@
 """
 Shopping Cart Class
-Session-based cart management with add, remove, update, and clear functionality
+Cart management with add, remove, update, and clear functionality
 """
 
 from decimal import Decimal
 from django.conf import settings
 from store.models import Product
+from .storage import get_cart_storage
 
 
 class Cart:
     """
-    Shopping cart stored in session
+    Shopping cart persisted by the configured cart storage backend
+    
+    Product rows, the item list, the length and the total are computed
+    once and memoized; any change to the cart invalidates them.
     """
     
+    # Product columns read by the cart, checkout and order templates
+    PRODUCT_FIELDS = (
+        'id', 'name', 'slug', 'image', 'price', 'discounted_price',
+        'stock', 'available', 'category__id', 'category__name',
+    )
+    
     def __init__(self, request):
         """
-        Initialize the cart from session
-        """
-        self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
+        Initialize the cart from storage (see settings.CART_STORAGE)
         
-        if not cart:
-            # Save an empty cart in the session
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        An empty cart is not written anywhere until something is added,
+        so browsing without a cart never creates or saves a session.
+        """
+        self.request = request
+        self.storage = get_cart_storage(request)
+        self.cart = self.storage.load()
+        self._products = {}
+        self._invalidate()
     
     def add(self, product, quantity=1, update_quantity=False):
         """
@@ -41,6 +52,7 @@ class Cart:
                 'quantity': 0,
                 'price': str(product.get_price())
             }
+            self._products[product_id] = product
         
         if update_quantity:
             self.cart[product_id]['quantity'] = quantity
@@ -49,6 +61,27 @@ class Cart:
         
         self.save()
     
+    def set_quantities(self, quantities, products):
+        """
+        Set the final quantity of several products and save once
+        
+        Args:
+            quantities: Dict of product id to new quantity (0 removes the line)
+            products: Dict of product id to Product instance for every id
+        """
+        for product_id, quantity in quantities.items():
+            key = str(product_id)
+            if quantity > 0:
+                product = products[product_id]
+                if key not in self.cart:
+                    self.cart[key] = {'quantity': 0, 'price': str(product.get_price())}
+                self.cart[key]['quantity'] = quantity
+                self._products[key] = product
+            else:
+                self.cart.pop(key, None)
+        
+        self.save()
+    
     def remove(self, product):
         """
         Remove a product from the cart
@@ -64,46 +97,84 @@ class Cart:
     
     def save(self):
         """
-        Mark the session as modified to ensure it's saved
+        Persist the cart through the storage backend
         """
-        self.session.modified = True
+        self.storage.save(self.cart)
+        self._invalidate()
+        
+        # Picked up by CartMiddleware to refresh the badge cookie
+        self.request.cart_count = len(self)
     
-    def __iter__(self):
+    def _invalidate(self):
         """
-        Iterate over the items in the cart and get the products from the database
+        Drop memoized items and totals after the cart changed
+        """
+        self._items = None
+        self._length = None
+        self._total = None
+    
+    def _load_products(self):
         """
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
+        Fetch product rows not loaded yet, in a single query
+        """
+        missing = [product_id for product_id in self.cart if product_id not in self._products]
+        if not missing:
+            return
         
+        products = Product.objects.filter(id__in=missing).select_related(
+            'category'
+        ).only(*self.PRODUCT_FIELDS)
         for product in products:
-            cart[str(product.id)]['product'] = product
+            self._products[str(product.id)] = product
+    
+    def __iter__(self):
+        """
+        Iterate over the items in the cart with their products
         
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        Items are built once per change; the stored cart is never mutated.
+        Lines whose product no longer exists are skipped.
+        """
+        if self._items is None:
+            self._load_products()
+            items = []
+            for product_id, item in self.cart.items():
+                product = self._products.get(product_id)
+                if product is None:
+                    continue
+                price = Decimal(item['price'])
+                items.append({
+                    'product': product,
+                    'quantity': item['quantity'],
+                    'price': price,
+                    'total_price': price * item['quantity'],
+                })
+            self._items = items
+        return iter(self._items)
     
     def __len__(self):
         """
         Count all items in the cart
         """
-        return sum(item['quantity'] for item in self.cart.values())
+        if self._length is None:
+            self._length = sum(item['quantity'] for item in self.cart.values())
+        return self._length
     
     def get_total_price(self):
         """
         Calculate the total price of all items in the cart
         """
-        return sum(
-            Decimal(item['price']) * item['quantity'] 
-            for item in self.cart.values()
-        )
+        if self._total is None:
+            self._total = sum(
+                (Decimal(item['price']) * item['quantity'] for item in self.cart.values()),
+                Decimal('0')
+            )
+        return self._total
     
     def clear(self):
         """
         Remove all items from the cart
         """
-        del self.session[settings.CART_SESSION_ID]
+        self.cart = {}
         self.save()
     
     def update_quantity(self, product_id, quantity):
@@ -123,4 +194,33 @@ class Cart:
             else:
                 # Remove if quantity is 0 or less
                 del self.cart[product_id]
-                self.save()
\ No newline at end of file
+                self.save()
+
+
+def get_cart(request):
+    """
+    Return the cart snapshot for this request
+    
+    The context processor and the views share one Cart, so product rows
+    are fetched once per request however often templates touch the cart.
+    """
+    cart = getattr(request, 'cart_snapshot', None)
+    if cart is None:
+        cart = request.cart_snapshot = Cart(request)
+    return cart
+
+
+def get_cart_count(request):
+    """
+    Return the cart item count without touching the session
+    
+    Uses the count set by a cart change in this request, otherwise the
+    badge cookie maintained by CartMiddleware.
+    """
+    count = getattr(request, 'cart_count', None)
+    if count is None:
+        try:
+            count = int(request.COOKIES.get(settings.CART_COUNT_COOKIE_NAME, 0))
+        except ValueError:
+            count = 0
+    return max(count, 0)
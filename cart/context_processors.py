@@ -3,11 +3,18 @@ Cart Context Processor
 Makes cart available in all templates
 """
 
-from .cart import Cart
+from django.utils.functional import SimpleLazyObject
+from .cart import get_cart, get_cart_count
 
 
 def cart(request):
     """
-    Return cart instance to be used in templates
+    Return a lazy cart and the cheap badge count to be used in templates
+    
+    The cart is only built (and the session only read) when a template
+    actually uses it; the navbar badge reads the count cookie instead.
     """
-    return {'cart': Cart(request)}
\ No newline at end of file
+    return {
+        'cart': SimpleLazyObject(lambda: get_cart(request)),
+        'cart_count': get_cart_count(request),
+    }
@@ -0,0 +1,40 @@
+"""
+Cart Middleware
+Flushes client-side cart state and keeps the badge cookie in step with the cart
+"""
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+
+class CartMiddleware(MiddlewareMixin):
+    """
+    Write cart changes made during a request into the response
+    
+    Cookie-based storage backends set their cookies here, and the cart
+    count cookie read by the navbar badge is set or cleared whenever the
+    cart changed, so rendering a page never needs to load the cart.
+    Works under both WSGI and ASGI without forcing async views onto a
+    sync thread.
+    """
+    
+    def process_response(self, request, response):
+        storage = getattr(request, 'cart_storage', None)
+        if storage is not None:
+            storage.update_response(response)
+        
+        count = getattr(request, 'cart_count', None)
+        if count is None:
+            return response
+        
+        if count > 0:
+            response.set_cookie(
+                settings.CART_COUNT_COOKIE_NAME,
+                str(count),
+                max_age=settings.SESSION_COOKIE_AGE,
+                samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        else:
+            response.delete_cookie(settings.CART_COUNT_COOKIE_NAME, samesite='Lax')
+        return response
@@ -1,3 +1,42 @@
+"""
+Cart Models
+Database-persisted cart lines for logged-in users
+"""
+
 from django.db import models
+from django.contrib.auth.models import User
+from store.models import Product
+
 
-# Create your models here.
+class CartItem(models.Model):
+    """
+    A single product line in a logged-in user's saved cart
+    
+    Used by cart.storage.DatabaseCartStorage; other storage backends keep
+    the cart outside the database.
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='cart_items',
+        on_delete=models.CASCADE
+    )
+    product = models.ForeignKey(
+        Product,
+        related_name='cart_items',
+        on_delete=models.CASCADE
+    )
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'product'],
+                name='unique_cart_item_per_user'
+            ),
+        ]
+    
+    def __str__(self):
+        return f'{self.quantity}x {self.product_id} for {self.user_id}'
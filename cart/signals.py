@@ -0,0 +1,26 @@
+"""
+Cart Signals
+Keeps the stored cart and its badge in step with login and logout
+"""
+
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.dispatch import receiver
+from .storage import get_cart_storage
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """Merge the anonymous cart into the user's saved cart, if the backend keeps one"""
+    if request is None:
+        return
+    merged = get_cart_storage(request).merge_anonymous(user)
+    if merged is not None:
+        request.cart_count = sum(item['quantity'] for item in merged.values())
+
+
+@receiver(user_logged_out)
+def drop_cart_on_logout(sender, request, **kwargs):
+    """Drop the visitor's cart on logout, whichever backend holds it, and clear the badge"""
+    if request is not None:
+        get_cart_storage(request).logout()
+        request.cart_count = 0
@@ -0,0 +1,298 @@
+"""
+Cart Storage Backends
+Pluggable persistence for the shopping cart, selected with settings.CART_STORAGE
+
+Every backend loads and saves the same plain dict used by Cart:
+    {'<product_id>': {'quantity': <int>, 'price': '<decimal string>'}}
+"""
+
+import uuid
+from decimal import Decimal
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+def get_storage_class(path=None):
+    """Return the configured cart storage class"""
+    return import_string(path or settings.CART_STORAGE)
+
+
+def get_cart_storage(request):
+    """
+    Return the cart storage for a request, creating it on first use
+
+    The instance is kept on the request so every Cart built during the
+    request shares it and CartMiddleware can flush it into the response.
+    """
+    storage = getattr(request, 'cart_storage', None)
+    if storage is None:
+        storage = request.cart_storage = get_storage_class()(request)
+    return storage
+
+
+def pack(cart):
+    """Convert a cart dict to the compact {id: [quantity, price]} form"""
+    return {
+        product_id: [item['quantity'], str(item['price'])]
+        for product_id, item in cart.items()
+    }
+
+
+def unpack(data):
+    """Convert the compact form back to a cart dict"""
+    return {
+        str(product_id): {'quantity': int(quantity), 'price': str(price)}
+        for product_id, (quantity, price) in data.items()
+    }
+
+
+class BaseCartStorage:
+    """
+    Base class for cart storage backends
+
+    Subclasses implement load() and save(); backends that keep state on
+    the client also implement update_response().
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    def load(self):
+        """Return the stored cart dict (empty if there is none)"""
+        raise NotImplementedError
+
+    def save(self, cart):
+        """Persist the cart dict; an empty dict clears the stored cart"""
+        raise NotImplementedError
+
+    def update_response(self, response):
+        """Write any pending client-side state (cookies) into the response"""
+
+    def merge_anonymous(self, user):
+        """Fold a pre-login cart into the user's cart; nothing to do by default"""
+
+    def logout(self):
+        """Drop the cart the visitor holds when they log out"""
+        self.save({})
+
+
+class SessionCartStorage(BaseCartStorage):
+    """
+    Store the cart in the Django session (the original behaviour)
+    """
+
+    def load(self):
+        return self.request.session.get(settings.CART_SESSION_ID) or {}
+
+    def save(self, cart):
+        session = self.request.session
+        if cart:
+            session[settings.CART_SESSION_ID] = {
+                product_id: {'quantity': item['quantity'], 'price': str(item['price'])}
+                for product_id, item in cart.items()
+            }
+        else:
+            session.pop(settings.CART_SESSION_ID, None)
+        session.modified = True
+
+
+class SignedCookieCartStorage(BaseCartStorage):
+    """
+    Store the cart in a compact signed cookie, with no server-side I/O
+
+    Browsers cap cookies at about 4KB, which comfortably holds a few
+    dozen cart lines in the compressed form used here.
+    """
+    salt = 'cart.storage.SignedCookieCartStorage'
+
+    def __init__(self, request):
+        super().__init__(request)
+        self._pending = None
+
+    def load(self):
+        value = self.request.COOKIES.get(settings.CART_COOKIE_NAME)
+        if not value:
+            return {}
+        try:
+            return unpack(signing.loads(
+                value, salt=self.salt, max_age=settings.SESSION_COOKIE_AGE
+            ))
+        except (signing.BadSignature, ValueError, TypeError, AttributeError):
+            return {}
+
+    def save(self, cart):
+        self._pending = pack(cart)
+
+    def update_response(self, response):
+        if self._pending is None:
+            return
+        if self._pending:
+            response.set_cookie(
+                settings.CART_COOKIE_NAME,
+                signing.dumps(self._pending, salt=self.salt, compress=True),
+                max_age=settings.SESSION_COOKIE_AGE,
+                httponly=True,
+                samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        else:
+            response.delete_cookie(settings.CART_COOKIE_NAME, samesite='Lax')
+
+
+class CacheCartStorage(BaseCartStorage):
+    """
+    Store the cart in the cache, keyed by a random id kept in a signed cookie
+    """
+    salt = 'cart.storage.CacheCartStorage'
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cart_id = request.get_signed_cookie(
+            settings.CART_COOKIE_NAME,
+            default=None,
+            salt=self.salt,
+            max_age=settings.SESSION_COOKIE_AGE,
+        )
+        self._new_id = None
+
+    def _key(self, cart_id):
+        return f'cart:{cart_id}'
+
+    def load(self):
+        if not self.cart_id:
+            return {}
+        return unpack(cache.get(self._key(self.cart_id)) or {})
+
+    def save(self, cart):
+        if cart:
+            if not self.cart_id:
+                self.cart_id = self._new_id = uuid.uuid4().hex
+            cache.set(self._key(self.cart_id), pack(cart), settings.SESSION_COOKIE_AGE)
+        elif self.cart_id:
+            cache.delete(self._key(self.cart_id))
+            self.cart_id = None
+            self._new_id = ''
+
+    def update_response(self, response):
+        if self._new_id:
+            response.set_signed_cookie(
+                settings.CART_COOKIE_NAME,
+                self._new_id,
+                salt=self.salt,
+                max_age=settings.SESSION_COOKIE_AGE,
+                httponly=True,
+                samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        elif self._new_id == '':
+            response.delete_cookie(settings.CART_COOKIE_NAME, samesite='Lax')
+
+
+class DatabaseCartStorage(BaseCartStorage):
+    """
+    Persist carts of logged-in users as CartItem rows
+
+    Anonymous visitors use settings.CART_ANONYMOUS_STORAGE until they log
+    in, at which point their cart is merged into the database cart.
+    Saves only write the rows that changed since the cart was loaded.
+    """
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.anonymous = get_storage_class(settings.CART_ANONYMOUS_STORAGE)(request)
+        self._loaded = {}
+
+    def _user(self):
+        user = getattr(self.request, 'user', None)
+        return user if user is not None and user.is_authenticated else None
+
+    def _rows(self, user):
+        from .models import CartItem
+        return {
+            str(product_id): {'quantity': quantity, 'price': str(price)}
+            for product_id, quantity, price in CartItem.objects.filter(
+                user=user
+            ).values_list('product_id', 'quantity', 'price')
+        }
+
+    def load(self):
+        user = self._user()
+        if user is None:
+            return self.anonymous.load()
+        self._loaded = self._rows(user)
+        return {product_id: dict(item) for product_id, item in self._loaded.items()}
+
+    def save(self, cart):
+        user = self._user()
+        if user is None:
+            self.anonymous.save(cart)
+            return
+        self._write(user, cart, self._loaded)
+        self._loaded = {
+            product_id: {'quantity': item['quantity'], 'price': str(item['price'])}
+            for product_id, item in cart.items()
+        }
+
+    def _write(self, user, cart, previous):
+        """Apply the difference between two cart dicts as bulk row changes"""
+        from .models import CartItem
+
+        removed = [int(product_id) for product_id in previous if product_id not in cart]
+        changed = [
+            CartItem(
+                user=user,
+                product_id=int(product_id),
+                quantity=item['quantity'],
+                price=Decimal(str(item['price'])),
+            )
+            for product_id, item in cart.items()
+            if previous.get(product_id) != {
+                'quantity': item['quantity'], 'price': str(item['price'])
+            }
+        ]
+
+        with transaction.atomic():
+            if removed:
+                CartItem.objects.filter(user=user, product_id__in=removed).delete()
+            if changed:
+                CartItem.objects.bulk_create(
+                    changed,
+                    update_conflicts=True,
+                    unique_fields=['user', 'product'],
+                    update_fields=['quantity', 'price', 'updated_at'],
+                )
+
+    def update_response(self, response):
+        self.anonymous.update_response(response)
+
+    def logout(self):
+        """Keep the user's saved cart for their next login; drop only the visitor's"""
+        self.anonymous.logout()
+
+    def merge_anonymous(self, user):
+        """
+        Add the quantities of the pre-login cart to the user's saved cart
+
+        Returns:
+            The merged cart dict, or None if there was nothing to merge
+        """
+        anonymous_cart = self.anonymous.load()
+        if not anonymous_cart:
+            return None
+
+        previous = self._rows(user)
+        merged = {product_id: dict(item) for product_id, item in previous.items()}
+        for product_id, item in anonymous_cart.items():
+            if product_id in merged:
+                merged[product_id]['quantity'] += item['quantity']
+                merged[product_id]['price'] = item['price']
+            else:
+                merged[product_id] = dict(item)
+
+        self._write(user, merged, previous)
+        self._loaded = merged
+        self.anonymous.save({})
+        return merged
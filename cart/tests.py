@@ -1,3 +1,147 @@
-from django.test import TestCase
+import json
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from store.models import Category, Product
+from .views import MAX_BATCH_OPERATIONS
 
-# Create your tests here.
+
+class CartBatchTests(TestCase):
+    """
+    Batched cart updates apply every operation or none of them
+    """
+
+    def setUp(self):
+        category = Category.objects.create(name='Widgets')
+        self.widget, self.gadget, self.gizmo = (
+            Product.objects.create(category=category, name=name, description=name, price=10, stock=5)
+            for name in ('Widget', 'Gadget', 'Gizmo')
+        )
+
+    def batch(self, *operations):
+        return self.client.post(
+            reverse('cart:cart_batch'),
+            json.dumps({'operations': list(operations)}),
+            content_type='application/json',
+        )
+
+    def quantities(self, response):
+        return {item['name']: item['quantity'] for item in response.json()['cart']['items']}
+
+    def test_add_set_and_remove(self):
+        response = self.batch(
+            {'op': 'add', 'product_id': self.widget.id, 'quantity': 2},
+            {'op': 'add', 'product_id': self.widget.id},
+            {'op': 'set', 'product_id': self.gadget.id, 'quantity': 4},
+            {'op': 'add', 'product_id': self.gizmo.id},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(response), {'Widget': 3, 'Gadget': 4, 'Gizmo': 1})
+        self.assertEqual(response.json()['cart']['count'], 8)
+        self.assertEqual(response.json()['cart']['total_price'], '80.00')
+
+        # Operations build on the stored cart and on each other, in order
+        response = self.batch(
+            {'op': 'add', 'product_id': self.widget.id, 'quantity': 1},
+            {'op': 'set', 'product_id': self.gadget.id, 'quantity': 0},
+            {'op': 'remove', 'product_id': self.gizmo.id},
+            {'op': 'set', 'product_id': self.gizmo.id, 'quantity': 2},
+        )
+        self.assertEqual(self.quantities(response), {'Widget': 4, 'Gizmo': 2})
+
+    def test_operation_limit(self):
+        response = self.batch(*[{'op': 'add', 'product_id': self.widget.id}] * (MAX_BATCH_OPERATIONS + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [f'At most {MAX_BATCH_OPERATIONS} operations per request.'])
+
+        response = self.batch(*[{'op': 'add', 'product_id': self.widget.id}] * 5)
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_requests_are_rejected(self):
+        response = self.batch(
+            {'op': 'add', 'product_id': self.widget.id},
+            {'op': 'double', 'product_id': self.widget.id},
+            {'op': 'add', 'product_id': 'one'},
+            {'op': 'add', 'product_id': self.gadget.id, 'quantity': 0},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            'Operation 1: unknown op "double".',
+            'Operation 2: needs "op", an integer "product_id" and "quantity".',
+            'Operation 3: quantity must be at least 1.',
+        ])
+
+        for body in (b'not json', b'{}', b'{"operations": []}'):
+            response = self.client.post(reverse('cart:cart_batch'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('cart:cart_batch')).status_code, 405)
+
+    def test_stock_is_checked_before_anything_changes(self):
+        self.batch({'op': 'add', 'product_id': self.widget.id, 'quantity': 4})
+        self.gizmo.available = False
+        self.gizmo.save()
+
+        response = self.batch(
+            {'op': 'set', 'product_id': self.gadget.id, 'quantity': 1},
+            {'op': 'add', 'product_id': self.widget.id, 'quantity': 2},
+            {'op': 'add', 'product_id': self.gizmo.id},
+            {'op': 'add', 'product_id': 0},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            'Operation 3: product 0 does not exist.',
+            'Only 5 of Widget available in stock.',
+            'Gizmo is not available.',
+        ])
+
+        # Nothing was applied
+        response = self.batch({'op': 'add', 'product_id': self.widget.id, 'quantity': 1})
+        self.assertEqual(self.quantities(response), {'Widget': 5})
+
+
+class CartLogoutTests(TestCase):
+    """
+    Logging out drops the visitor's cart with every storage backend
+    """
+
+    def setUp(self):
+        category = Category.objects.create(name='Widgets')
+        self.widget, self.gadget = (
+            Product.objects.create(category=category, name=name, description=name, price=10, stock=5)
+            for name in ('Widget', 'Gadget')
+        )
+        self.user = User.objects.create_user('shopper', password='password')
+
+    def cart_after_logout(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('cart:cart_add', args=[self.widget.id]), {'quantity': 2})
+        self.assertEqual(self.client.cookies[settings.CART_COUNT_COOKIE_NAME].value, '2')
+
+        response = self.client.get(reverse('accounts:logout'))
+        self.assertEqual(response.cookies[settings.CART_COUNT_COOKIE_NAME].value, '')
+
+        response = self.client.post(
+            reverse('cart:cart_batch'),
+            json.dumps({'operations': [{'op': 'add', 'product_id': self.gadget.id}]}),
+            content_type='application/json',
+        )
+        return {item['name']: item['quantity'] for item in response.json()['cart']['items']}
+
+    def test_session_storage(self):
+        self.assertEqual(self.cart_after_logout(), {'Gadget': 1})
+
+    @override_settings(CART_STORAGE='cart.storage.SignedCookieCartStorage')
+    def test_signed_cookie_storage(self):
+        self.assertEqual(self.cart_after_logout(), {'Gadget': 1})
+
+    @override_settings(CART_STORAGE='cart.storage.CacheCartStorage')
+    def test_cache_storage(self):
+        self.assertEqual(self.cart_after_logout(), {'Gadget': 1})
+
+    @override_settings(CART_STORAGE='cart.storage.DatabaseCartStorage')
+    def test_database_storage_keeps_the_saved_cart(self):
+        self.assertEqual(self.cart_after_logout(), {'Gadget': 1})
+        # The anonymous cart is merged back into the saved one on the next login
+        self.client.post(reverse('accounts:login'), {'username': 'shopper', 'password': 'password'})
+        self.assertEqual(self.client.cookies[settings.CART_COUNT_COOKIE_NAME].value, '3')
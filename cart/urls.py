@@ -20,4 +20,7 @@ urlpatterns = [
     
     # Update product quantity in cart
     path('update/<int:product_id>/', views.cart_update, name='cart_update'),
+    
+    # Apply several add/set/remove operations in one JSON request
+    path('batch/', views.cart_batch, name='cart_batch'),
 ]
\ No newline at end of file
@@ -1,20 +1,23 @@
 """
 Cart Views
-Handles cart display, adding items, removing items, and updating quantities
+Handles cart display, adding items, removing items, updating quantities,
+and batched JSON cart updates
 """
 
+import json
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.views.decorators.http import require_POST
 from store.models import Product
-from .cart import Cart
+from .cart import Cart, get_cart
 
 
 def cart_detail(request):
     """
     Display cart contents
     """
-    cart = Cart(request)
+    cart = get_cart(request)
     
     # Calculate totals for template
     for item in cart:
@@ -24,7 +27,7 @@ def cart_detail(request):
         }
     
     context = {'cart': cart}
-    return render(request, 'cart/cart_detail.html', context)
+    return render(request, 'cart/cart_details.html', context)
 
 
 @require_POST
@@ -32,7 +35,7 @@ def cart_add(request, product_id):
     """
     Add a product to the cart
     """
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id)
     
     quantity = int(request.POST.get('quantity', 1))
@@ -53,7 +56,7 @@ def cart_remove(request, product_id):
     """
     Remove a product from the cart
     """
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id)
     cart.remove(product)
     messages.info(request, f'{product.name} removed from cart.')
@@ -66,7 +69,7 @@ def cart_update(request, product_id):
     """
     Update product quantity in cart
     """
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id)
     
     quantity = int(request.POST.get('quantity', 1))
@@ -83,4 +86,123 @@ def cart_update(request, product_id):
         cart.remove(product)
         messages.info(request, f'{product.name} removed from cart.')
     
-    return redirect('cart:cart_detail')
\ No newline at end of file
+    return redirect('cart:cart_detail')
+
+
+# Operations accepted by cart_batch
+BATCH_OPERATIONS = ('add', 'set', 'remove')
+
+# Upper bound on operations per batch request
+MAX_BATCH_OPERATIONS = 100
+
+
+def cart_summary(cart):
+    """
+    Build the JSON-serializable cart summary returned by cart_batch
+    """
+    return {
+        'count': len(cart),
+        'total_price': str(cart.get_total_price()),
+        'items': [
+            {
+                'product_id': item['product'].id,
+                'name': item['product'].name,
+                'quantity': item['quantity'],
+                'price': str(item['price']),
+                'total_price': str(item['total_price']),
+            }
+            for item in cart
+        ],
+    }
+
+
+@require_POST
+def cart_batch(request):
+    """
+    Apply a list of cart operations atomically and return the new cart as JSON
+    
+    Expects a JSON body such as:
+        {"operations": [
+            {"op": "add", "product_id": 3, "quantity": 2},
+            {"op": "set", "product_id": 5, "quantity": 1},
+            {"op": "remove", "product_id": 7}
+        ]}
+    
+    All products are loaded in one query and every resulting quantity is
+    checked against stock before anything changes. If any operation is
+    invalid, nothing is applied and the errors are returned with status 400.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        operations = payload['operations']
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse(
+            {'ok': False, 'errors': ['Expected a JSON object with an "operations" list.']},
+            status=400
+        )
+    
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({'ok': False, 'errors': ['"operations" must be a non-empty list.']}, status=400)
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return JsonResponse(
+            {'ok': False, 'errors': [f'At most {MAX_BATCH_OPERATIONS} operations per request.']},
+            status=400
+        )
+    
+    # Validate the shape of every operation first
+    errors = []
+    parsed = []
+    for index, operation in enumerate(operations):
+        try:
+            op = operation['op']
+            product_id = int(operation['product_id'])
+            quantity = int(operation.get('quantity', 1)) if op != 'remove' else 0
+        except (TypeError, KeyError, ValueError):
+            errors.append(f'Operation {index}: needs "op", an integer "product_id" and "quantity".')
+            continue
+        if op not in BATCH_OPERATIONS:
+            errors.append(f'Operation {index}: unknown op "{op}".')
+        elif op == 'add' and quantity < 1:
+            errors.append(f'Operation {index}: quantity must be at least 1.')
+        elif op == 'set' and quantity < 0:
+            errors.append(f'Operation {index}: quantity cannot be negative.')
+        else:
+            parsed.append((index, op, product_id, quantity))
+    
+    if errors:
+        return JsonResponse({'ok': False, 'errors': errors}, status=400)
+    
+    cart = get_cart(request)
+    products = Product.objects.select_related('category').only(
+        *Cart.PRODUCT_FIELDS
+    ).in_bulk({product_id for _, _, product_id, _ in parsed})
+    
+    # Work out the final quantity of each product in order
+    quantities = {}
+    for index, op, product_id, quantity in parsed:
+        if product_id not in products:
+            errors.append(f'Operation {index}: product {product_id} does not exist.')
+            continue
+        current = quantities.get(product_id)
+        if current is None:
+            current = cart.cart.get(str(product_id), {}).get('quantity', 0)
+        if op == 'add':
+            quantities[product_id] = current + quantity
+        elif op == 'set':
+            quantities[product_id] = quantity
+        else:
+            quantities[product_id] = 0
+    
+    # Validate stock for all resulting quantities in one pass
+    for product_id, quantity in quantities.items():
+        product = products[product_id]
+        if quantity > 0 and not product.available:
+            errors.append(f'{product.name} is not available.')
+        elif quantity > product.stock:
+            errors.append(f'Only {product.stock} of {product.name} available in stock.')
+    
+    if errors:
+        return JsonResponse({'ok': False, 'errors': errors}, status=400)
+    
+    cart.set_quantities(quantities, products)
+    return JsonResponse({'ok': True, 'cart': cart_summary(cart)})
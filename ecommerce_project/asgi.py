@@ -13,4 +13,7 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_project.settings')
 
+# Serve orders:payment with the non-blocking async view under ASGI
+os.environ.setdefault('ORDERS_ASYNC_PAYMENT', '1')
+
 application = get_asgi_application()
@@ -0,0 +1,331 @@
+"""
+Project Cache
+Two-tier cache backend with tag-based purging and stampede protection
+
+TieredCache keeps a small in-process LRU in front of a shared backend
+(file-based by default, Redis or Memcached in production). Reads are served
+from process memory when possible; writes go to both tiers. Local copies
+live for a few seconds at most, so a purge made by one worker is seen by
+every other worker shortly afterwards.
+
+On top of the backend:
+    set_tagged()/get_tagged() store values under tags, and purge_tags()
+    invalidates everything carrying a tag by bumping the tag's version.
+
+    remember() computes hot values once per expiry: a single caller wins a
+    lock and rebuilds while everyone else keeps serving the previous value,
+    and entries are refreshed probabilistically before they expire so
+    the rebuild rarely happens under a thundering herd.
+
+The lock is taken with the shared backend's add(), so it is only as
+strict as that add(). Redis and Memcached add atomically. The file-based
+default checks for the key and then writes it, so two workers may now
+and then both win and rebuild the same value; use one of the former as
+the shared tier where a duplicate rebuild is expensive.
+"""
+
+import math
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+# In-process LRU tiers, shared by every thread of the worker
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """
+    Thread-safe LRU of pickled values with a per-entry expiry
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (True, value) on a hit, (False, None) on a miss"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires_at, pickled = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+        return True, pickle.loads(pickled)
+
+    def set(self, key, value, timeout):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, pickled)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache(BaseCache):
+    """
+    Cache backend with an in-process LRU in front of a shared cache alias
+
+    Options:
+        SHARED_ALIAS: Alias in settings.CACHES of the shared backend
+        LOCAL_MAX_ENTRIES: Size of the in-process LRU
+        LOCAL_TIMEOUT: Seconds a value may be served from process memory
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED_ALIAS', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        with _local_tiers_lock:
+            self.local = _local_tiers.setdefault(location or 'default', LocalTier(max_entries))
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_key(self, key, version):
+        return self.shared.make_and_validate_key(key, version=version)
+
+    def _local_timeout(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.local_timeout
+        return min(self.local_timeout, max(timeout - time.time(), 0))
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        hit, value = self.local.get(local_key)
+        if hit:
+            return value
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            return default
+        self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            hit, value = self.local.get(self._local_key(key, version))
+            if hit:
+                found[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self.local.set(self._local_key(key, version), value, self.local_timeout)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        self.shared.set(key, value, timeout, version=version)
+        local_key = self._local_key(key, version)
+        if timeout is not None and timeout <= 0:
+            self.local.delete(local_key)
+        else:
+            self.local.set(local_key, value, self._local_timeout(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self.local.set(self._local_key(key, version), value, self._local_timeout(timeout))
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Must hit the shared tier: add() is used for cross-process locks,
+        # which are atomic only if the shared backend's add() is
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self.local.set(self._local_key(key, version), value, self._local_timeout(timeout))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self._local_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.local.delete(self._local_key(key, version))
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        hit, _ = self.local.get(self._local_key(key, version))
+        return hit or self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(self._local_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+# Tags
+
+def _tag_key(tag):
+    return f'tag:{tag}'
+
+
+def tag_versions(tags, create=False):
+    """
+    Return {tag: version} for the given tags
+
+    Args:
+        create: Start a version for tags that have none yet; otherwise
+            missing tags are left out (and entries using them are stale)
+    """
+    keys = {_tag_key(tag): tag for tag in tags}
+    stored = cache.get_many(list(keys))
+    versions = {keys[key]: version for key, version in stored.items()}
+    if create:
+        for tag in tags:
+            if tag not in versions:
+                version = time.time_ns()
+                if not cache.add(_tag_key(tag), version, None):
+                    version = cache.get(_tag_key(tag), version)
+                versions[tag] = version
+    return versions
+
+
+def purge_tags(*tags):
+    """
+    Invalidate every entry stored with any of the given tags
+
+    Other workers may keep serving their in-process copy of a tag's old
+    version for up to LOCAL_TIMEOUT seconds.
+    """
+    for tag in tags:
+        cache.set(_tag_key(tag), time.time_ns(), None)
+
+
+def set_tagged(key, value, timeout=DEFAULT_TIMEOUT, tags=()):
+    """Store a value that is invalidated when any of its tags is purged"""
+    entry = {'value': value, 'tags': tag_versions(tags, create=True)}
+    cache.set(key, entry, timeout)
+
+
+def _read_tagged(key):
+    """Return the stored entry if it exists and none of its tags were purged"""
+    entry = cache.get(key)
+    if not isinstance(entry, dict) or 'tags' not in entry:
+        return None
+    if entry['tags'] and tag_versions(entry['tags']) != entry['tags']:
+        return None
+    return entry
+
+
+def get_tagged(key, default=None):
+    """Return a value stored with set_tagged(), or default if it is missing or purged"""
+    entry = _read_tagged(key)
+    return default if entry is None else entry['value']
+
+
+# Stampede protection
+
+# How long waiting callers poll for a value someone else is computing
+WAIT_TIMEOUT = 5.0
+WAIT_INTERVAL = 0.05
+
+
+def _store(key, compute, timeout, tags, lock_timeout):
+    start = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - start
+    entry = {
+        'value': value,
+        'tags': tag_versions(tags, create=True),
+        'delta': delta,
+        'expires_at': time.time() + timeout,
+    }
+    # Keep the entry past its logical expiry so others can serve it while
+    # a single caller rebuilds it
+    cache.set(key, entry, timeout + lock_timeout)
+    return value
+
+
+def remember(key, compute, timeout, tags=(), beta=1.0, lock_timeout=30):
+    """
+    Return a cached value, computing it at most once per expiry across workers
+
+    Each caller may refresh the value early, with a probability that grows
+    as the expiry nears and with how long compute() took last time
+    (probabilistic early expiration). Only the caller holding the rebuild
+    lock recomputes; the others serve the previous value, or wait briefly
+    for the winner if there is none yet. With a shared backend whose add()
+    is not atomic, such as the file cache, this is best-effort: now and
+    then two callers both rebuild.
+
+    Args:
+        key: Cache key
+        compute: Zero-argument callable producing the value
+        timeout: Seconds the value is considered fresh
+        tags: Tags that invalidate the value when purged
+        beta: Early refresh eagerness; 0 disables it, >1 refreshes earlier
+        lock_timeout: Upper bound on how long a rebuild may hold the lock
+
+    Returns:
+        The cached or freshly computed value
+    """
+    entry = _read_tagged(key)
+    if entry is not None and 'expires_at' in entry:
+        # XFetch: -log(U) is exponentially distributed, so early refreshes
+        # are rare far from expiry and near certain right before it
+        early = entry['delta'] * beta * -math.log(1.0 - random.random())
+        if time.time() + early < entry['expires_at']:
+            return entry['value']
+    else:
+        entry = None
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            return _store(key, compute, timeout, tags, lock_timeout)
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        # Somebody else is rebuilding; the previous value is still good enough
+        return entry['value']
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = _read_tagged(key)
+        if entry is not None:
+            return entry['value']
+    # The rebuild is taking too long; compute our own copy rather than fail
+    return _store(key, compute, timeout, tags, lock_timeout)
@@ -0,0 +1,292 @@
+"""
+Request Metrics
+Per-view latency, SQL, template and response-size metrics in Prometheus format
+
+MetricsMiddleware times every request and files it under the resolved view
+name (e.g. store:product_detail). SQL queries are counted by an execute
+wrapper installed on every database connection, and template render time
+by InstrumentedDjangoTemplates; both report into the current request via a
+context variable, so async views and sync_to_async calls are covered too.
+
+Metrics live in process memory, so each worker exposes its own numbers;
+Prometheus sums them across scrape targets.
+"""
+
+import contextvars
+import hmac
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+UNRESOLVED = '<unresolved>'
+
+# Other request methods share one label, so clients cannot create new series
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'))
+OTHER_METHOD = 'other'
+
+
+class RequestStats:
+    """Counters accumulated while a single request is processed"""
+    __slots__ = ('queries', 'sql_seconds', 'template_seconds', 'template_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        # Templates being rendered; only the outermost render is timed
+        self.template_depth = 0
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a running sum and count"""
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class ViewMetrics:
+    """All metrics recorded for one (view, method) pair"""
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.response_bytes = 0
+        self.statuses = {}
+
+
+class MetricsRegistry:
+    """
+    Thread-safe, in-process store of per-view metrics
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, method, status, seconds, stats, size):
+        if method not in METHODS:
+            method = OTHER_METHOD
+        with self._lock:
+            metrics = self._views.get((view, method))
+            if metrics is None:
+                metrics = self._views[(view, method)] = ViewMetrics()
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(stats.queries)
+            metrics.sql_seconds += stats.sql_seconds
+            metrics.template_seconds += stats.template_seconds
+            metrics.response_bytes += size
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = []
+
+            def header(name, kind, text):
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+
+            def histogram(name, attribute):
+                for (view, method), metrics in views:
+                    hist = getattr(metrics, attribute)
+                    labels = _labels(view, method)
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+                    lines.append(f'{name}_sum{{{labels}}} {hist.total}')
+                    lines.append(f'{name}_count{{{labels}}} {hist.count}')
+
+            def counter(name, attribute):
+                for (view, method), metrics in views:
+                    labels = _labels(view, method)
+                    lines.append(f'{name}{{{labels}}} {getattr(metrics, attribute)}')
+
+            header('django_requests_total', 'counter', 'Requests by view, method and status code.')
+            for (view, method), metrics in views:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(
+                        f'django_requests_total{{{_labels(view, method)},status="{status}"}} {count}'
+                    )
+
+            header('django_request_duration_seconds', 'histogram', 'Request latency by view.')
+            histogram('django_request_duration_seconds', 'latency')
+
+            header('django_request_sql_queries', 'histogram', 'SQL queries per request by view.')
+            histogram('django_request_sql_queries', 'queries')
+
+            header('django_request_sql_seconds_total', 'counter', 'Time spent in SQL by view.')
+            counter('django_request_sql_seconds_total', 'sql_seconds')
+
+            header('django_request_template_seconds_total', 'counter', 'Time spent rendering templates by view.')
+            counter('django_request_template_seconds_total', 'template_seconds')
+
+            header('django_response_bytes_total', 'counter', 'Response body bytes by view.')
+            counter('django_response_bytes_total', 'response_bytes')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(view, method):
+    return f'view="{_escape(view)}",method="{_escape(method)}"'
+
+
+registry = MetricsRegistry()
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """Database execute wrapper that charges query count and time to the current request"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.sql_seconds += time.perf_counter() - start
+
+
+def install_sql_wrapper(sender, connection, **kwargs):
+    """Attach sql_wrapper to each new database connection"""
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+class InstrumentedTemplate(Template):
+    """
+    Template whose top-level render time is charged to the current request
+
+    Templates rendered from inside another one (e.g. product cards rendered
+    while the page renders) are already covered by the outer render.
+    """
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        start = None if stats.template_depth else time.perf_counter()
+        stats.template_depth += 1
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if start is not None:
+                stats.template_seconds += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend that records render time for MetricsMiddleware
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, SQL, template and response-size metrics per resolved view
+
+    Place it first in MIDDLEWARE so the timings cover the whole stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(install_sql_wrapper, dispatch_uid='metrics_sql_wrapper')
+        for connection in connections.all(initialized_only=True):
+            install_sql_wrapper(None, connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, seconds):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNRESOLVED
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        registry.record(view, request.method, response.status_code, seconds, stats, size)
+
+
+def metrics_view(request):
+    """
+    Expose metrics in Prometheus text format
+
+    Staff users can open it in the browser; scrapers send
+    'Authorization: Bearer <settings.METRICS_TOKEN>'. Anyone else gets a 404.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    token_ok = bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+    if not token_ok and not (request.user.is_authenticated and request.user.is_staff):
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -5,6 +5,7 @@ Production-ready configuration with security best practices.
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,12 +45,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ecommerce_project.metrics.MetricsMiddleware',  # Per-view latency/SQL metrics (keep first)
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',  # Hashed, precompressed static files
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'cart.middleware.CartMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -57,7 +61,8 @@ ROOT_URLCONF = 'ecommerce_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that also records render time for /metrics/
+        'BACKEND': 'ecommerce_project.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -80,9 +85,68 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent checkouts queue up
+            # instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Use PostgreSQL (or any database) from DATABASE_URL when it is set
+if os.environ.get('DATABASE_URL'):
+    import dj_database_url
+    DATABASES['default'] = dj_database_url.config(conn_max_age=600)
+
+# Cache
+# A small in-process LRU (ecommerce_project.cache.TieredCache) in front of a
+# shared backend. The file cache works across workers on one host; point
+# CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached for several hosts, or
+# wherever duplicate rebuilds of hot values must be ruled out (the file
+# cache's add(), used as the rebuild lock, is not atomic).
+CACHES = {
+    'default': {
+        'BACKEND': 'ecommerce_project.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED_ALIAS': 'shared',
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,  # Seconds other workers may serve a purged value
+        },
+    },
+    'shared': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+        'TIMEOUT': 300,
+    },
+}
+
+# Tests keep their entries in memory instead of the file cache of a real run
+if sys.argv[1:2] == ['test']:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+        'TIMEOUT': 300,
+    }
+
+# Stale-while-revalidate
+# Anonymous visitors get the last good rendering of these catalog pages;
+# after soft_ttl it is refreshed in the background, and it keeps being
+# served for up to hard_ttl seconds if refreshing fails (e.g. database down).
+# Enable with STALE_WHILE_REVALIDATE=1; remove a view here to opt it out.
+STALE_WHILE_REVALIDATE = {
+    'store:home': {'soft_ttl': 30, 'hard_ttl': 3600},
+    'store:product_list': {'soft_ttl': 30, 'hard_ttl': 3600},
+    'store:category_products': {'soft_ttl': 60, 'hard_ttl': 3600},
+    'store:product_detail': {'soft_ttl': 60, 'hard_ttl': 3600},
+} if os.environ.get('STALE_WHILE_REVALIDATE') == '1' else {}
+
+# Conditional GET
+# Seconds a reverse proxy may keep catalog pages shown to anonymous visitors
+# (Cache-Control s-maxage); browsers always revalidate with ETag/Last-Modified
+STORE_PROXY_MAX_AGE = 60
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -112,10 +176,27 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# Above-the-fold CSS inlined into base.html (set to None to link style.css normally)
+CRITICAL_CSS = 'css/critical.css'
+
 # Media files (User uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are stored once per distinct content under media/blobs/ and never
+# change, so serve MEDIA_URL + 'blobs/' with far-future cache headers.
+# Run "manage.py gc_media" periodically to remove unreferenced blobs.
+STORAGES = {
+    'default': {
+        'BACKEND': 'ecommerce_project.storage.ContentAddressedStorage',
+    },
+    # collectstatic writes content-hashed names plus .gz/.br variants;
+    # WhiteNoise serves hashed files with immutable, far-future headers
+    'staticfiles': {
+        'BACKEND': 'ecommerce_project.storage.StaticStorage',
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -147,6 +228,13 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # Stripe
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', 'your_stripe_publishable_key')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', 'your_stripe_secret_key')
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE', 'https://api.stripe.com')
+STRIPE_CONNECT_TIMEOUT = 5  # seconds
+STRIPE_READ_TIMEOUT = 20  # seconds
+STRIPE_MAX_CONNECTIONS = 100
+
+# Serve orders:payment with the async view (use with the ASGI entry point)
+ORDERS_ASYNC_PAYMENT = os.environ.get('ORDERS_ASYNC_PAYMENT', '') == '1'
 
 # Razorpay
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', 'your_razorpay_key_id')
@@ -154,8 +242,28 @@ RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', 'your_razorpay_secre
 
 # Session Configuration
 CART_SESSION_ID = 'cart'
+CART_COUNT_COOKIE_NAME = 'cart_count'  # Navbar badge, read without touching the session
+
+# Cart Storage
+# cart.storage.SessionCartStorage      - Django session (default)
+# cart.storage.SignedCookieCartStorage - signed cookie, no server-side I/O
+# cart.storage.CacheCartStorage        - cache, keyed by a signed cookie id
+# cart.storage.DatabaseCartStorage     - CartItem rows for logged-in users;
+#                                        anonymous carts use CART_ANONYMOUS_STORAGE
+#                                        and are merged on login
+CART_STORAGE = os.environ.get('CART_STORAGE', 'cart.storage.SessionCartStorage')
+CART_ANONYMOUS_STORAGE = 'cart.storage.SignedCookieCartStorage'
+CART_COOKIE_NAME = 'cart'
 SESSION_COOKIE_AGE = 86400  # 24 hours in seconds
 
+# Metrics
+# /metrics/ is open to staff users, or to scrapers sending "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Inventory
+# Seconds stock stays reserved for an unpaid order (run release_expired_reservations periodically)
+STOCK_RESERVATION_TIMEOUT = 15 * 60
+
 #Expiration Time
 PASSWORD_RESET_TIMEOUT = 3600
 
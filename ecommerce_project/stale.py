@@ -0,0 +1,171 @@
+"""
+Stale-While-Revalidate Views
+Serve the last good rendering of read-only pages to anonymous visitors
+
+A decorated view's response is kept in the cache. Until its soft TTL it is
+served as is; after that it is still served immediately while one
+background thread renders a fresh copy. If that refresh fails (e.g. the
+database is down) the old copy keeps being served until its hard TTL.
+
+Only anonymous visitors without a cart or pending messages are served
+this way, and only views listed in settings.STALE_WHILE_REVALIDATE:
+
+    STALE_WHILE_REVALIDATE = {
+        'store:home': {'soft_ttl': 30, 'hard_ttl': 3600},
+    }
+"""
+
+import hashlib
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from importlib import import_module
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import close_old_connections, connections
+from django.http import HttpRequest, HttpResponse
+from django.middleware.csrf import get_token
+from .cache import tag_versions
+
+
+logger = logging.getLogger(__name__)
+
+# Background refreshes run on a small shared pool so a burst of stale
+# pages cannot spawn unbounded threads
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='stale-refresh')
+
+# Upper bound on one background render holding the refresh lock
+REFRESH_LOCK_TIMEOUT = 60
+
+# CSRF tokens are per visitor, so they are swapped out of the stored page
+CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = rb'\1__csrf_token__\2'
+
+
+def view_config(name):
+    """Return the soft/hard TTL settings for a view, or None if disabled"""
+    return getattr(settings, 'STALE_WHILE_REVALIDATE', {}).get(name)
+
+
+def is_cacheable_request(request):
+    """
+    Check whether a request may be answered with a shared rendering
+
+    Logged-in users, visitors with something in the cart and visitors
+    with pending flash messages all see personalised pages.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.COOKIES.get(settings.CART_COOKIE_NAME):
+        return False
+    if request.COOKIES.get(settings.CART_COUNT_COOKIE_NAME, '0') != '0':
+        return False
+    if request.COOKIES.get('messages'):
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        session = request.session
+        if settings.CART_SESSION_ID in session or '_messages' in session:
+            return False
+    return not request.user.is_authenticated
+
+
+def _cache_key(name, request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'stale:{name}:{path}'
+
+
+def _anonymous_copy(request):
+    """Build a cookie-less anonymous request for rendering in the background"""
+    clone = HttpRequest()
+    clone.method = 'GET'
+    clone.path = request.path
+    clone.path_info = request.path_info
+    clone.GET = request.GET.copy()
+    clone.META = {
+        key: value for key, value in request.META.items()
+        if isinstance(value, str) and key != 'HTTP_COOKIE'
+    }
+    clone.user = AnonymousUser()
+    clone.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    clone.resolver_match = request.resolver_match
+    return clone
+
+
+def _store(key, response, tags, hard_ttl):
+    """Keep a rendered 200 response; returns False if it cannot be shared"""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    cache.set(key, {
+        'content': CSRF_INPUT.sub(CSRF_PLACEHOLDER, response.content),
+        'content_type': response['Content-Type'],
+        'stored_at': time.time(),
+        'tags': tag_versions(tags, create=True),
+    }, hard_ttl)
+    return True
+
+
+def _replay(request, entry, state):
+    """Rebuild a response from a stored entry for this visitor"""
+    content = entry['content']
+    if b'__csrf_token__' in content:
+        content = content.replace(b'__csrf_token__', get_token(request).encode())
+    response = HttpResponse(content, content_type=entry['content_type'])
+    response['X-Stale-Cache'] = state
+    return response
+
+
+def _refresh(view, request, args, kwargs, key, tags, hard_ttl):
+    """Render a fresh copy in the background; failures keep the stale copy"""
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        _store(key, response, tags, hard_ttl)
+    except Exception:
+        logger.exception('Background refresh of %s failed; serving stale copy', key)
+    finally:
+        cache.delete(f'{key}:refresh')
+        connections.close_all()
+
+
+def stale_while_revalidate(name, tags=()):
+    """
+    Serve a view's last good response while refreshing it in the background
+
+    Args:
+        name: Key of the view in settings.STALE_WHILE_REVALIDATE
+        tags: Cache tags whose purge marks the stored response as stale
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            config = view_config(name)
+            if config is None or not is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            key = _cache_key(name, request)
+            entry = cache.get(key)
+            if entry is not None:
+                fresh = (
+                    time.time() - entry['stored_at'] < config['soft_ttl']
+                    and tag_versions(entry['tags']) == entry['tags']
+                )
+                if fresh:
+                    return _replay(request, entry, 'hit')
+                if cache.add(f'{key}:refresh', 1, REFRESH_LOCK_TIMEOUT):
+                    _executor.submit(
+                        _refresh, view, _anonymous_copy(request), args, kwargs,
+                        key, tags, config['hard_ttl'],
+                    )
+                return _replay(request, entry, 'stale')
+
+            response = view(request, *args, **kwargs)
+            if _store(key, response, tags, config['hard_ttl']):
+                response['X-Stale-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
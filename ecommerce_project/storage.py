@@ -0,0 +1,190 @@
+"""
+Content-Addressed Media Storage
+Stores uploads by the SHA-256 of their content so identical files are kept once
+
+An upload named products/photo.PNG is written to
+
+    MEDIA_ROOT/blobs/<hash[:2]>/<hash>.png
+
+Uploading the same bytes again (as another product, a category, ...)
+returns the existing blob instead of writing a copy. Blob URLs change
+whenever the content does, so they can be cached forever; serve_media()
+adds the far-future headers in development, and the web server should do
+the same for MEDIA_URL + 'blobs/' in production.
+
+Blobs may be shared by several rows, so delete() leaves them in place;
+run the gc_media command to remove blobs nothing references any more.
+Names outside the hashed prefixes (e.g. image derivatives, which already
+carry a content hash) are stored as-is.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from django.core.files.storage import FileSystemStorage
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+BLOB_DIR = 'blobs'
+
+# Seconds browsers and proxies may cache a blob (one year)
+BLOB_MAX_AGE = 60 * 60 * 24 * 365
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names uploads after their content hash
+
+    Args:
+        passthrough_prefixes: Name prefixes stored under their own name
+    """
+    content_addressed = True
+
+    def __init__(self, *args, passthrough_prefixes=('derivatives/',), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.passthrough_prefixes = tuple(passthrough_prefixes)
+
+    def _is_passthrough(self, name):
+        return name.replace('\\', '/').startswith(self.passthrough_prefixes)
+
+    def blob_name(self, digest, extension):
+        """Storage name of the blob holding content with the given hash"""
+        return f'{BLOB_DIR}/{digest[:2]}/{digest}{extension.lower()}'
+
+    def is_blob(self, name):
+        """Check whether a stored name is a content-addressed blob"""
+        return name.replace('\\', '/').startswith(f'{BLOB_DIR}/')
+
+    def get_available_name(self, name, max_length=None):
+        # Blob names are chosen in _save(); identical content reuses its name
+        if self._is_passthrough(name):
+            return super().get_available_name(name, max_length)
+        return name
+
+    def _save(self, name, content):
+        if self._is_passthrough(name):
+            return super()._save(name, content)
+
+        # Hash while copying to a temporary file, one chunk at a time
+        temporary_dir = self.path(f'{BLOB_DIR}/tmp')
+        os.makedirs(temporary_dir, exist_ok=True)
+        sha = hashlib.sha256()
+        handle = tempfile.NamedTemporaryFile(dir=temporary_dir, delete=False)
+        try:
+            with handle:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    sha.update(chunk)
+                    handle.write(chunk)
+
+            blob = self.blob_name(sha.hexdigest(), os.path.splitext(name)[1])
+            path = self.path(blob)
+            if os.path.exists(path):
+                # Duplicate upload: keep the existing blob, and touch it so
+                # gc_media's min_age protects it until the new row is saved
+                os.unlink(handle.name)
+                os.utime(path)
+                return blob
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(handle.name, self.file_permissions_mode)
+            os.replace(handle.name, path)
+            return blob
+        except BaseException:
+            if os.path.exists(handle.name):
+                os.unlink(handle.name)
+            raise
+
+    def delete(self, name):
+        # Blobs can be shared between rows; gc_media removes unreferenced ones
+        if name and self.is_blob(name):
+            return
+        super().delete(name)
+
+
+class StaticStorage(CompressedManifestStaticFilesStorage):
+    """
+    Hashed, gzip/brotli-compressed static files
+
+    Until collectstatic has produced a manifest (a fresh checkout or a test
+    run), {% static %} falls back to the unhashed name instead of failing.
+    """
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.hashed_files:
+                raise
+            return name
+
+
+def serve_media(request, path, document_root=None):
+    """
+    Development media view that marks blobs as immutable
+
+    Blob URLs change with their content, so clients never need to
+    revalidate them.
+    """
+    response = serve(request, path, document_root=document_root)
+    if path.startswith(f'{BLOB_DIR}/'):
+        patch_cache_control(response, public=True, max_age=BLOB_MAX_AGE, immutable=True)
+    return response
+
+
+def referenced_names():
+    """Return every file name stored in a FileField/ImageField of any model"""
+    from django.apps import apps
+    from django.db.models import FileField
+
+    names = set()
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, FileField):
+                names.update(
+                    model._default_manager.exclude(**{field.name: ''})
+                    .exclude(**{f'{field.name}__isnull': True})
+                    .values_list(field.name, flat=True)
+                    .iterator()
+                )
+    return names
+
+
+def collect_garbage(storage, referenced, min_age=3600, dry_run=False):
+    """
+    Remove blobs (and leftover temporary files) nothing references
+
+    Args:
+        storage: ContentAddressedStorage to clean
+        referenced: Set of names still in use (see referenced_names())
+        min_age: Seconds a file must be untouched before it is removed, so
+            uploads whose row is not saved yet survive
+        dry_run: Only report what would be removed
+
+    Returns:
+        (number of files removed, bytes freed)
+    """
+    root = storage.path(BLOB_DIR)
+    cutoff = time.time() - min_age
+    removed = freed = 0
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+            if name in referenced:
+                continue
+            stat = os.stat(path)
+            if stat.st_mtime > cutoff:
+                continue
+            if not dry_run:
+                os.unlink(path)
+            removed += 1
+            freed += stat.st_size
+    return removed, freed
@@ -0,0 +1,192 @@
+import time
+from unittest import mock
+from django.core.cache import cache, caches
+from django.template import engines
+from django.test import SimpleTestCase
+from . import cache as project_cache
+from . import metrics
+from .cache import LocalTier
+
+
+class LocalTierTests(SimpleTestCase):
+    """
+    The in-process tier is a bounded LRU whose entries expire
+    """
+
+    def test_least_recently_used_entry_is_evicted(self):
+        tier = LocalTier(max_entries=2)
+        tier.set('a', 1, 60)
+        tier.set('b', 2, 60)
+        tier.get('a')
+        tier.set('c', 3, 60)
+        self.assertEqual(tier.get('a'), (True, 1))
+        self.assertEqual(tier.get('b'), (False, None))
+        self.assertEqual(tier.get('c'), (True, 3))
+
+    def test_expired_entry_is_a_miss(self):
+        tier = LocalTier(max_entries=2)
+        tier.set('a', 1, 0)
+        self.assertEqual(tier.get('a'), (False, None))
+
+    def test_values_are_copies(self):
+        tier = LocalTier(max_entries=2)
+        value = ['original']
+        tier.set('a', value, 60)
+        value.append('changed')
+        self.assertEqual(tier.get('a'), (True, ['original']))
+
+
+class TieredCacheTests(SimpleTestCase):
+    """
+    The default cache reads through process memory and writes to both tiers
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.shared = caches['shared']
+
+    def test_set_writes_both_tiers(self):
+        cache.set('key', 'value')
+        self.assertEqual(self.shared.get('key'), 'value')
+        # Served from process memory even once the shared copy is gone
+        self.shared.delete('key')
+        self.assertEqual(cache.get('key'), 'value')
+
+    def test_get_fills_the_local_tier(self):
+        self.shared.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        self.shared.set('key', 'other')
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.get('missing', 'default'), 'default')
+
+    def test_get_many_mixes_tiers(self):
+        cache.set('local', 1)
+        self.shared.set('shared', 2)
+        self.assertEqual(cache.get_many(['local', 'shared', 'missing']), {'local': 1, 'shared': 2})
+
+    def test_delete_clears_both_tiers(self):
+        cache.set('key', 'value')
+        cache.delete('key')
+        self.assertIsNone(cache.get('key'))
+        self.assertIsNone(self.shared.get('key'))
+
+    def test_add_goes_to_the_shared_tier(self):
+        self.shared.set('lock', 1)
+        self.assertFalse(cache.add('lock', 2))
+        self.assertTrue(cache.add('other', 2))
+        self.assertEqual(self.shared.get('other'), 2)
+
+    def test_incr_drops_the_local_copy(self):
+        cache.set('counter', 1)
+        self.assertEqual(cache.incr('counter'), 2)
+        self.assertEqual(cache.get('counter'), 2)
+
+
+class TaggedCacheTests(SimpleTestCase):
+    """
+    Purging a tag invalidates every entry stored under it, and nothing else
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_purge_invalidates_tagged_entries(self):
+        project_cache.set_tagged('products', 'list', tags=['products'])
+        project_cache.set_tagged('mixed', 'page', tags=['products', 'categories'])
+        project_cache.set_tagged('categories', 'menu', tags=['categories'])
+        project_cache.set_tagged('untagged', 'value')
+
+        project_cache.purge_tags('products')
+        self.assertIsNone(project_cache.get_tagged('products'))
+        self.assertEqual(project_cache.get_tagged('mixed', 'gone'), 'gone')
+        self.assertEqual(project_cache.get_tagged('categories'), 'menu')
+        self.assertEqual(project_cache.get_tagged('untagged'), 'value')
+
+    def test_tag_versions(self):
+        self.assertEqual(project_cache.tag_versions(['new']), {})
+        created = project_cache.tag_versions(['new'], create=True)
+        self.assertEqual(project_cache.tag_versions(['new'], create=True), created)
+        project_cache.purge_tags('new')
+        self.assertNotEqual(project_cache.tag_versions(['new']), created)
+
+    def test_entries_stored_with_plain_set_are_ignored(self):
+        cache.set('plain', 'value')
+        self.assertIsNone(project_cache.get_tagged('plain'))
+
+
+class RememberTests(SimpleTestCase):
+    """
+    remember() computes a value once per expiry and serves it in between
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.compute = mock.Mock(side_effect=range(100))
+
+    def test_value_is_computed_once_until_purged(self):
+        self.assertEqual(project_cache.remember('key', self.compute, 60, tags=['t'], beta=0), 0)
+        self.assertEqual(project_cache.remember('key', self.compute, 60, tags=['t'], beta=0), 0)
+        project_cache.purge_tags('t')
+        self.assertEqual(project_cache.remember('key', self.compute, 60, tags=['t'], beta=0), 1)
+        self.assertFalse(cache.has_key('key:lock'))
+
+    def test_expired_value_is_rebuilt(self):
+        project_cache.remember('key', self.compute, 0, beta=0)
+        self.assertEqual(project_cache.remember('key', self.compute, 60, beta=0), 1)
+
+    def test_previous_value_is_served_while_another_caller_rebuilds(self):
+        project_cache.remember('key', self.compute, 0, beta=0)
+        cache.add('key:lock', 1)
+        self.assertEqual(project_cache.remember('key', self.compute, 60, beta=0), 0)
+        self.assertEqual(self.compute.call_count, 1)
+
+    @mock.patch.object(project_cache, 'WAIT_TIMEOUT', 0.1)
+    def test_computes_its_own_value_when_the_rebuild_takes_too_long(self):
+        cache.add('key:lock', 1)
+        self.assertEqual(project_cache.remember('key', self.compute, 60, beta=0), 0)
+
+
+class MetricsTests(SimpleTestCase):
+    """
+    Request metrics keep a bounded set of series and count template time once
+    """
+
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry()
+
+    def test_unknown_methods_share_one_label(self):
+        for method in ('GET', 'BREW', 'X"\n'):
+            self.registry.record('store:home', method, 200, 0.01, metrics.RequestStats(), 10)
+        output = self.registry.render()
+        self.assertIn('django_requests_total{view="store:home",method="GET",status="200"} 1', output)
+        self.assertIn('django_requests_total{view="store:home",method="other",status="200"} 2', output)
+        self.assertNotIn('BREW', output)
+
+    def test_labels_are_escaped(self):
+        self.assertEqual(metrics._labels('a"b', 'c\\d'), 'view="a\\"b",method="c\\\\d"')
+
+    def test_nested_renders_are_timed_once(self):
+        backend = next(
+            engine for engine in engines.all() if isinstance(engine, metrics.InstrumentedDjangoTemplates)
+        )
+        inner = backend.from_string('inner')
+
+        def render_inner():
+            time.sleep(0.05)
+            return inner.render({})
+
+        outer = backend.from_string('{{ render_inner }}')
+        stats = metrics.RequestStats()
+        token = metrics._current.set(stats)
+        try:
+            start = time.perf_counter()
+            self.assertEqual(outer.render({'render_inner': render_inner}), 'inner')
+            elapsed = time.perf_counter() - start
+        finally:
+            metrics._current.reset(token)
+        self.assertGreaterEqual(stats.template_seconds, 0.05)
+        self.assertLessEqual(stats.template_seconds, elapsed)
+        self.assertEqual(stats.template_depth, 0)
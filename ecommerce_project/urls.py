@@ -4,9 +4,11 @@ Includes all app URLs and media/static file serving
 """
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from .metrics import metrics_view
+from .storage import serve_media
 
 urlpatterns = [
     # Admin panel
@@ -17,11 +19,21 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),  # User authentication URLs
     path('cart/', include('cart.urls')),  # Shopping cart URLs
     path('orders/', include('orders.urls')),  # Orders and checkout URLs
+    
+    # Prometheus metrics (staff or METRICS_TOKEN only)
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Media goes through serve_media so content-addressed blobs get immutable headers
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'),
+            serve_media,
+            {'document_root': settings.MEDIA_ROOT},
+        ),
+    ]
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 # Customize admin site headers
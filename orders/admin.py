@@ -4,7 +4,11 @@ Customizes admin interface for managing orders
 """
 
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
 from .models import Order, OrderItem
+from . import export, reports
 
 
 class OrderItemInline(admin.TabularInline):
@@ -12,9 +16,14 @@ class OrderItemInline(admin.TabularInline):
     Inline admin for OrderItem - allows editing items within order page
     """
     model = OrderItem
-    raw_id_fields = ['product']
     extra = 0
-    readonly_fields = ['price', 'get_cost']
+    # Items are shown from their product snapshot, without a catalog lookup per row
+    fields = ['product_name', 'product_slug', 'price', 'quantity', 'get_cost']
+    readonly_fields = ['product_name', 'product_slug', 'price', 'get_cost']
+    
+    def has_add_permission(self, request, obj=None):
+        """Items are created at checkout, together with their snapshot"""
+        return False
     
     def get_cost(self, obj):
         """Display total cost for this item"""
@@ -41,7 +50,9 @@ class OrderAdmin(admin.ModelAdmin):
     list_editable = ['status', 'payment_status']
     inlines = [OrderItemInline]
     date_hierarchy = 'created_at'
-    readonly_fields = ['created_at', 'updated_at', 'payment_id']
+    readonly_fields = ['created_at', 'updated_at', 'paid_at', 'payment_id']
+    # Adds a link to the sales dashboard
+    change_list_template = 'admin/orders/order/change_list.html'
     
     fieldsets = (
         ('Order Information', {
@@ -54,12 +65,18 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('address', 'city', 'state', 'postal_code', 'country')
         }),
         ('Timestamps', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('created_at', 'updated_at', 'paid_at'),
             'classes': ('collapse',)
         }),
     )
     
-    actions = ['mark_as_processing', 'mark_as_shipped', 'mark_as_delivered']
+    actions = [
+        'mark_as_processing',
+        'mark_as_shipped',
+        'mark_as_delivered',
+        'export_as_csv',
+        'export_as_jsonl',
+    ]
     
     def mark_as_processing(self, request, queryset):
         """Bulk action to mark orders as processing"""
@@ -77,4 +94,54 @@ class OrderAdmin(admin.ModelAdmin):
         """Bulk action to mark orders as delivered"""
         updated = queryset.update(status='delivered')
         self.message_user(request, f'{updated} orders marked as delivered.')
-    mark_as_delivered.short_description = "Mark selected orders as delivered"
\ No newline at end of file
+    mark_as_delivered.short_description = "Mark selected orders as delivered"
+    
+    def export_as_csv(self, request, queryset):
+        """Stream the selected orders and their items as CSV (one row per item)"""
+        return export.streaming_response(queryset, 'csv')
+    export_as_csv.short_description = "Export selected orders as CSV"
+    
+    def export_as_jsonl(self, request, queryset):
+        """Stream the selected orders and their items as JSON Lines (one order per line)"""
+        return export.streaming_response(queryset, 'jsonl')
+    export_as_jsonl.short_description = "Export selected orders as JSON Lines"
+    
+    def get_urls(self):
+        """Add the sales dashboard under the order admin"""
+        urls = [
+            path(
+                'sales/',
+                self.admin_site.admin_view(self.sales_dashboard_view),
+                name='orders_order_sales',
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    # Periods the dashboard can show, in days
+    DASHBOARD_PERIODS = (7, 30, 90, 365)
+    
+    def sales_dashboard_view(self, request):
+        """
+        Sales dashboard read from the daily roll-ups
+        
+        Only the roll-up tables are read, so the page costs the same
+        however many orders there are; run rollup_sales to bring them
+        up to date.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+        if days not in self.DASHBOARD_PERIODS:
+            days = 30
+        
+        context = {
+            **self.admin_site.each_context(request),
+            **reports.sales_dashboard(days=days),
+            'title': 'Sales dashboard',
+            'opts': self.model._meta,
+            'periods': self.DASHBOARD_PERIODS,
+        }
+        return TemplateResponse(request, 'admin/orders/sales_dashboard.html', context)
@@ -0,0 +1,213 @@
+"""
+Orders Inventory
+Concurrency-safe stock reservation for orders
+
+Stock is taken with conditional UPDATE statements (stock >= quantity), one
+statement per order, so concurrent checkouts can never oversell or drive
+stock negative. Reservations are committed on payment and released (stock
+returned) on failure or when they expire.
+"""
+
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+from store.models import Product
+from .models import StockReservation
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when an order cannot be reserved because stock ran out
+
+    Attributes:
+        products: Products that do not have enough stock left
+    """
+
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(product.name for product in products)
+        super().__init__(f'Not enough stock for: {names}')
+
+
+def _expiry():
+    return timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TIMEOUT)
+
+
+def _delta(quantities):
+    """Build a per-product CASE expression for a stock adjustment"""
+    return Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _take_stock(quantities):
+    """
+    Decrement stock for every product in one conditional UPDATE
+
+    Returns:
+        True if every product had enough stock (all rows updated)
+    """
+    enough = Q()
+    for product_id, quantity in quantities.items():
+        enough |= Q(id=product_id, stock__gte=quantity)
+    updated = Product.objects.filter(enough).update(stock=F('stock') - _delta(quantities))
+    return updated == len(quantities)
+
+
+def _return_stock(quantities):
+    """Give stock back for every product in one UPDATE"""
+    if quantities:
+        Product.objects.filter(id__in=quantities).update(stock=F('stock') + _delta(quantities))
+
+
+def order_quantities(order):
+    """Return {product_id: quantity} for an order's lines"""
+    quantities = Counter()
+    for product_id, quantity in order.items.values_list('product_id', 'quantity'):
+        quantities[product_id] += quantity
+    return dict(quantities)
+
+
+@transaction.atomic
+def reserve(order, quantities=None):
+    """
+    Reserve stock for an order
+
+    Args:
+        order: Order to reserve stock for
+        quantities: Optional {product_id: quantity}; defaults to the order's lines
+
+    Raises:
+        InsufficientStock: If any product is short; nothing is reserved
+
+    Returns:
+        List of created StockReservation rows
+    """
+    if quantities is None:
+        quantities = order_quantities(order)
+    if not quantities:
+        return []
+
+    savepoint = transaction.savepoint()
+    if not _take_stock(quantities):
+        # Undo the partial update before looking up the short products
+        transaction.savepoint_rollback(savepoint)
+        short = [
+            product for product in Product.objects.filter(id__in=quantities).only('id', 'name', 'stock')
+            if product.stock < quantities[product.id]
+        ]
+        raise InsufficientStock(short)
+    transaction.savepoint_commit(savepoint)
+
+    expires_at = _expiry()
+    return StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in quantities.items()
+    ])
+
+
+def _release(reservations):
+    """
+    Release the held reservations in a queryset and return their stock
+
+    Must run inside a transaction; the rows are locked first so two
+    releases of the same reservation cannot both return its stock.
+    """
+    held = list(
+        reservations.select_for_update()
+        .filter(status='held')
+        .values_list('id', 'product_id', 'quantity')
+    )
+    if not held:
+        return 0
+
+    quantities = Counter()
+    for _, product_id, quantity in held:
+        quantities[product_id] += quantity
+
+    StockReservation.objects.filter(id__in=[row[0] for row in held]).update(
+        status='released', updated_at=timezone.now()
+    )
+    _return_stock(dict(quantities))
+    return len(held)
+
+
+@transaction.atomic
+def release(order):
+    """
+    Release an order's held reservations and return their stock
+
+    Safe to call more than once; already released or committed
+    reservations are left alone.
+
+    Returns:
+        Number of reservations released
+    """
+    return _release(StockReservation.objects.filter(order=order))
+
+
+@transaction.atomic
+def ensure_reserved(order):
+    """
+    Make sure an order holds stock right before it is charged
+
+    Refreshes the expiry of existing reservations, or reserves again if
+    they were released (e.g. after a failed payment or a timeout).
+
+    Raises:
+        InsufficientStock: If the stock is no longer available
+    """
+    quantities = order_quantities(order)
+    held = Counter()
+    for product_id, quantity in StockReservation.objects.filter(
+        order=order, status='held'
+    ).values_list('product_id', 'quantity'):
+        held[product_id] += quantity
+
+    if dict(held) == quantities:
+        StockReservation.objects.filter(order=order, status='held').update(
+            expires_at=_expiry(), updated_at=timezone.now()
+        )
+        return
+
+    release(order)
+    reserve(order, quantities)
+
+
+def commit(order):
+    """
+    Mark an order's reservations as fulfilled after a successful payment
+
+    Returns:
+        Number of reservations committed
+    """
+    return StockReservation.objects.filter(order=order, status='held').update(
+        status='committed', updated_at=timezone.now()
+    )
+
+
+def release_expired(now=None):
+    """
+    Release every held reservation past its expiry
+
+    Returns:
+        Number of reservations released
+    """
+    now = now or timezone.now()
+    released = 0
+    order_ids = (
+        StockReservation.objects.filter(status='held', expires_at__lte=now)
+        .values_list('order_id', flat=True)
+        .distinct()
+    )
+    for order_id in list(order_ids):
+        with transaction.atomic():
+            released += _release(
+                StockReservation.objects.filter(order_id=order_id, expires_at__lte=now)
+            )
+    return released
@@ -0,0 +1,79 @@
+"""
+Export Orders Command
+Streams orders and their items to CSV or JSON Lines for reporting
+"""
+
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from orders import export
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Export orders with their items as CSV or JSON Lines, in constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=sorted(export.FORMATS),
+            default='csv',
+            help='Output format (default: csv)'
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write (default: standard output)'
+        )
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            type=date.fromisoformat,
+            help='First order date included (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            type=date.fromisoformat,
+            help='Last order date included (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--status',
+            action='append',
+            choices=[value for value, _ in Order.STATUS_CHOICES],
+            help='Only orders with this status (repeatable)'
+        )
+        parser.add_argument(
+            '--payment-status',
+            action='append',
+            choices=[value for value, _ in Order.PAYMENT_STATUS_CHOICES],
+            help='Only orders with this payment status (repeatable)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=export.CHUNK_SIZE,
+            help=f'Rows fetched per database round trip (default: {export.CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['date_from'] and options['date_to'] and options['date_from'] > options['date_to']:
+            raise CommandError('--from must not be after --to.')
+
+        orders = export.filter_orders(
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            status=options['status'],
+            payment_status=options['payment_status'],
+        )
+        lines = export.export_lines(orders, options['format'], options['chunk_size'])
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        written = 0
+        with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+            for line in lines:
+                handle.write(line)
+                written += 1
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} lines to {options["output"]}.'))
@@ -0,0 +1,15 @@
+"""
+Release Expired Reservations Command
+Returns stock held by unpaid orders whose reservation timed out
+"""
+
+from django.core.management.base import BaseCommand
+from orders import inventory
+
+
+class Command(BaseCommand):
+    help = 'Release stock reservations past their expiry (run periodically, e.g. every minute)'
+
+    def handle(self, *args, **options):
+        released = inventory.release_expired()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations.'))
@@ -0,0 +1,32 @@
+"""
+Roll Up Sales Command
+Adds newly paid and refunded orders to the daily sales roll-up tables
+"""
+
+from django.core.management.base import BaseCommand
+from orders import rollups
+
+
+class Command(BaseCommand):
+    help = 'Add orders paid or refunded since the last run to the daily sales roll-ups (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help=(
+                f'Orders rolled up per transaction (default: {rollups.BATCH_SIZE}, '
+                f'or {rollups.REBUILD_BATCH_SIZE} with --rebuild)'
+            )
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Empty the roll-ups and recompute them from every payment and refund'
+        )
+
+    def handle(self, *args, **options):
+        refresh = rollups.rebuild if options['rebuild'] else rollups.refresh
+        batch = {'batch_size': options['batch_size']} if options['batch_size'] else {}
+        total = refresh(**batch)
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {total} payments and refunds.'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_stockreservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='orders_orde_user_id_0ae59f_idx'),
+        ),
+    ]
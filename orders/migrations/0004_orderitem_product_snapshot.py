@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_user_created_at_index'),
+        ('store', '0003_category_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image',
+            field=models.ImageField(blank=True, editable=False, upload_to='products/'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_slug',
+            field=models.SlugField(blank=True, db_index=False, editable=False, max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(blank=True, help_text='Cleared if the product is deleted; the snapshot below is kept', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='store.product'),
+        ),
+    ]
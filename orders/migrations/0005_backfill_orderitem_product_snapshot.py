@@ -0,0 +1,55 @@
+# Copy product details onto existing order items, one batch per transaction
+
+from django.db import migrations, transaction
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_product_snapshot(apps, schema_editor):
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('store', 'Product')
+    db_alias = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        # Each batch commits on its own, so an interrupted run resumes
+        # where it stopped and never holds a long write lock
+        with transaction.atomic(using=db_alias):
+            items = list(
+                OrderItem.objects.using(db_alias)
+                .filter(id__gt=last_id, product_name='', product__isnull=False)
+                .order_by('id')
+                .only('id', 'product_id')[:BATCH_SIZE]
+            )
+            if not items:
+                break
+            products = (
+                Product.objects.using(db_alias)
+                .only('id', 'name', 'slug', 'image')
+                .in_bulk({item.product_id for item in items})
+            )
+            for item in items:
+                product = products[item.product_id]
+                item.product_name = product.name
+                item.product_slug = product.slug
+                item.product_image = product.image.name or ''
+            OrderItem.objects.using(db_alias).bulk_update(
+                items, ['product_name', 'product_slug', 'product_image']
+            )
+        last_id = items[-1].id
+
+
+class Migration(migrations.Migration):
+
+    # Batches are committed separately instead of in one migration transaction
+    atomic = False
+
+    dependencies = [
+        ('orders', '0004_orderitem_product_snapshot'),
+        ('store', '0003_category_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_backfill_orderitem_product_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category_id', models.PositiveBigIntegerField()),
+                ('category_name', models.CharField(max_length=200)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily category sales',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('product_id', models.PositiveBigIntegerField()),
+                ('product_name', models.CharField(max_length=200)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily product sales',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('order_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Set when the payment first completes; sales roll-ups read orders by it', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['paid_at', 'id'], name='orders_orde_paid_at_9d528b_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('day', 'category_id'), name='unique_daily_category_sales'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('day', 'product_id'), name='unique_daily_product_sales'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Date orders paid before paid_at existed by when they were placed
+
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_paid_at(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    db_alias = schema_editor.connection.alias
+    # Payment follows checkout within minutes; updated_at may be a later shipping update
+    Order.objects.using(db_alias).filter(
+        payment_status__in=['completed', 'refunded'], paid_at__isnull=True
+    ).update(paid_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_paid_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_backfill_order_paid_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailycategorysales',
+            name='refunded_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dailycategorysales',
+            name='refunded_units',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='refunded_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='refunded_units',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='refunded_orders',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='refunded_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='refunded_units',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='refunded_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Set when a paid order is first refunded; sales roll-ups book the refund then', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['refunded_at', 'id'], name='orders_orde_refunde_5e4d49_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Date refunds made before refunded_at existed by the order's last change
+
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_refunded_at(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    db_alias = schema_editor.connection.alias
+    # The refund is normally the last change made to a refunded order
+    Order.objects.using(db_alias).filter(
+        payment_status='refunded', paid_at__isnull=False, refunded_at__isnull=True
+    ).update(refunded_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_refunded_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_refunded_at, migrations.RunPython.noop),
+    ]
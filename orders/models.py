@@ -4,10 +4,49 @@ Defines Order and OrderItem models for managing customer orders
 """
 
 from django.db import models
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
 from store.models import Product
 
 
+class OrderQuerySet(models.QuerySet):
+    """
+    Order reads shaped for the pages that show them
+    """
+    
+    # Items shown per order on the history page
+    HISTORY_PREVIEW_ITEMS = 3
+    
+    def for_history(self):
+        """
+        Order summaries for the history page
+        
+        Each order carries item_count, counted in SQL, and preview_items,
+        its first few items. The preview is prefetched with a sliced
+        queryset, which Django limits per order with a window function,
+        so a page costs the same however large its orders are.
+        """
+        item_count = (
+            OrderItem.objects.filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        preview = (
+            OrderItem.objects
+            .only('id', 'order_id', 'quantity', 'product_name', 'product_image')
+            .order_by('id')[:self.HISTORY_PREVIEW_ITEMS]
+        )
+        return (
+            self.only('id', 'user_id', 'created_at', 'status', 'total_amount')
+            .annotate(item_count=Coalesce(Subquery(item_count), 0))
+            .prefetch_related(Prefetch('items', queryset=preview, to_attr='preview_items'))
+        )
+
+
 class Order(models.Model):
     """
     Order model to store customer order information
@@ -61,13 +100,46 @@ class Order(models.Model):
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    paid_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Set when the payment first completes; sales roll-ups read orders by it"
+    )
+    refunded_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Set when a paid order is first refunded; sales roll-ups book the refund then"
+    )
+    
+    objects = OrderQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
+            # A customer's order history, newest first
+            models.Index(fields=['user', '-created_at']),
+            # Paid orders after the sales roll-up watermark
+            models.Index(fields=['paid_at', 'id']),
+            # Refunds after the refunds watermark
+            models.Index(fields=['refunded_at', 'id']),
         ]
     
+    def save(self, *args, **kwargs):
+        """Stamp paid_at and refunded_at the first time the payment is completed or refunded"""
+        stamped = []
+        if self.payment_status == 'completed' and self.paid_at is None:
+            self.paid_at = timezone.now()
+            stamped.append('paid_at')
+        if self.payment_status == 'refunded' and self.paid_at is not None and self.refunded_at is None:
+            self.refunded_at = timezone.now()
+            stamped.append('refunded_at')
+        if stamped and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *stamped}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f'Order #{self.id} by {self.user.username}'
     
@@ -79,6 +151,11 @@ class Order(models.Model):
 class OrderItem(models.Model):
     """
     OrderItem model to store individual products in an order
+    
+    The product's name, slug and image are copied onto the item when the
+    order is placed, so order pages render without joining the catalog
+    and keep showing what was bought after the product changes or is
+    deleted.
     """
     order = models.ForeignKey(
         Order, 
@@ -88,14 +165,188 @@ class OrderItem(models.Model):
     product = models.ForeignKey(
         Product, 
         related_name='order_items', 
-        on_delete=models.CASCADE
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="Cleared if the product is deleted; the snapshot below is kept"
     )
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=1)
     
+    # Product snapshot taken when the order is placed
+    product_name = models.CharField(max_length=200, blank=True, editable=False)
+    product_slug = models.SlugField(max_length=200, blank=True, db_index=False, editable=False)
+    product_image = models.ImageField(upload_to='products/', blank=True, editable=False)
+    
+    def save(self, *args, **kwargs):
+        """Take the product snapshot if it is missing"""
+        if self.product_id and not self.product_name:
+            for field, value in self.product_snapshot(self.product).items():
+                setattr(self, field, value)
+        super().save(*args, **kwargs)
+    
     def __str__(self):
-        return f'{self.quantity}x {self.product.name}'
+        return f'{self.quantity}x {self.product_name}'
+    
+    @staticmethod
+    def product_snapshot(product):
+        """
+        Return the product fields copied onto an order item
+        
+        Pass the result as keyword arguments when building items for
+        bulk_create, which skips save().
+        """
+        return {
+            'product_name': product.name,
+            'product_slug': product.slug,
+            'product_image': product.image.name or '',
+        }
+    
+    def get_product_url(self):
+        """Return the URL of the product page (which may no longer exist)"""
+        if not self.product_slug:
+            return ''
+        return reverse('store:product_detail', kwargs={'slug': self.product_slug})
     
     def get_cost(self):
         """Calculate total cost for this order item"""
-        return self.price * self.quantity
\ No newline at end of file
+        return self.price * self.quantity
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for an order between checkout and payment
+    
+    Stock is taken off Product.stock when the reservation is made. It is
+    committed when the payment succeeds, or released (and the stock
+    returned) when payment fails or the reservation expires.
+    """
+    STATUS_CHOICES = (
+        ('held', 'Held'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+    )
+    
+    order = models.ForeignKey(
+        Order,
+        related_name='reservations',
+        on_delete=models.CASCADE
+    )
+    product = models.ForeignKey(
+        Product,
+        related_name='reservations',
+        on_delete=models.CASCADE
+    )
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='held'
+    )
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.quantity}x {self.product_id} for order #{self.order_id} ({self.status})'
+
+
+class RollupWatermark(models.Model):
+    """
+    How far an incremental job (sales roll-ups, product rankings) has read the paid orders
+    
+    Orders are read in (paid_at, id) order, so the pair of the last order
+    rolled up is enough to resume without counting any order twice. Jobs
+    reading refunds keep refunded_at in paid_at the same way.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+    order_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f'{self.name} at order #{self.order_id}'
+
+
+class DailySales(models.Model):
+    """
+    Paid orders, revenue and units sold per day
+    
+    Refunds are counted separately on the day they are made, so a day's
+    net revenue is revenue - refunded_revenue.
+    """
+    day = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunded_orders = models.PositiveIntegerField(default=0)
+    refunded_units = models.PositiveIntegerField(default=0)
+    refunded_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['-day']
+        verbose_name_plural = 'Daily sales'
+    
+    def __str__(self):
+        return f'{self.day}: ${self.revenue}'
+
+
+class DailyProductSales(models.Model):
+    """
+    Units sold and revenue per product per day
+    
+    Products are referenced by id with their name copied alongside, so
+    the history survives the product being deleted. Sales of products
+    deleted before they were rolled up share one row per day under
+    rollups.DELETED_ID.
+    """
+    day = models.DateField()
+    product_id = models.PositiveBigIntegerField()
+    product_name = models.CharField(max_length=200)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunded_units = models.PositiveIntegerField(default=0)
+    refunded_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    # Where the roll-up keeps the latest product name
+    NAME_FIELD = 'product_name'
+    
+    class Meta:
+        ordering = ['-day']
+        verbose_name_plural = 'Daily product sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product_id'], name='unique_daily_product_sales'),
+        ]
+    
+    def __str__(self):
+        return f'{self.day}: {self.units}x {self.product_name}'
+
+
+class DailyCategorySales(models.Model):
+    """
+    Units sold and revenue per category per day
+    """
+    day = models.DateField()
+    category_id = models.PositiveBigIntegerField()
+    category_name = models.CharField(max_length=200)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunded_units = models.PositiveIntegerField(default=0)
+    refunded_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    NAME_FIELD = 'category_name'
+    
+    class Meta:
+        ordering = ['-day']
+        verbose_name_plural = 'Daily category sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category_id'], name='unique_daily_category_sales'),
+        ]
+    
+    def __str__(self):
+        return f'{self.day}: {self.units}x {self.category_name}'
@@ -0,0 +1,117 @@
+"""
+Orders Payments
+Non-blocking Stripe charge client used by the async payment view
+
+Talks to the Stripe REST API with httpx so a slow gateway only parks a
+coroutine instead of pinning a worker. Every request has explicit connect
+and read timeouts and an idempotency key, so a retried submission can
+never charge the customer twice.
+"""
+
+import asyncio
+import httpx
+from django.conf import settings
+
+
+class PaymentError(Exception):
+    """
+    Raised when a charge fails
+
+    Attributes:
+        user_message: Message safe to show to the customer
+        card_error: True if the card was declined (as opposed to an outage)
+    """
+
+    def __init__(self, user_message, card_error=False):
+        super().__init__(user_message)
+        self.user_message = user_message
+        self.card_error = card_error
+
+
+# Shown when the payment form is submitted without a card token
+MISSING_TOKEN_MESSAGE = 'Please enter your card details.'
+
+
+_client = None
+_client_loop = None
+
+
+def get_client():
+    """
+    Return a pooled AsyncClient bound to the running event loop
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=settings.STRIPE_API_BASE,
+            timeout=httpx.Timeout(
+                settings.STRIPE_READ_TIMEOUT,
+                connect=settings.STRIPE_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(max_connections=settings.STRIPE_MAX_CONNECTIONS),
+        )
+        _client_loop = loop
+    return _client
+
+
+def idempotency_key(order, token):
+    """
+    Build the idempotency key for a charge attempt
+
+    The same order paid with the same card token maps to the same key, so
+    a double-submitted form or a client retry reuses the first charge.
+    Without a token, unrelated attempts would share a key, so one is required.
+    """
+    if not token:
+        raise ValueError('A card token is required to build an idempotency key.')
+    return f'order-{order.id}-{token}'
+
+
+async def create_charge_async(order, token):
+    """
+    Charge an order through Stripe without blocking the event loop
+
+    Args:
+        order: Order being paid
+        token: Stripe card token from the payment form
+
+    Raises:
+        PaymentError: If the token is missing, the card is declined or the
+            gateway fails/times out
+
+    Returns:
+        The Stripe charge id
+    """
+    if not token:
+        raise PaymentError(MISSING_TOKEN_MESSAGE, card_error=True)
+
+    try:
+        response = await get_client().post(
+            '/v1/charges',
+            data={
+                'amount': int(order.total_amount * 100),  # Convert to cents
+                'currency': 'usd',
+                'description': f'Order #{order.id}',
+                'source': token,
+            },
+            auth=(settings.STRIPE_SECRET_KEY, ''),
+            headers={'Idempotency-Key': idempotency_key(order, token)},
+        )
+    except httpx.TimeoutException:
+        raise PaymentError('The payment gateway timed out. Please try again.')
+    except httpx.HTTPError:
+        raise PaymentError('Could not reach the payment gateway.')
+
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+
+    if response.status_code == 200 and payload.get('id'):
+        return payload['id']
+
+    error = payload.get('error') or {}
+    if error.get('type') == 'card_error':
+        raise PaymentError(error.get('message', 'Your card was declined.'), card_error=True)
+    raise PaymentError('An error occurred during payment.')
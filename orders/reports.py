@@ -0,0 +1,255 @@
+"""
+Sales Reports
+Vectorized sales analytics over the daily roll-up tables
+
+Reports never touch orders or order items: they read the roll-ups kept
+by orders.rollups, load them into NumPy arrays and do the arithmetic
+(period-over-period changes, moving averages, top-K) on whole arrays.
+The work depends on the length of the period and the number of products
+sold in it, not on the total number of orders.
+
+Revenue and units are net of refunds, which count on the day they are
+made; order counts are of paid orders. Days without sales have no roll-up
+row; daily_series() fills them with zeros so every series is dense and
+lines up day by day.
+"""
+
+from datetime import timedelta
+import numpy as np
+from django.db.models import Sum
+from django.utils import timezone
+from .models import DailyCategorySales, DailyProductSales, DailySales, RollupWatermark
+from .rollups import WATERMARK
+
+
+# Days averaged by the dashboard's moving average
+MOVING_AVERAGE_DAYS = 7
+
+# Products and categories listed by the dashboard
+TOP_K = 10
+
+
+def daily_series(start, end):
+    """
+    Load daily totals as dense arrays, one entry per day
+
+    Args:
+        start: First day (datetime.date)
+        end: Last day, included
+
+    Returns:
+        Dict of 'days' (datetime64[D]), 'orders', 'units', 'revenue' and
+        'refunds' arrays of equal length; units and revenue are net
+    """
+    days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+    series = {'days': days}
+    names = ('orders', 'units', 'revenue', 'refunded_units', 'refunds')
+    rows = list(
+        DailySales.objects.filter(day__range=(start, end))
+        .values_list('day', 'orders', 'units', 'revenue', 'refunded_units', 'refunded_revenue')
+    )
+    if rows:
+        row_days, *columns = zip(*rows)
+        index = (np.array(row_days, dtype='datetime64[D]') - days[0]).astype(np.int64)
+    else:
+        index, columns = np.array([], dtype=np.int64), [()] * len(names)
+    for name, values in zip(names, columns):
+        dense = np.zeros(len(days))
+        dense[index] = np.array(values, dtype=np.float64)
+        series[name] = dense
+    series['units'] -= series.pop('refunded_units')
+    series['revenue'] -= series['refunds']
+    return series
+
+
+def moving_average(values, window):
+    """
+    Trailing moving average
+
+    Args:
+        values: 1-D array
+        window: Number of values averaged
+
+    Returns:
+        Array of len(values) - window + 1 means; entry i averages
+        values[i:i + window]
+    """
+    if len(values) < window:
+        return np.array([])
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    return (sums[window:] - sums[:-window]) / window
+
+
+def percent_change(current, previous):
+    """
+    Percentage change from previous to current, element-wise
+
+    Returns NaN where previous is zero.
+    """
+    current = np.asarray(current, dtype=np.float64)
+    previous = np.asarray(previous, dtype=np.float64)
+    change = np.full(np.broadcast(current, previous).shape, np.nan)
+    np.divide(current - previous, previous, out=change, where=previous != 0)
+    return change * 100
+
+
+def top_indices(values, k):
+    """
+    Indices of the k largest values, largest first
+
+    argpartition finds them in linear time, so only k values get sorted.
+    """
+    if k < len(values):
+        candidates = np.argpartition(values, -k)[-k:]
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+def _top(model, key_field, name_field, start, end, k):
+    """
+    Rank a per-day roll-up by revenue summed over a period
+
+    The database sums the days per key, so a year costs one row per
+    product sold rather than one per product per day; NumPy ranks the
+    sums. Names are then read for the k winners only. Units and revenue
+    are net of refunds.
+    """
+    rows = list(
+        model.objects.filter(day__range=(start, end))
+        .order_by()
+        .values_list(key_field)
+        .annotate(Sum('units'), Sum('revenue'), Sum('refunded_units'), Sum('refunded_revenue'))
+    )
+    if not rows:
+        return []
+    keys, units, revenue, refunded_units, refunded_revenue = zip(*rows)
+    units = np.array(units, dtype=np.int64) - np.array(refunded_units, dtype=np.int64)
+    revenue = np.array(revenue, dtype=np.float64) - np.array(refunded_revenue, dtype=np.float64)
+    ranked = top_indices(revenue, k)
+    top_keys = [keys[index] for index in ranked]
+    # Rows are read oldest first, so the latest name wins
+    names = dict(
+        model.objects.filter(day__range=(start, end), **{f'{key_field}__in': top_keys})
+        .order_by('day')
+        .values_list(key_field, name_field)
+    )
+    return [
+        {
+            'id': keys[index],
+            'name': names[keys[index]],
+            'units': int(units[index]),
+            'revenue': round(float(revenue[index]), 2),
+        }
+        for index in ranked
+    ]
+
+
+def top_products(start, end, k=TOP_K):
+    """Best-selling products by revenue between start and end (inclusive)"""
+    return _top(DailyProductSales, 'product_id', 'product_name', start, end, k)
+
+
+def top_categories(start, end, k=TOP_K):
+    """Best-selling categories by revenue between start and end (inclusive)"""
+    return _top(DailyCategorySales, 'category_id', 'category_name', start, end, k)
+
+
+def sparkline(values, peak, width=600, height=80):
+    """
+    Return SVG polyline points for a series, scaled to width x height
+
+    Args:
+        values: 1-D array
+        peak: Value drawn at the top edge, shared by series on one chart
+    """
+    if len(values) < 2:
+        return ''
+    x = np.linspace(0, width, len(values))
+    y = height - (values / peak * height if peak > 0 else np.zeros(len(values)))
+    # Days where refunds outweigh sales sit on the bottom edge
+    y = np.minimum(y, height)
+    return ' '.join(f'{a:.1f},{b:.1f}' for a, b in zip(x, y))
+
+
+def sales_dashboard(days=30, today=None, k=TOP_K):
+    """
+    Build the admin sales dashboard
+
+    The period is the last `days` days up to today, compared with the
+    `days` days before it.
+
+    Args:
+        days: Length of the period in days
+        today: Last day of the period (default: today)
+        k: Products and categories listed
+
+    Returns:
+        Context dict for admin/orders/sales_dashboard.html
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    # One read covers the previous period and the moving average's lead-in
+    lead_in = max(days, MOVING_AVERAGE_DAYS - 1)
+    series = daily_series(start - timedelta(days=lead_in), today)
+    current = slice(-days, None)
+    previous = slice(-2 * days, -days)
+
+    # Rows: current and previous period; columns: revenue, orders, units, refunds, average order
+    totals = np.array([
+        [series[name][period].sum() for name in ('revenue', 'orders', 'units', 'refunds')]
+        for period in (current, previous)
+    ])
+    average_order = np.zeros(2)
+    np.divide(totals[:, 0], totals[:, 1], out=average_order, where=totals[:, 1] > 0)
+    totals = np.column_stack((totals, average_order))
+    changes = percent_change(totals[0], totals[1])
+
+    summary = [
+        {
+            'label': label,
+            'value': round(float(value), 2) if money else int(value),
+            'money': money,
+            'change': None if np.isnan(change) else round(float(change), 1),
+        }
+        for (label, money), value, change in zip(
+            (('Net revenue', True), ('Paid orders', False), ('Units sold', False),
+             ('Refunds', True), ('Average order', True)),
+            totals[0], changes,
+        )
+    ]
+
+    revenue = series['revenue'][current]
+    averages = moving_average(series['revenue'], MOVING_AVERAGE_DAYS)[-days:]
+    daily = [
+        {
+            'day': day,
+            'orders': int(orders),
+            'units': int(units),
+            'revenue': round(amount, 2),
+            'refunds': round(refunds, 2),
+            'moving_average': round(average, 2),
+        }
+        for day, orders, units, amount, refunds, average in zip(
+            series['days'][current].tolist(), series['orders'][current].tolist(),
+            series['units'][current].tolist(), revenue.tolist(),
+            series['refunds'][current].tolist(), averages.tolist(),
+        )
+    ]
+    peak = max(revenue.max(initial=0), averages.max(initial=0))
+
+    watermark = RollupWatermark.objects.filter(name=WATERMARK).first()
+    return {
+        'days': days,
+        'start': start,
+        'end': today,
+        'summary': summary,
+        # Newest day first
+        'daily': daily[::-1],
+        'revenue_points': sparkline(revenue, peak),
+        'average_points': sparkline(averages, peak),
+        'moving_average_days': MOVING_AVERAGE_DAYS,
+        'top_products': top_products(start, today, k),
+        'top_categories': top_categories(start, today, k),
+        'rolled_up_at': watermark.updated_at if watermark else None,
+    }
@@ -0,0 +1,240 @@
+"""
+Sales Roll-ups
+Maintains daily sales tables incrementally from newly paid orders
+
+DailySales, DailyProductSales and DailyCategorySales hold totals per
+day, so reports read a few hundred small rows instead of aggregating
+every order item. refresh() reads the paid orders after a high-watermark
+(the paid_at and id of the last order it rolled up) in batches, adds
+their totals to the tables and moves the watermark, all in one
+transaction per batch. A run costs the same whether the shop has a
+thousand orders or ten million, and an interrupted run simply resumes.
+
+Items whose product has since been deleted no longer know their product
+or category; they are rolled up together under DELETED_ID, so product
+and category totals still add up to the daily ones.
+
+Refunds are read the same way, after their own watermark on
+refunded_at, and added to the refunded_* columns of the day they are
+made. Sales are never subtracted in place: net revenue is revenue minus
+refunded_revenue, and either feed may run ahead of the other.
+
+Orders are bucketed by the local date of their payment (refunds by that
+of the refund). Orders paid in the last SETTLE_DELAY are left for the
+next run, so a payment still committing with an earlier paid_at cannot
+slip behind the watermark. Later catalog changes do not rewrite history;
+rebuild() recomputes everything from scratch when that is wanted.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import (
+    DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem, RollupWatermark,
+)
+
+
+WATERMARK = 'sales'
+REFUNDS_WATERMARK = 'sales-refunds'
+
+# Paid orders rolled up per transaction
+BATCH_SIZE = 1000
+
+# Orders per transaction when rebuilding: every batch updates most of the
+# rows again, so a full rebuild goes faster in fewer, larger batches
+REBUILD_BATCH_SIZE = 20000
+
+# Orders paid more recently than this wait for the next run
+SETTLE_DELAY = timedelta(minutes=5)
+
+# Product and category id the items of deleted products are rolled up under
+DELETED_ID = 0
+DELETED_NAME = 'Deleted products'
+
+
+class _Totals:
+    """Running totals for one roll-up row"""
+
+    def __init__(self):
+        self.orders = 0
+        self.units = 0
+        self.revenue = Decimal('0')
+        self.name = ''
+
+
+def _aggregate(orders):
+    """
+    Sum a batch of orders into per-day, per-product and per-category totals
+
+    Args:
+        orders: List of (id, paid_at or refunded_at, total_amount) tuples
+
+    Returns:
+        (daily, products, categories) dicts of _Totals keyed by (day,),
+        (day, product_id) and (day, category_id)
+    """
+    days = {order_id: timezone.localdate(paid_at) for order_id, paid_at, _ in orders}
+    daily = defaultdict(_Totals)
+    products = defaultdict(_Totals)
+    categories = defaultdict(_Totals)
+
+    for order_id, _, total_amount in orders:
+        totals = daily[(days[order_id],)]
+        totals.orders += 1
+        totals.revenue += total_amount
+
+    items = OrderItem.objects.filter(order_id__in=days).values_list(
+        'order_id', 'product_id', 'product_name',
+        'product__category_id', 'product__category__name', 'price', 'quantity',
+    )
+    for order_id, product_id, product_name, category_id, category_name, price, quantity in items:
+        day = days[order_id]
+        daily[(day,)].units += quantity
+        if product_id is None:
+            product_id = category_id = DELETED_ID
+            product_name = category_name = DELETED_NAME
+        for totals, name in ((products[day, product_id], product_name),
+                             (categories[day, category_id], category_name)):
+            totals.units += quantity
+            totals.revenue += price * quantity
+            totals.name = name
+    return daily, products, categories
+
+
+def _apply(model, key_fields, totals, fields, prefix=''):
+    """
+    Add totals to existing roll-up rows and create the missing ones
+
+    Args:
+        model: Roll-up model
+        key_fields: Fields identifying a row, in the order of the totals keys
+        totals: Dict of key tuple -> _Totals
+        fields: _Totals attributes to add, plus 'name' to keep the latest name
+        prefix: Prefix of the columns the totals are added to, e.g. 'refunded_'
+    """
+    if not totals:
+        return
+    lookup = {
+        f'{field}__in': {key[index] for key in totals}
+        for index, field in enumerate(key_fields)
+    }
+    existing = {
+        tuple(getattr(row, field) for field in key_fields): row
+        for row in model.objects.select_for_update().filter(**lookup)
+    }
+
+    columns = {
+        field: model.NAME_FIELD if field == 'name' else f'{prefix}{field}'
+        for field in fields
+    }
+    changed, created = [], []
+    for key, total in totals.items():
+        row = existing.get(key)
+        if row is None:
+            row = model(**dict(zip(key_fields, key)))
+            created.append(row)
+        else:
+            changed.append(row)
+        for field, column in columns.items():
+            if field == 'name':
+                # The latest name wins, e.g. after a product is renamed
+                setattr(row, column, total.name)
+            else:
+                setattr(row, column, getattr(row, column) + getattr(total, field))
+
+    update_fields = list(columns.values())
+    model.objects.bulk_update(changed, update_fields, batch_size=BATCH_SIZE)
+    model.objects.bulk_create(created, batch_size=BATCH_SIZE)
+
+
+def consume(name, apply, batch_size=BATCH_SIZE, now=None, field='paid_at'):
+    """
+    Feed the orders paid since watermark `name` to apply(), batch by batch
+
+    Each batch is applied and the watermark moved in one transaction, so
+    every paid order is seen exactly once even across failed runs. Other
+    incremental jobs (e.g. store.rankings) keep their own watermark.
+
+    Args:
+        name: Watermark name
+        apply: Callable receiving a list of (id, <field>, total_amount)
+        batch_size: Orders per transaction
+        now: Current time (default: timezone.now())
+        field: Timestamp the orders are read by; 'refunded_at' feeds refunds
+
+    Returns:
+        Number of orders consumed
+    """
+    cutoff = (now or timezone.now()) - SETTLE_DELAY
+    RollupWatermark.objects.get_or_create(name=name)
+    total = 0
+    while True:
+        with transaction.atomic():
+            # Locked so concurrent runs take turns instead of double counting
+            watermark = RollupWatermark.objects.select_for_update().get(name=name)
+            orders = Order.objects.filter(**{f'{field}__isnull': False, f'{field}__lt': cutoff})
+            if watermark.paid_at is not None:
+                orders = orders.filter(
+                    Q(**{f'{field}__gt': watermark.paid_at})
+                    | Q(**{field: watermark.paid_at, 'id__gt': watermark.order_id})
+                )
+            batch = list(
+                orders.order_by(field, 'id')
+                .values_list('id', field, 'total_amount')[:batch_size]
+            )
+            if not batch:
+                break
+
+            apply(batch)
+
+            watermark.order_id, watermark.paid_at = batch[-1][0], batch[-1][1]
+            watermark.save()
+        total += len(batch)
+    return total
+
+
+def _roll_up(batch, prefix=''):
+    """Add a batch of paid (or, with prefix 'refunded_', refunded) orders to the roll-up tables"""
+    daily, products, categories = _aggregate(batch)
+    _apply(DailySales, ('day',), daily, ('orders', 'units', 'revenue'), prefix)
+    _apply(DailyProductSales, ('day', 'product_id'), products, ('units', 'revenue', 'name'), prefix)
+    _apply(DailyCategorySales, ('day', 'category_id'), categories, ('units', 'revenue', 'name'), prefix)
+
+
+def refresh(batch_size=BATCH_SIZE, now=None):
+    """
+    Roll up the orders paid and the orders refunded since the last run
+
+    Args:
+        batch_size: Orders rolled up per transaction
+        now: Current time (default: timezone.now())
+
+    Returns:
+        Number of payments and refunds rolled up
+    """
+    total = consume(WATERMARK, _roll_up, batch_size=batch_size, now=now)
+    return total + consume(
+        REFUNDS_WATERMARK,
+        lambda batch: _roll_up(batch, prefix='refunded_'),
+        batch_size=batch_size,
+        now=now,
+        field='refunded_at',
+    )
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE, now=None):
+    """
+    Empty the roll-up tables and roll up every payment and refund again
+
+    Returns:
+        Number of payments and refunds rolled up
+    """
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        DailyProductSales.objects.all().delete()
+        DailyCategorySales.objects.all().delete()
+        RollupWatermark.objects.filter(name__in=[WATERMARK, REFUNDS_WATERMARK]).delete()
+    return refresh(batch_size=batch_size, now=now)
@@ -0,0 +1,87 @@
+"""
+Orders Services
+Order placement logic shared by the checkout views
+"""
+
+from decimal import Decimal
+from django.db import transaction
+from .models import Order, OrderItem
+from . import inventory
+
+
+# Fields copied from the checkout form onto the order
+SHIPPING_FIELDS = (
+    'first_name', 'last_name', 'email', 'phone',
+    'address', 'city', 'state', 'postal_code', 'country',
+)
+
+
+def get_pending_order(session, user):
+    """
+    Return the unpaid order this session already placed, if any
+    """
+    order_id = session.get('order_id')
+    if not order_id:
+        return None
+    return Order.objects.filter(
+        id=order_id,
+        user=user,
+        status='pending',
+        payment_status='pending',
+    ).first()
+
+
+@transaction.atomic
+def place_order(user, cart, shipping, session):
+    """
+    Create (or refresh) the pending order for a cart in one transaction
+    
+    Order lines are priced from the product rows the cart already loaded
+    and inserted with a single bulk_create, and their stock is reserved
+    (see orders.inventory). If the session already has an unpaid order
+    (e.g. the checkout form was submitted twice), that order is updated,
+    its reservation released and its lines replaced instead of creating
+    another one.
+    
+    Args:
+        user: User placing the order
+        cart: Cart with the items being ordered
+        shipping: Dict of shipping fields (cleaned form data)
+        session: Session used to remember the pending order
+    
+    Raises:
+        inventory.InsufficientStock: If a product ran out; nothing is saved
+    
+    Returns:
+        The saved Order
+    """
+    lines = []
+    total = Decimal('0')
+    for item in cart:
+        price = item['product'].get_price()
+        total += price * item['quantity']
+        lines.append((item['product'], price, item['quantity']))
+    
+    order = get_pending_order(session, user)
+    if order is None:
+        order = Order(user=user)
+    else:
+        inventory.release(order)
+        order.items.all().delete()
+    
+    for field in SHIPPING_FIELDS:
+        setattr(order, field, shipping[field])
+    order.total_amount = total
+    order.save()
+    
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order, product=product, price=price, quantity=quantity,
+            **OrderItem.product_snapshot(product)
+        )
+        for product, price, quantity in lines
+    ])
+    inventory.reserve(order)
+    
+    session['order_id'] = order.id
+    return order
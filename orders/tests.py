@@ -1,3 +1,435 @@
+import asyncio
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from store.models import Category, Product
+from . import export, inventory, payments, reports, rollups, views
+from .models import (
+    DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem, StockReservation,
+)
 
-# Create your tests here.
+
+class InventoryReservationTests(TestCase):
+    """
+    Stock reservation taken at checkout, committed on payment, released on failure
+    (see benchmarks/inventory_stress.py for the multi-threaded oversell check)
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        category = Category.objects.create(name='Widgets')
+        self.widget = Product.objects.create(
+            category=category, name='Widget', description='A widget', price=10, stock=5
+        )
+        self.gadget = Product.objects.create(
+            category=category, name='Gadget', description='A gadget', price=20, stock=1
+        )
+
+    def make_order(self, widgets=1, gadgets=0):
+        order = Order.objects.create(
+            user=self.user, first_name='A', last_name='B', email='a@example.com',
+            phone='1', address='Street', city='City', state='State',
+            postal_code='1', country='Country', total_amount=0,
+        )
+        if widgets:
+            OrderItem.objects.create(order=order, product=self.widget, price=10, quantity=widgets)
+        if gadgets:
+            OrderItem.objects.create(order=order, product=self.gadget, price=20, quantity=gadgets)
+        return order
+
+    def stock(self, product):
+        product.refresh_from_db(fields=['stock'])
+        return product.stock
+
+    def test_reserve_takes_stock(self):
+        inventory.reserve(self.make_order(widgets=2, gadgets=1))
+        self.assertEqual(self.stock(self.widget), 3)
+        self.assertEqual(self.stock(self.gadget), 0)
+
+    def test_reserve_is_all_or_nothing(self):
+        with self.assertRaises(inventory.InsufficientStock) as raised:
+            inventory.reserve(self.make_order(widgets=2, gadgets=2))
+        self.assertEqual(raised.exception.products, [self.gadget])
+        self.assertEqual(self.stock(self.widget), 5)
+        self.assertEqual(self.stock(self.gadget), 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_release_returns_stock_once(self):
+        order = self.make_order(widgets=3)
+        inventory.reserve(order)
+        self.assertEqual(inventory.release(order), 1)
+        self.assertEqual(inventory.release(order), 0)
+        self.assertEqual(self.stock(self.widget), 5)
+
+    def test_commit_keeps_stock_taken(self):
+        order = self.make_order(widgets=2)
+        inventory.reserve(order)
+        self.assertEqual(inventory.commit(order), 1)
+        self.assertEqual(inventory.release(order), 0)
+        self.assertEqual(self.stock(self.widget), 3)
+
+    def test_release_expired(self):
+        order = self.make_order(widgets=2)
+        inventory.reserve(order)
+        later = timezone.now() + timedelta(days=1)
+        self.assertEqual(inventory.release_expired(now=later), 1)
+        self.assertEqual(self.stock(self.widget), 5)
+
+    def test_ensure_reserved_reserves_again_after_release(self):
+        order = self.make_order(widgets=2)
+        inventory.reserve(order)
+        inventory.release(order)
+        inventory.ensure_reserved(order)
+        self.assertEqual(self.stock(self.widget), 3)
+        self.assertEqual(order.reservations.filter(status='held').count(), 1)
+
+
+class PaymentTokenTests(TestCase):
+    """
+    A payment without a card token is refused before the gateway is called
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        self.order = Order.objects.create(
+            user=self.user, first_name='A', last_name='B', email='a@example.com',
+            phone='1', address='Street', city='City', state='State',
+            postal_code='1', country='Country', total_amount=10,
+        )
+
+    def test_idempotency_key_requires_a_token(self):
+        self.assertEqual(payments.idempotency_key(self.order, 'tok_1'), f'order-{self.order.id}-tok_1')
+        for token in (None, ''):
+            with self.assertRaises(ValueError):
+                payments.idempotency_key(self.order, token)
+
+    @mock.patch.object(payments, 'get_client')
+    def test_async_charge_without_token_is_refused(self, get_client):
+        with self.assertRaises(payments.PaymentError) as raised:
+            asyncio.run(payments.create_charge_async(self.order, None))
+        self.assertTrue(raised.exception.card_error)
+        get_client.assert_not_called()
+
+    @mock.patch.object(views.stripe.Charge, 'create')
+    def test_payment_view_without_token_shows_the_form_again(self, create):
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['order_id'] = self.order.id
+        session.save()
+        response = self.client.post(reverse('orders:payment'))
+        self.assertRedirects(response, reverse('orders:payment'))
+        create.assert_not_called()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'pending')
+        self.assertEqual(self.client.session['order_id'], self.order.id)
+
+
+class OrderPageQueryCountTests(TestCase):
+    """
+    Checkout and order pages run a fixed number of queries however many items they show
+    """
+
+    def setUp(self):
+        # The test cache is shared by the whole run
+        cache.clear()
+        self.user = User.objects.create_user('buyer')
+        category = Category.objects.create(name='Widgets')
+        self.products = [
+            Product.objects.create(
+                category=category, name=f'Widget {number}', description='A widget',
+                price=10, stock=10,
+            )
+            for number in range(5)
+        ]
+        self.orders = [self.make_order() for _ in range(3)]
+        self.client.force_login(self.user)
+
+    def make_order(self):
+        order = Order.objects.create(
+            user=self.user, first_name='A', last_name='B', email='a@example.com',
+            phone='1', address='Street', city='City', state='State',
+            postal_code='1', country='Country', total_amount=50,
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order, product=product, price=10, quantity=1,
+                **OrderItem.product_snapshot(product)
+            )
+            for product in self.products
+        )
+        return order
+
+    # Every page starts with the session and the logged-in user
+    def assertPageQueries(self, count, url):
+        with self.assertNumQueries(count):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_checkout(self):
+        for product in self.products:
+            self.client.post(reverse('cart:cart_add', args=[product.id]), {'quantity': 1})
+        # The cart's products in one query
+        self.assertPageQueries(3, reverse('orders:checkout'))
+
+    def test_payment(self):
+        session = self.client.session
+        session['order_id'] = self.orders[0].id
+        session.save()
+        # The order, then its items
+        self.assertPageQueries(4, reverse('orders:payment'))
+
+    def test_payment_success(self):
+        self.assertPageQueries(3, reverse('orders:payment_success', args=[self.orders[0].id]))
+
+    def test_payment_failed(self):
+        self.assertPageQueries(2, reverse('orders:payment_failed'))
+
+    def test_order_history(self):
+        # The orders with their item counts, then the preview items
+        response = self.assertPageQueries(4, reverse('orders:order_history'))
+        order = response.context['orders'].object_list[0]
+        self.assertEqual(order.item_count, 5)
+        self.assertEqual(len(order.preview_items), 3)
+        self.assertContains(response, '+2 more items')
+
+    def test_order_history_pages(self):
+        for _ in range(9):
+            self.make_order()
+        first = self.assertPageQueries(4, reverse('orders:order_history'))
+        page = first.context['orders']
+        self.assertEqual(len(page), 10)
+        second = self.client.get(reverse('orders:order_history'), {'cursor': page.next_cursor})
+        older = second.context['orders']
+        self.assertEqual(len(older), 2)
+        self.assertFalse(older.has_next())
+        self.assertEqual(
+            [order.id for order in page] + [order.id for order in older],
+            list(Order.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True)),
+        )
+
+    def test_order_detail(self):
+        response = self.assertPageQueries(4, reverse('orders:order_detail', args=[self.orders[0].id]))
+        self.assertContains(response, 'Widget 4')
+
+    def test_order_detail_survives_product_deletion(self):
+        self.products[4].delete()
+        response = self.client.get(reverse('orders:order_detail', args=[self.orders[0].id]))
+        self.assertContains(response, 'Widget 4')
+        self.assertEqual(self.orders[0].items.count(), 5)
+
+
+class OrderExportTests(TestCase):
+    """
+    Streaming CSV/JSONL export of orders with their items
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Widgets')
+        self.widget = Product.objects.create(
+            category=category, name='Widget', description='A widget', price=10, stock=5
+        )
+        self.paid = self.make_order('delivered', 'completed', widgets=2)
+        self.failed = self.make_order('pending', 'failed', widgets=1)
+
+    def make_order(self, status, payment_status, widgets):
+        order = Order.objects.create(
+            user=self.user, first_name='A', last_name='B', email='a@example.com',
+            phone='1', address='Street', city='City', state='State',
+            postal_code='1', country='Country', total_amount=10 * widgets,
+            status=status, payment_status=payment_status,
+        )
+        for _ in range(widgets):
+            OrderItem.objects.create(order=order, product=self.widget, price=10, quantity=1)
+        return order
+
+    def test_rows_group_items_by_order(self):
+        rows = list(export.export_rows(Order.objects.all(), chunk_size=1))
+        self.assertEqual([order['id'] for order, _ in rows], [self.paid.id, self.failed.id])
+        self.assertEqual([len(items) for _, items in rows], [2, 1])
+        self.assertEqual(rows[0][1][0]['item_product_name'], 'Widget')
+
+    def test_filters(self):
+        today = timezone.localdate()
+        orders = export.filter_orders(status=['pending'], payment_status=['failed'])
+        self.assertEqual(list(orders), [self.failed])
+        self.assertEqual(export.filter_orders(date_from=today, date_to=today).count(), 2)
+        self.assertEqual(export.filter_orders(date_to=today - timedelta(days=1)).count(), 0)
+
+    def test_admin_action_streams_csv(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:orders_order_changelist'), {
+            'action': 'export_as_csv',
+            '_selected_action': [self.paid.id],
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'created_at'])
+        self.assertEqual(len(lines), 3)
+
+    def test_jsonl(self):
+        lines = list(export.export_lines(Order.objects.filter(id=self.paid.id), 'jsonl'))
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(len(json.loads(lines[0])['items']), 2)
+
+
+class SalesRollupTests(TestCase):
+    """
+    Incremental sales roll-ups and the reports read from them
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.category = Category.objects.create(name='Widgets')
+        self.widget = Product.objects.create(
+            category=self.category, name='Widget', description='A widget', price=10, stock=50
+        )
+        self.gadget = Product.objects.create(
+            category=self.category, name='Gadget', description='A gadget', price=25, stock=50
+        )
+        self.now = timezone.now()
+
+    def make_paid_order(self, paid_at, widgets=1, gadgets=0):
+        order = Order.objects.create(
+            user=self.user, first_name='A', last_name='B', email='a@example.com',
+            phone='1', address='Street', city='City', state='State',
+            postal_code='1', country='Country', total_amount=10 * widgets + 25 * gadgets,
+        )
+        for product, quantity in ((self.widget, widgets), (self.gadget, gadgets)):
+            if quantity:
+                OrderItem.objects.create(order=order, product=product, price=product.price, quantity=quantity)
+        Order.objects.filter(id=order.id).update(payment_status='completed', paid_at=paid_at)
+        return order
+
+    def test_paid_at_is_stamped_once(self):
+        order = self.make_paid_order(None)
+        order.refresh_from_db()
+        order.paid_at = None
+        order.save(update_fields=['payment_status'])
+        order.refresh_from_db()
+        paid_at = order.paid_at
+        self.assertIsNotNone(paid_at)
+        order.status = 'shipped'
+        order.save()
+        order.refresh_from_db()
+        self.assertEqual(order.paid_at, paid_at)
+
+    def test_refresh_is_incremental(self):
+        yesterday = self.now - timedelta(days=1)
+        self.make_paid_order(yesterday, widgets=2)
+        self.make_paid_order(yesterday, widgets=1, gadgets=1)
+        # Still inside the settle delay
+        self.make_paid_order(self.now - timedelta(minutes=1), widgets=0, gadgets=1)
+
+        self.assertEqual(rollups.refresh(batch_size=1, now=self.now), 2)
+        self.assertEqual(rollups.refresh(now=self.now), 0)
+        day = DailySales.objects.get()
+        self.assertEqual(
+            (day.day, day.orders, day.units, day.revenue),
+            (timezone.localdate(yesterday), 2, 4, Decimal('55.00'))
+        )
+        widget = DailyProductSales.objects.get(product_id=self.widget.id)
+        self.assertEqual((widget.units, widget.revenue), (3, Decimal('30.00')))
+
+        self.assertEqual(rollups.refresh(now=self.now + rollups.SETTLE_DELAY), 1)
+        self.assertEqual(DailyCategorySales.objects.get(day=timezone.localdate(self.now)).units, 1)
+        self.assertEqual(rollups.rebuild(now=self.now + rollups.SETTLE_DELAY), 3)
+        self.assertEqual(DailySales.objects.count(), 2)
+
+    def refund(self, order):
+        order.refresh_from_db()
+        order.payment_status = 'refunded'
+        order.save()
+        return order
+
+    def test_refunded_at_is_stamped_for_paid_orders_only(self):
+        unpaid = self.make_paid_order(None)
+        Order.objects.filter(id=unpaid.id).update(payment_status='pending')
+        self.assertIsNone(self.refund(unpaid).refunded_at)
+
+        refunded_at = self.refund(self.make_paid_order(self.now)).refunded_at
+        self.assertIsNotNone(refunded_at)
+        order = Order.objects.get(refunded_at__isnull=False)
+        order.save()
+        self.assertEqual(order.refunded_at, refunded_at)
+
+    def test_refunds_are_booked_on_the_refund_day(self):
+        paid_day = self.now - timedelta(days=3)
+        order = self.make_paid_order(paid_day, widgets=2, gadgets=1)
+        self.make_paid_order(paid_day, widgets=1)
+        later = self.now + rollups.SETTLE_DELAY
+        self.assertEqual(rollups.refresh(now=later), 2)
+
+        self.refund(order)
+        self.assertEqual(rollups.refresh(now=later), 0)
+        self.assertEqual(rollups.refresh(now=later + rollups.SETTLE_DELAY), 1)
+        self.assertEqual(rollups.refresh(now=later + rollups.SETTLE_DELAY), 0)
+
+        sale = DailySales.objects.get(day=timezone.localdate(paid_day))
+        self.assertEqual((sale.orders, sale.revenue, sale.refunded_revenue), (2, Decimal('55.00'), 0))
+        refund = DailySales.objects.get(day=timezone.localdate(self.now))
+        self.assertEqual(
+            (refund.orders, refund.revenue, refund.refunded_orders, refund.refunded_units, refund.refunded_revenue),
+            (0, 0, 1, 3, Decimal('45.00'))
+        )
+        widget = DailyProductSales.objects.get(product_id=self.widget.id, day=timezone.localdate(self.now))
+        self.assertEqual((widget.refunded_units, widget.refunded_revenue), (2, Decimal('20.00')))
+
+        dashboard = reports.sales_dashboard(days=30)
+        self.assertEqual(
+            [(metric['label'], metric['value']) for metric in dashboard['summary']],
+            [('Net revenue', 10.0), ('Paid orders', 2), ('Units sold', 1),
+             ('Refunds', 45.0), ('Average order', 5.0)]
+        )
+        self.assertEqual(
+            [(product['name'], product['units'], product['revenue']) for product in dashboard['top_products']],
+            [('Widget', 1, 10.0), ('Gadget', 0, 0.0)]
+        )
+        self.assertEqual(rollups.rebuild(now=later + rollups.SETTLE_DELAY), 3)
+        self.assertEqual(DailySales.objects.get(day=timezone.localdate(self.now)).refunded_revenue, Decimal('45.00'))
+
+    def test_deleted_products_are_rolled_up_together(self):
+        self.make_paid_order(self.now - timedelta(days=1), widgets=2, gadgets=1)
+        self.widget.delete()
+        self.gadget.delete()
+
+        rollups.refresh(now=self.now)
+        deleted = DailyProductSales.objects.get()
+        self.assertEqual(
+            (deleted.product_id, deleted.product_name, deleted.units, deleted.revenue),
+            (rollups.DELETED_ID, rollups.DELETED_NAME, 3, Decimal('45.00'))
+        )
+        self.assertEqual(DailyCategorySales.objects.get().revenue, DailySales.objects.get().revenue)
+
+    def test_array_helpers(self):
+        averages = reports.moving_average(np.array([1.0, 2.0, 3.0, 4.0]), 2)
+        self.assertEqual(averages.tolist(), [1.5, 2.5, 3.5])
+        changes = reports.percent_change([150, 5], [100, 0])
+        self.assertEqual(changes[0], 50)
+        self.assertTrue(np.isnan(changes[1]))
+        self.assertEqual(reports.top_indices(np.array([5.0, 9.0, 1.0, 7.0]), 2).tolist(), [1, 3])
+
+    def test_dashboard(self):
+        self.make_paid_order(self.now - timedelta(days=40), widgets=1)
+        self.make_paid_order(self.now - timedelta(days=2), widgets=2, gadgets=2)
+        rollups.refresh(now=self.now)
+
+        dashboard = reports.sales_dashboard(days=30)
+        revenue = dashboard['summary'][0]
+        self.assertEqual((revenue['value'], revenue['change']), (70.0, 600.0))
+        self.assertEqual([product['name'] for product in dashboard['top_products']], ['Gadget', 'Widget'])
+        self.assertEqual(len(dashboard['daily']), 30)
+
+        self.client.force_login(self.user)
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('admin:orders_order_sales'), {'days': 365})
+        self.assertContains(response, 'Gadget')
@@ -3,6 +3,7 @@ Orders URL Configuration
 Maps URLs to order and checkout views
 """
 
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -11,7 +12,12 @@ app_name = 'orders'
 urlpatterns = [
     # Checkout and payment
     path('checkout/', views.checkout, name='checkout'),
-    path('payment/', views.payment, name='payment'),
+    # Async payment view when served through ASGI (settings.ORDERS_ASYNC_PAYMENT)
+    path(
+        'payment/',
+        views.payment_async if settings.ORDERS_ASYNC_PAYMENT else views.payment,
+        name='payment'
+    ),
     path('payment/success/<int:order_id>/', views.payment_success, name='payment_success'),
     path('payment/failed/', views.payment_failed, name='payment_failed'),
     
@@ -1,19 +1,28 @@
 """
 Orders Views
-Handles checkout process, payment, and order history
+Handles checkout process, payment (sync and async), and order history
 """
 
+from asgiref.sync import sync_to_async
+from django.http import Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.conf import settings
-from cart.cart import Cart
-from .models import Order, OrderItem
+from cart.cart import get_cart
+from store.pagination import KeysetPaginator
+from .models import Order
+from .services import place_order
+from . import inventory, payments
 from .forms import OrderCreateForm
 import stripe
 
+# Orders shown per history page
+ORDERS_PER_PAGE = 10
+
 # Configure Stripe
 stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe.api_base = settings.STRIPE_API_BASE
 
 
 @login_required
@@ -21,7 +30,7 @@ def checkout(request):
     """
     Checkout page with shipping address form
     """
-    cart = Cart(request)
+    cart = get_cart(request)
     
     if len(cart) == 0:
         messages.warning(request, 'Your cart is empty.')
@@ -30,22 +39,14 @@ def checkout(request):
     if request.method == 'POST':
         form = OrderCreateForm(request.POST, user=request.user)
         if form.is_valid():
-            order = form.save(commit=False)
-            order.user = request.user
-            order.total_amount = cart.get_total_price()
-            order.save()
-            
-            # Create order items
-            for item in cart:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item['product'],
-                    price=item['price'],
-                    quantity=item['quantity']
-                )
-            
-            # Store order ID in session for payment
-            request.session['order_id'] = order.id
+            # Create the order and its items and reserve their stock in one
+            # transaction; the order ID is stored in the session for payment
+            try:
+                place_order(request.user, cart, form.cleaned_data, request.session)
+            except inventory.InsufficientStock as e:
+                names = ', '.join(product.name for product in e.products)
+                messages.error(request, f'Sorry, there is not enough stock left for: {names}.')
+                return redirect('cart:cart_detail')
             
             # Redirect to payment
             return redirect('orders:payment')
@@ -70,12 +71,30 @@ def payment(request):
         messages.error(request, 'No order found.')
         return redirect('cart:cart_detail')
     
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    # The summary lists every item with its product name
+    order = get_object_or_404(
+        Order.objects.prefetch_related('items'),
+        id=order_id,
+        user=request.user
+    )
     
     if request.method == 'POST':
         # Get Stripe token from form
         token = request.POST.get('stripeToken')
         
+        # Never charge without a card; show the form again instead
+        if not token:
+            messages.error(request, payments.MISSING_TOKEN_MESSAGE)
+            return redirect('orders:payment')
+        
+        # Re-check the stock reservation right before charging
+        try:
+            inventory.ensure_reserved(order)
+        except inventory.InsufficientStock as e:
+            names = ', '.join(product.name for product in e.products)
+            messages.error(request, f'Sorry, there is not enough stock left for: {names}.')
+            return redirect('cart:cart_detail')
+        
         try:
             # Create Stripe charge
             charge = stripe.Charge.create(
@@ -83,6 +102,7 @@ def payment(request):
                 currency='usd',
                 description=f'Order #{order.id}',
                 source=token,
+                idempotency_key=payments.idempotency_key(order, token),
             )
             
             # Update order with payment details
@@ -91,15 +111,9 @@ def payment(request):
             order.status = 'processing'
             order.save()
             
-            # Update product stock
-            for item in order.items.all():
-                product = item.product
-                product.stock -= item.quantity
-                product.save()
-            
-            # Clear the cart
-            cart = Cart(request)
-            cart.clear()
+            # Stock was taken at checkout; mark the reservation as
+            # fulfilled and clear the cart
+            _finish_paid_order(request, order)
             
             # Clear order ID from session
             del request.session['order_id']
@@ -112,6 +126,7 @@ def payment(request):
             messages.error(request, f'Payment failed: {e.user_message}')
             order.payment_status = 'failed'
             order.save()
+            inventory.release(order)
             return redirect('orders:payment_failed')
         
         except Exception as e:
@@ -119,6 +134,7 @@ def payment(request):
             messages.error(request, 'An error occurred during payment.')
             order.payment_status = 'failed'
             order.save()
+            inventory.release(order)
             return redirect('orders:payment_failed')
     
     context = {
@@ -128,6 +144,85 @@ def payment(request):
     return render(request, 'orders/payment.html', context)
 
 
+def _finish_paid_order(request, order):
+    """
+    Commit the stock reservation and clear the cart after a successful charge
+    """
+    inventory.commit(order)
+    get_cart(request).clear()
+
+
+@login_required
+async def payment_async(request):
+    """
+    Async payment page for the ASGI entry point
+    
+    The Stripe call goes through a non-blocking HTTP client with timeouts
+    and an idempotency key, so a slow gateway parks a coroutine instead of
+    pinning a worker. Database work runs through async ORM calls or
+    sync_to_async. Enabled with settings.ORDERS_ASYNC_PAYMENT.
+    """
+    order_id = await request.session.aget('order_id')
+    
+    if not order_id:
+        messages.error(request, 'No order found.')
+        return redirect('cart:cart_detail')
+    
+    user = await request.auser()
+    try:
+        order = await Order.objects.prefetch_related('items').aget(
+            id=order_id, user=user
+        )
+    except Order.DoesNotExist:
+        raise Http404('No Order matches the given query.')
+    
+    if request.method == 'POST':
+        token = request.POST.get('stripeToken')
+        
+        # Never charge without a card; show the form again instead
+        if not token:
+            messages.error(request, payments.MISSING_TOKEN_MESSAGE)
+            return redirect('orders:payment')
+        
+        # Re-check the stock reservation right before charging
+        try:
+            await sync_to_async(inventory.ensure_reserved)(order)
+        except inventory.InsufficientStock as e:
+            names = ', '.join(product.name for product in e.products)
+            messages.error(request, f'Sorry, there is not enough stock left for: {names}.')
+            return redirect('cart:cart_detail')
+        
+        try:
+            charge_id = await payments.create_charge_async(order, token)
+        except payments.PaymentError as e:
+            if e.card_error:
+                messages.error(request, f'Payment failed: {e.user_message}')
+            else:
+                messages.error(request, e.user_message)
+            order.payment_status = 'failed'
+            await order.asave(update_fields=['payment_status', 'updated_at'])
+            await sync_to_async(inventory.release)(order)
+            return redirect('orders:payment_failed')
+        
+        # Update order with payment details
+        order.payment_status = 'completed'
+        order.payment_id = charge_id
+        order.status = 'processing'
+        await order.asave(update_fields=['payment_status', 'payment_id', 'status', 'updated_at'])
+        
+        await sync_to_async(_finish_paid_order)(request, order)
+        await request.session.apop('order_id', None)
+        
+        messages.success(request, 'Payment successful! Your order has been placed.')
+        return redirect('orders:payment_success', order_id=order.id)
+    
+    context = {
+        'order': order,
+        'stripe_publishable_key': settings.STRIPE_PUBLISHABLE_KEY,
+    }
+    return await sync_to_async(render)(request, 'orders/payment.html', context)
+
+
 @login_required
 def payment_success(request, order_id):
     """
@@ -152,7 +247,14 @@ def order_history(request):
     """
     Display user's order history
     """
-    orders = Order.objects.filter(user=request.user).prefetch_related('items__product')
+    orders = Order.objects.for_history().filter(user=request.user)
+    
+    # Cursor pagination on the (user, -created_at) index
+    paginator = KeysetPaginator(orders, ORDERS_PER_PAGE)
+    orders = paginator.page(
+        cursor=request.GET.get('cursor'),
+        page_number=request.GET.get('page')
+    )
     
     context = {'orders': orders}
     return render(request, 'orders/order_history.html', context)
@@ -163,11 +265,12 @@ def order_detail(request, order_id):
     """
     Display detailed information about a specific order
     """
+    # Items carry their product snapshot, so the catalog is not read
     order = get_object_or_404(
-        Order.objects.prefetch_related('items__product'),
+        Order.objects.prefetch_related('items'),
         id=order_id,
         user=request.user
     )
     
     context = {'order': order}
-    return render(request, 'orders/order_detail.html', context)
\ No newline at end of file
+    return render(request, 'orders/order_details.html', context)
\ No newline at end of file
@@ -5,6 +5,8 @@ Customizes the admin interface for Categories and Products
 
 from django.contrib import admin
 from .models import Category, Product
+from . import search
+from .cards import touch_products
 
 
 @admin.register(Category)
@@ -61,22 +63,29 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
     
-    actions = ['make_available', 'make_unavailable', 'mark_as_featured']
+    actions = ['make_available', 'make_unavailable', 'mark_as_featured', 'reindex_search']
     
     def make_available(self, request, queryset):
         """Bulk action to make products available"""
-        updated = queryset.update(available=True)
+        updated = touch_products(queryset, available=True)
         self.message_user(request, f'{updated} products marked as available.')
     make_available.short_description = "Mark selected products as available"
     
     def make_unavailable(self, request, queryset):
         """Bulk action to make products unavailable"""
-        updated = queryset.update(available=False)
+        updated = touch_products(queryset, available=False)
         self.message_user(request, f'{updated} products marked as unavailable.')
     make_unavailable.short_description = "Mark selected products as unavailable"
     
     def mark_as_featured(self, request, queryset):
         """Bulk action to mark products as featured"""
-        updated = queryset.update(featured=True)
+        updated = touch_products(queryset, featured=True)
         self.message_user(request, f'{updated} products marked as featured.')
-    mark_as_featured.short_description = "Mark selected products as featured"
\ No newline at end of file
+    mark_as_featured.short_description = "Mark selected products as featured"
+    
+    def reindex_search(self, request, queryset):
+        """Bulk action to refresh search index entries (e.g. after raw imports)"""
+        products = list(queryset.only('id', 'name', 'description'))
+        search.index_products(products)
+        self.message_user(request, f'{len(products)} products reindexed for search.')
+    reindex_search.short_description = "Reindex selected products for search"
\ No newline at end of file
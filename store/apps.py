@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        # Register search index signal handlers
+        from . import signals  # noqa: F401
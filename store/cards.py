@@ -0,0 +1,97 @@
+"""
+Store Product Cards
+Versioned fragment cache for the product card markup shared by store pages
+
+A card's cache key carries everything its markup depends on: the product
+id and updated_at, whether it is in stock, and its category's version. A
+save therefore moves the card to a fresh key instead of deleting the old
+one, and stale entries simply age out. Bulk changes that bypass save()
+must go through touch_products() so updated_at still moves.
+"""
+
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from .catalog import purge_products
+
+
+CARD_TEMPLATE = 'store/includes/product_card.html'
+
+# Card layouts used across the store templates
+CARD_VARIANTS = ('home', 'listing', 'search', 'related')
+
+# Keys are versioned, so entries only need to expire to free memory
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def card_key(product, variant):
+    """
+    Build the cache key for a product card
+
+    The product's category must already be loaded (select_related), or
+    building keys for a page costs one query per product.
+    """
+    return 'store:card:{}:{}:{}:{}:{}'.format(
+        variant,
+        product.id,
+        product.updated_at.timestamp() if product.updated_at else 0,
+        int(product.is_in_stock()),
+        product.category.version,
+    )
+
+
+def render_cards(products, variant='listing'):
+    """
+    Render product cards, reusing cached markup where possible
+
+    All keys for the page are fetched with a single get_many; only the
+    misses are rendered, and they are written back with one set_many.
+
+    Args:
+        products: Iterable of products (with their category loaded)
+        variant: One of CARD_VARIANTS
+
+    Returns:
+        List of card HTML strings in the order of products
+    """
+    if variant not in CARD_VARIANTS:
+        raise ValueError(f'Unknown product card variant: {variant}')
+
+    products = list(products)
+    keys = [card_key(product, variant) for product in products]
+    cached = cache.get_many(keys) if keys else {}
+
+    template = None
+    rendered = {}
+    cards = []
+    for product, key in zip(products, keys):
+        html = cached.get(key)
+        if html is None:
+            if template is None:
+                template = get_template(CARD_TEMPLATE)
+            html = rendered[key] = template.render({'product': product, 'variant': variant})
+        cards.append(mark_safe(html))
+
+    if rendered:
+        cache.set_many(rendered, CARD_CACHE_TIMEOUT)
+    return cards
+
+
+def touch_products(queryset, **fields):
+    """
+    Bulk-update products and bump updated_at so their cached cards expire
+
+    Use this instead of queryset.update() for any change visible on a
+    card; update() skips save() and would leave the old cards in place.
+    Cached catalog entries built from the products are purged as well.
+
+    Returns:
+        Number of products updated
+    """
+    product_ids = list(queryset.values_list('id', flat=True))
+    updated = queryset.model.objects.filter(id__in=product_ids).update(
+        updated_at=timezone.now(), **fields
+    )
+    purge_products(product_ids)
+    return updated
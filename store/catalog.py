@@ -0,0 +1,93 @@
+"""
+Store Catalog Cache
+Cached hot catalog reads (home featured set, category menu) and their purging
+"""
+
+from ecommerce_project.cache import purge_tags, remember
+from .models import Category, Product, ProductRanking
+
+
+# Tags purged by catalog changes
+PRODUCTS_TAG = 'products'
+CATEGORIES_TAG = 'categories'
+# Purged when store.rankings rebuilds the ranking table
+RANKINGS_TAG = 'rankings'
+
+# Seconds the hot sets stay fresh; purges replace them sooner
+FEATURED_TIMEOUT = 300
+CATEGORY_MENU_TIMEOUT = 600
+
+RANKINGS_TIMEOUT = 600
+
+FEATURED_LIMIT = 8
+CATEGORY_MENU_LIMIT = 6
+RANKED_LIMIT = 8
+
+
+def product_tag(product_id):
+    """Tag carried by cache entries built from a single product"""
+    return f'product:{product_id}'
+
+
+def featured_products():
+    """
+    Return the featured products shown on the home page
+
+    Rebuilt once per expiry across all workers, and whenever any product
+    or category changes.
+    """
+    return remember(
+        'store:home:featured',
+        lambda: list(
+            Product.objects.for_listing().filter(featured=True)[:FEATURED_LIMIT]
+        ),
+        FEATURED_TIMEOUT,
+        tags=(PRODUCTS_TAG, CATEGORIES_TAG),
+    )
+
+
+def menu_categories():
+    """Return the categories shown in the category menu"""
+    return remember(
+        'store:category_menu',
+        lambda: list(Category.objects.all()[:CATEGORY_MENU_LIMIT]),
+        CATEGORY_MENU_TIMEOUT,
+        tags=(CATEGORIES_TAG,),
+    )
+
+
+def ranked_products(category_id=None):
+    """
+    Return the best-seller and trending products of a category (None: whole catalog)
+
+    Returns:
+        Dict of ranking kind -> up to RANKED_LIMIT available products, best first
+    """
+    def build():
+        ranked = {kind: [] for kind, _ in ProductRanking.KIND_CHOICES}
+        for product in Product.objects.for_listing().ranked(category_id):
+            if len(ranked[product.ranking_kind]) < RANKED_LIMIT:
+                ranked[product.ranking_kind].append(product)
+        return ranked
+
+    return remember(
+        f'store:rankings:{category_id or "all"}',
+        build,
+        RANKINGS_TIMEOUT,
+        tags=(PRODUCTS_TAG, CATEGORIES_TAG, RANKINGS_TAG),
+    )
+
+
+def purge_products(product_ids):
+    """Invalidate cached entries built from the given products"""
+    purge_tags(PRODUCTS_TAG, *[product_tag(product_id) for product_id in product_ids])
+
+
+def purge_categories():
+    """Invalidate cached entries built from categories"""
+    purge_tags(CATEGORIES_TAG)
+
+
+def purge_rankings():
+    """Invalidate cached rankings and the pages showing them"""
+    purge_tags(RANKINGS_TAG)
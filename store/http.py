@@ -0,0 +1,175 @@
+"""
+Store HTTP Caching
+Conditional GET (ETag / Last-Modified / 304) and Cache-Control for catalog pages
+
+Each page has a validator that returns the newest updated_at among the
+objects it shows plus anything else visible on it (e.g. stock state). It
+is built from a couple of aggregate queries or from the cached hot sets,
+so a revalidation is answered with 304 before the view or any template
+runs.
+"""
+
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Count, Max, Q
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+from cart.cart import get_cart_count
+from ecommerce_project.stale import is_cacheable_request
+from . import catalog
+from .models import Category, Product
+
+
+# Bump to invalidate every client's copy after a template change
+ETAG_VERSION = '1'
+
+
+def _has_pending_messages(request):
+    """Flash messages are rendered once, so the page must not be a 304"""
+    if request.COOKIES.get('messages'):
+        return True
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return '_messages' in request.session
+    return False
+
+
+def _visitor_state(request):
+    """The parts of the visitor shown on every page (navbar user and cart badge)"""
+    user = request.user
+    user_part = f'u{user.pk}' if user.is_authenticated else 'anon'
+    return f'{user_part}:{get_cart_count(request)}'
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def home_validator(request):
+    """Validate the home page against the cached featured set, rankings and category menu"""
+    ranked = catalog.ranked_products()
+    products = [*catalog.featured_products(), *ranked['best_seller'], *ranked['trending']]
+    categories = catalog.menu_categories()
+    last_modified = _latest(
+        *[product.updated_at for product in products],
+        *[product.category.updated_at for product in products],
+        *[category.updated_at for category in categories],
+    )
+    extra = ','.join(str(product.id) for product in products)
+    return last_modified, extra
+
+
+def _category_state(category_id):
+    """Newest product change and in-stock count of a category's available products"""
+    return Product.objects.available().filter(category_id=category_id).aggregate(
+        last_modified=Max('updated_at'),
+        count=Count('id'),
+        in_stock=Count('id', filter=Q(stock__gt=0)),
+    )
+
+
+def product_validator(request, slug):
+    """Validate a product page against the product, its category and related products"""
+    product = (
+        Product.objects.available().filter(slug=slug)
+        .values('id', 'stock', 'category_id', 'category__updated_at')
+        .first()
+    )
+    if product is None:
+        return None
+    state = _category_state(product['category_id'])
+    last_modified = _latest(state['last_modified'], product['category__updated_at'])
+    extra = f"{product['stock']}:{state['count']}:{state['in_stock']}"
+    return last_modified, extra
+
+
+def category_validator(request, slug):
+    """Validate a category listing against the category and its products"""
+    category = Category.objects.filter(slug=slug).values('id', 'updated_at').first()
+    if category is None:
+        return None
+    state = _category_state(category['id'])
+    last_modified = _latest(state['last_modified'], category['updated_at'])
+    # A re-ranking changes the page without touching any product
+    best_sellers = ','.join(
+        str(product.id) for product in catalog.ranked_products(category['id'])['best_seller']
+    )
+    extra = f"{state['count']}:{state['in_stock']}:{best_sellers}"
+    return last_modified, extra
+
+
+def conditional_page(validator):
+    """
+    Answer revalidations of a catalog page with 304 and set Cache-Control
+
+    The ETag combines the validator with the visitor state; Last-Modified
+    is only sent for pages every anonymous visitor shares, since it cannot
+    express who is looking. Shared pages may be kept by a reverse proxy
+    for settings.STORE_PROXY_MAX_AGE seconds; everything else, including
+    pages with a CSRF token or a cookie in them, is private.
+
+    Args:
+        validator: Callable (request, *args, **kwargs) returning
+            (last_modified, extra) or None if the page does not exist
+    """
+    def decorator(view):
+        def validate(request, *args, **kwargs):
+            # condition() asks for the ETag and Last-Modified separately
+            if not hasattr(request, 'store_validator'):
+                try:
+                    request.store_validator = validator(request, *args, **kwargs)
+                except DatabaseError:
+                    # Let the view (or its stale copy) answer without validators
+                    request.store_validator = None
+            return request.store_validator
+
+        def etag(request, *args, **kwargs):
+            result = validate(request, *args, **kwargs)
+            if result is None or result[0] is None:
+                return None
+            last_modified, extra = result
+            raw = f'{ETAG_VERSION}:{last_modified.timestamp()}:{extra}:{_visitor_state(request)}'
+            return hashlib.md5(raw.encode()).hexdigest()
+
+        def last_modified(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return None
+            result = validate(request, *args, **kwargs)
+            return result[0] if result else None
+
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if _has_pending_messages(request):
+                response = view(request, *args, **kwargs)
+            else:
+                response = conditional_view(request, *args, **kwargs)
+                if response.get('X-Stale-Cache') == 'stale':
+                    # The body predates the validators computed for this request
+                    del response['ETag']
+                    del response['Last-Modified']
+
+            shared = (
+                is_cacheable_request(request)
+                # A page embedding a CSRF token or setting a cookie belongs
+                # to this visitor, so a proxy must neither replay nor strip it
+                and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+                and not response.cookies
+            )
+            if shared:
+                patch_cache_control(
+                    response,
+                    public=True,
+                    max_age=0,
+                    must_revalidate=True,
+                    s_maxage=settings.STORE_PROXY_MAX_AGE,
+                )
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
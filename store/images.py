@@ -0,0 +1,197 @@
+"""
+Store Images
+Resized WebP/JPEG derivatives of product and category images
+
+Each upload is rendered once per preset at 1x and 2x pixel density, in
+WebP and in JPEG for browsers without WebP support. Derivatives are named
+after a hash of the source file's content, so they never go stale and can
+be cached by clients forever:
+
+    MEDIA_ROOT/derivatives/<hash[:2]>/<hash>/<preset>-<density>x.<ext>
+
+They are generated when an image is saved, or lazily the first time a
+page needs them, and written through the default storage.
+"""
+
+import hashlib
+import os
+import time
+from io import BytesIO
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+# Presets as (width, height, crop) at 1x; crop fills the box, otherwise fit inside
+PRESETS = {
+    'thumb': (80, 80, True),     # Cart, checkout and order thumbnails
+    'card': (320, 250, True),    # Product and category cards
+    'detail': (600, 600, False), # Product page
+}
+
+DENSITIES = (1, 2)
+
+# (extension, Pillow format, save options)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+DERIVATIVES_DIR = 'derivatives'
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def stored_file_hash(storage, name):
+    """
+    Return the SHA-256 of a stored file, reading it in chunks
+
+    Uploaded names are never reused, so the result is cached by name.
+    Content-addressed blobs already carry their hash in the name.
+    """
+    if getattr(storage, 'content_addressed', False) and storage.is_blob(name):
+        return os.path.splitext(os.path.basename(name))[0]
+    key = f'images:hash:{name}'
+    digest = cache.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with storage.open(name, 'rb') as source:
+            for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        cache.set(key, digest, None)
+    return digest
+
+
+def content_hash(field_file):
+    """Return the SHA-256 of an image field's file"""
+    return stored_file_hash(field_file.storage, field_file.name)
+
+
+def derivative_name(digest, preset, density, extension):
+    """Storage path of one derivative"""
+    return f'{DERIVATIVES_DIR}/{digest[:2]}/{digest}/{preset}-{density}x.{extension}'
+
+
+def _resize(image, preset, density):
+    width, height, crop = PRESETS[preset]
+    box = (width * density, height * density)
+    if crop:
+        # Never upscale: shrink the box to what the source can fill
+        scale = min(1, image.width / box[0], image.height / box[1])
+        box = (max(1, round(box[0] * scale)), max(1, round(box[1] * scale)))
+        return ImageOps.fit(image, box, Image.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail(box, Image.LANCZOS)
+    return resized
+
+
+def _encode(image, pillow_format, options):
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel: flatten transparency onto white
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif pillow_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    # No exif/icc arguments are passed, so source metadata is dropped
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def generate_derivatives(field_file, digest=None):
+    """
+    Write every missing derivative of an image
+
+    Returns:
+        {preset: {'width', 'height', 'webp': [urls], 'jpg': [urls]}} with
+        one URL per density, 1x first
+    """
+    digest = digest or content_hash(field_file)
+    with field_file.storage.open(field_file.name, 'rb') as handle:
+        with Image.open(handle) as opened:
+            source = ImageOps.exif_transpose(opened)
+            source.load()
+
+    result = {}
+    for preset in PRESETS:
+        entry = {extension: [] for extension, _, _ in FORMATS}
+        for density in DENSITIES:
+            resized = _resize(source, preset, density)
+            if density == 1:
+                entry['width'], entry['height'] = resized.size
+            for extension, pillow_format, options in FORMATS:
+                name = derivative_name(digest, preset, density, extension)
+                if not default_storage.exists(name):
+                    name = default_storage.save(
+                        name, ContentFile(_encode(resized, pillow_format, options))
+                    )
+                entry[extension].append(default_storage.url(name))
+        result[preset] = entry
+    return result
+
+
+def get_derivatives(field_file):
+    """
+    Return the derivative URLs of an image, generating them on first use
+
+    Returns None if the image is missing or cannot be decoded, so callers
+    can fall back to the original file.
+    """
+    if not field_file:
+        return None
+    try:
+        digest = content_hash(field_file)
+        key = f'images:derivatives:{digest}'
+        derivatives = cache.get(key)
+        if derivatives is None:
+            derivatives = generate_derivatives(field_file, digest)
+            cache.set(key, derivatives, None)
+        return derivatives
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def collect_derivatives(referenced, min_age=3600, dry_run=False):
+    """
+    Remove derivatives whose source image is no longer referenced
+
+    Args:
+        referenced: Set of image names still in use
+        min_age: Seconds a derivative set must be untouched before removal
+        dry_run: Only report what would be removed
+
+    Returns:
+        (number of files removed, bytes freed)
+    """
+    if not default_storage.exists(DERIVATIVES_DIR):
+        return 0, 0
+
+    digests = set()
+    for name in referenced:
+        try:
+            digests.add(stored_file_hash(default_storage, name))
+        except OSError:
+            continue
+
+    cutoff = time.time() - min_age
+    removed = freed = 0
+    for prefix in default_storage.listdir(DERIVATIVES_DIR)[0]:
+        for digest in default_storage.listdir(f'{DERIVATIVES_DIR}/{prefix}')[0]:
+            if digest in digests:
+                continue
+            directory = f'{DERIVATIVES_DIR}/{prefix}/{digest}'
+            files = [f'{directory}/{name}' for name in default_storage.listdir(directory)[1]]
+            if any(default_storage.get_modified_time(name).timestamp() > cutoff for name in files):
+                continue
+            for name in files:
+                freed += default_storage.size(name)
+                removed += 1
+                if not dry_run:
+                    default_storage.delete(name)
+            if not dry_run:
+                cache.delete(f'images:derivatives:{digest}')
+    return removed, freed
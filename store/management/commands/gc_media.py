@@ -0,0 +1,58 @@
+"""
+Garbage Collect Media Command
+Removes stored blobs and image derivatives no model references any more
+"""
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from ecommerce_project.storage import collect_garbage, referenced_names
+from store import images
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media blobs (and derivatives) that are no longer referenced'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Only remove files untouched for this many seconds (default: 3600)'
+        )
+        parser.add_argument(
+            '--skip-derivatives',
+            action='store_true',
+            help='Leave resized image derivatives alone'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be removed without deleting anything'
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(default_storage, 'content_addressed', False):
+            raise CommandError('The default storage is not content-addressed; nothing to collect.')
+
+        referenced = referenced_names()
+        removed, freed = collect_garbage(
+            default_storage,
+            referenced,
+            min_age=options['min_age'],
+            dry_run=options['dry_run'],
+        )
+        if not options['skip_derivatives']:
+            derivative_files, derivative_bytes = images.collect_derivatives(
+                referenced,
+                min_age=options['min_age'],
+                dry_run=options['dry_run'],
+            )
+            removed += derivative_files
+            freed += derivative_bytes
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed} unreferenced files ({filesizeformat(freed)}); '
+            f'{len(referenced)} files still referenced.'
+        ))
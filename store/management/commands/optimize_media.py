@@ -0,0 +1,89 @@
+"""
+Optimize Media Command
+Recompresses product and category uploads in parallel, skipping files already done
+"""
+
+import os
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from store import optimizer
+
+
+class Command(BaseCommand):
+    help = 'Recompress (and optionally convert or downscale) product and category images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of worker processes (default: CPU count)'
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(optimizer.OUTPUT_FORMATS),
+            default=None,
+            help='Convert images to this format (requires --rewrite-paths)'
+        )
+        parser.add_argument(
+            '--max-dimension',
+            type=int,
+            default=None,
+            help='Downscale images whose width or height exceeds this many pixels'
+        )
+        parser.add_argument(
+            '--rewrite-paths',
+            action='store_true',
+            help='Save optimized files under new names and update the image fields in bulk'
+        )
+        parser.add_argument(
+            '--manifest',
+            default=os.path.join(settings.MEDIA_ROOT, '.optimize-manifest.json'),
+            help='Manifest of processed content hashes (default: MEDIA_ROOT/.optimize-manifest.json)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report projected savings without writing any files'
+        )
+
+    def handle(self, *args, **options):
+        rewrites = options['rewrite_paths'] or getattr(default_storage, 'content_addressed', False)
+        if options['format'] and not rewrites:
+            raise CommandError('--format changes file names; add --rewrite-paths.')
+
+        def progress(done, total, name, before, after):
+            if after is None:
+                self.stderr.write(f'[{done}/{total}] {name}: could not be optimized')
+            elif options['verbosity'] > 1 or done == total or done % 50 == 0:
+                self.stdout.write(
+                    f'[{done}/{total}] {name}: {filesizeformat(before)} -> {filesizeformat(after)}'
+                )
+
+        stats = optimizer.optimize_media(
+            options['manifest'],
+            workers=options['workers'],
+            output_format=options['format'],
+            max_dimension=options['max_dimension'],
+            rewrite_paths=options['rewrite_paths'],
+            dry_run=options['dry_run'],
+            progress=progress,
+        )
+
+        saved = stats['bytes_before'] - stats['bytes_after']
+        summary = (
+            f"{stats['files']} files: {stats['optimized']} optimized, "
+            f"{stats['unchanged']} already optimal, {stats['skipped']} skipped (in manifest), "
+            f"{stats['failed']} failed. "
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                summary + f'Dry run: would save {filesizeformat(saved)} '
+                f"of {filesizeformat(stats['bytes_before'])}."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                summary + f'Saved {filesizeformat(saved)} of {filesizeformat(stats["bytes_before"])}.'
+            ))
@@ -0,0 +1,32 @@
+"""
+Rebuild Search Index Command
+Re-indexes every product for full-text search in batches
+"""
+
+from django.core.management.base import BaseCommand
+from store import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of products indexed per batch (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING(
+                'This database has no full-text backend; search falls back to substring matching.'
+            ))
+            return
+
+        total = search.rebuild_index(
+            batch_size=options['batch_size'],
+            progress=lambda count: self.stdout.write(f'Indexed {count} products...')
+        )
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt for {total} products.'))
@@ -0,0 +1,41 @@
+"""
+Refresh Rankings Command
+Scores newly paid and refunded orders and rebuilds the best-seller and trending lists they affect
+"""
+
+from django.core.management.base import BaseCommand
+from orders import rollups
+from store import rankings
+
+
+class Command(BaseCommand):
+    help = 'Update product best-seller and trending rankings from orders paid or refunded since the last run (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help=(
+                f'Orders scored per transaction (default: {rollups.BATCH_SIZE}, '
+                f'or {rollups.REBUILD_BATCH_SIZE} with --rebuild)'
+            )
+        )
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=rankings.RANKING_SIZE,
+            help=f'Products kept per ranking (default: {rankings.RANKING_SIZE})'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every score and ranking from all payments and refunds'
+        )
+
+    def handle(self, *args, **options):
+        refresh = rankings.rebuild if options['rebuild'] else rankings.refresh
+        batch = {'batch_size': options['batch_size']} if options['batch_size'] else {}
+        orders, categories = refresh(size=options['size'], **batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {orders} payments and refunds; rankings rebuilt for {categories} categories.'
+        ))
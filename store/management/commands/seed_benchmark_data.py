@@ -0,0 +1,94 @@
+"""
+Seed Benchmark Data Command
+Generates a synthetic catalog, customers and order history for performance testing
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks import seed
+from orders import rollups
+from store import catalog, rankings, search
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic categories, products, users and orders with batched bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=500, help='Number of categories (default: 500)')
+        parser.add_argument('--products', type=int, default=100_000, help='Number of products (default: 100000)')
+        parser.add_argument('--users', type=int, default=100_000, help='Number of users (default: 100000)')
+        parser.add_argument('--orders', type=int, default=100_000, help='Number of orders (default: 100000)')
+        parser.add_argument(
+            '--order-items',
+            type=int,
+            default=1_000_000,
+            help='Total order lines across all orders (default: 1000000)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk insert (default: 5000)'
+        )
+        parser.add_argument('--seed', type=int, help='Random seed for a reproducible data set')
+        parser.add_argument(
+            '--prefix',
+            default='bench',
+            help='Prefix marking generated names, slugs and usernames (default: bench)'
+        )
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Delete data generated earlier with the same prefix first'
+        )
+        parser.add_argument(
+            '--skip-search-index',
+            action='store_true',
+            help='Do not rebuild the full-text search index afterwards'
+        )
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if seed.exists(prefix):
+            if not options['replace']:
+                raise CommandError(
+                    f'Benchmark data with prefix "{prefix}" already exists; pass --replace to regenerate it.'
+                )
+            deleted = seed.clear(prefix)
+            self.stdout.write(f'Deleted {deleted} rows of earlier benchmark data.')
+
+        def progress(stage, done, total):
+            self.stdout.write(f'{stage}: {done}/{total}')
+
+        try:
+            counts = seed.seed(
+                categories=options['categories'],
+                products=options['products'],
+                users=options['users'],
+                orders=options['orders'],
+                order_items=options['order_items'],
+                batch_size=options['batch_size'],
+                prefix=prefix,
+                random_seed=options['seed'],
+                progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # Bulk inserts skip the save signals that maintain the index and caches
+        if not options['skip_search_index'] and search.is_supported():
+            total = search.rebuild_index(
+                progress=lambda count: self.stdout.write(f'Indexed {count} products...')
+            )
+            self.stdout.write(f'Search index rebuilt for {total} products.')
+        catalog.purge_products([])
+        catalog.purge_categories()
+        # Seeded orders are backdated, so the roll-ups are recomputed rather than extended
+        total = rollups.rebuild()
+        self.stdout.write(f'Sales roll-ups rebuilt from {total} payments and refunds.')
+        rankings.rebuild()
+        self.stdout.write('Product rankings rebuilt.')
+
+        summary = ', '.join(f'{count} {name.replace("_", " ")}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {summary}. Users log in as {prefix}_1 ... with password "{seed.PASSWORD}".'
+        ))
@@ -0,0 +1,51 @@
+# Full-text search index for products
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts "
+            "USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO store_product_fts (rowid, name, description) "
+            "SELECT id, name, description FROM store_product"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS store_product_search ("
+            "product_id bigint PRIMARY KEY REFERENCES store_product (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS store_product_search_document_idx "
+            "ON store_product_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO store_product_search (product_id, document) "
+            "SELECT id, setweight(to_tsvector('simple', name), 'A') || "
+            "setweight(to_tsvector('simple', description), 'B') FROM store_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Bumped on every save to expire cached product cards'),
+        ),
+    ]
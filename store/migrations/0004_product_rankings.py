@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_category_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesScore',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales_score', serialize=False, to='store.product')),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('trending', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-units'], name='store_produ_units_3289bd_idx'), models.Index(fields=['-trending'], name='store_produ_trendin_1f54dd_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('best_seller', 'Best seller'), ('trending', 'Trending')], max_length=20)),
+                ('position', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField(help_text='Units sold, or decayed units sold for trending')),
+                ('category', models.ForeignKey(blank=True, help_text='Empty for the whole-catalog ranking', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='store.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='store.product')),
+            ],
+            options={
+                'ordering': ['category', 'kind', 'position'],
+                'indexes': [models.Index(fields=['category', 'kind', 'position'], name='store_produ_categor_4ceb46_idx')],
+            },
+        ),
+    ]
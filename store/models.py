@@ -16,6 +16,11 @@ class Category(models.Model):
     slug = models.SlugField(max_length=200, unique=True, blank=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        help_text="Bumped on every save to expire cached product cards"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -24,9 +29,11 @@ class Category(models.Model):
         verbose_name_plural = 'Categories'
     
     def save(self, *args, **kwargs):
-        """Auto-generate slug from name if not provided"""
+        """Auto-generate slug from name if not provided and bump the card version"""
         if not self.slug:
             self.slug = slugify(self.name)
+        if self.pk:
+            self.version += 1
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -37,6 +44,61 @@ class Category(models.Model):
         return reverse('store:category_products', kwargs={'slug': self.slug})
 
 
+class ProductQuerySet(models.QuerySet):
+    """
+    Catalog reads with their related rows and columns loaded up front
+
+    Every page that renders product cards goes through for_listing(), so
+    its query count does not grow with the number of products shown.
+    """
+    
+    # Columns read by the product card, its cache key, keyset pagination
+    # and the page validators
+    LISTING_FIELDS = (
+        'id', 'name', 'slug', 'description', 'price', 'discounted_price',
+        'image', 'stock', 'available', 'featured', 'created_at', 'updated_at',
+        'category__id', 'category__name', 'category__slug',
+        'category__version', 'category__updated_at',
+    )
+    
+    def available(self):
+        """Products that may be shown in the store"""
+        return self.filter(available=True)
+    
+    def for_listing(self):
+        """Available products with their category, projected to the card columns"""
+        return self.available().select_related('category').only(*self.LISTING_FIELDS)
+    
+    def for_detail(self):
+        """Available products with every column and their category, for the product page"""
+        return self.available().select_related('category')
+    
+    def related_to(self, product):
+        """Other available products from the same category, for card rendering"""
+        return self.for_listing().filter(category_id=product.category_id).exclude(id=product.id)
+    
+    def ranked(self, category=None):
+        """
+        Products in the materialized rankings of a category (None: whole catalog)
+        
+        Each product carries ranking_kind and ranking_position and may
+        appear once per kind; rows come best first within each kind. A
+        single query on the (category, kind, position) index.
+        """
+        return (
+            # The kind condition keeps the join inner when category is None
+            self.filter(
+                rankings__category=category,
+                rankings__kind__in=[kind for kind, _ in ProductRanking.KIND_CHOICES],
+            )
+            .annotate(
+                ranking_kind=models.F('rankings__kind'),
+                ranking_position=models.F('rankings__position'),
+            )
+            .order_by('rankings__kind', 'rankings__position')
+        )
+
+
 class Product(models.Model):
     """
     Product model with pricing, inventory, and category relationship
@@ -64,6 +126,8 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -99,4 +163,73 @@ class Product(models.Model):
     
     def is_in_stock(self):
         """Check if product is in stock"""
-        return self.stock > 0 and self.available
\ No newline at end of file
+        return self.stock > 0 and self.available
+
+
+class ProductSalesScore(models.Model):
+    """
+    Running sales totals of a product, maintained by store.rankings
+    
+    trending is the base-2 log of the product's forward-decayed units:
+    every unit sold counts 2 ** (days since RANKING_EPOCH / half-life),
+    so newer sales outweigh older ones and stored scores never need to
+    be decayed. Ordering by it orders by recent sales.
+    """
+    product = models.OneToOneField(
+        Product,
+        primary_key=True,
+        related_name='sales_score',
+        on_delete=models.CASCADE
+    )
+    units = models.PositiveIntegerField(default=0)
+    trending = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-units']),
+            models.Index(fields=['-trending']),
+        ]
+    
+    def __str__(self):
+        return f'{self.product_id}: {self.units} sold'
+
+
+class ProductRanking(models.Model):
+    """
+    Materialized best-seller and trending lists, overall and per category
+    
+    Rebuilt by the refresh_rankings command; pages only read it.
+    """
+    KIND_CHOICES = (
+        ('best_seller', 'Best seller'),
+        ('trending', 'Trending'),
+    )
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    category = models.ForeignKey(
+        Category,
+        related_name='rankings',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        help_text="Empty for the whole-catalog ranking"
+    )
+    position = models.PositiveSmallIntegerField()
+    product = models.ForeignKey(
+        Product,
+        related_name='rankings',
+        on_delete=models.CASCADE
+    )
+    score = models.FloatField(help_text="Units sold, or decayed units sold for trending")
+    
+    class Meta:
+        ordering = ['category', 'kind', 'position']
+        indexes = [
+            # ranked(): one scope, both kinds, in order
+            models.Index(fields=['category', 'kind', 'position']),
+        ]
+    
+    def __str__(self):
+        scope = self.category.name if self.category_id else 'all'
+        return f'{self.get_kind_display()} #{self.position} ({scope}): {self.product_id}'
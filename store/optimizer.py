@@ -0,0 +1,304 @@
+"""
+Store Media Optimizer
+Batch recompression of product and category uploads across a process pool
+
+Every file referenced by Product.image or Category.image is re-encoded
+without metadata (and optionally converted to WebP/JPEG or downscaled).
+Results are recorded in a manifest keyed by content hash, so files that
+were already optimized, or that could not be made smaller, are skipped
+on later runs and an interrupted run resumes where it stopped.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps
+from . import catalog
+from .models import Category, Product
+
+
+MANIFEST_VERSION = 1
+
+# Path rewrites and the manifest are flushed after this many results
+MANIFEST_FLUSH_EVERY = 20
+
+# Output format name -> (extension, Pillow format, save options)
+OUTPUT_FORMATS = {
+    'PNG': ('png', 'PNG', {'optimize': True}),
+    'JPEG': ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'WEBP': ('webp', 'WEBP', {'quality': 82, 'method': 6}),
+}
+
+
+class Manifest:
+    """
+    Content hashes of files that need no further optimization
+
+    Keys are '<profile>:<sha256>', where the profile names the output
+    format and size limit the file was optimized for.
+    Saved atomically so a crash mid-write cannot corrupt it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as handle:
+                data = json.load(handle)
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data.get('files', {})
+
+    def __contains__(self, digest):
+        return digest in self.entries
+
+    def add(self, digest, **info):
+        self.entries[digest] = info
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.entries}, handle)
+        os.replace(temporary, self.path)
+
+
+def optimize_image(data, output_format=None, max_dimension=None):
+    """
+    Re-encode image bytes without metadata
+
+    Runs in worker processes, so it only takes and returns plain values.
+
+    Args:
+        data: Original file content
+        output_format: 'PNG', 'JPEG' or 'WEBP'; None keeps the source format
+        max_dimension: Downscale so neither side exceeds this many pixels
+
+    Returns:
+        (optimized bytes, file extension)
+    """
+    with Image.open(BytesIO(data)) as opened:
+        source_format = opened.format
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+
+    output_format = output_format or source_format
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'Unsupported image format: {output_format}')
+    extension, pillow_format, options = OUTPUT_FORMATS[output_format]
+
+    if max_dimension and max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        rgba = image.convert('RGBA')
+        flattened = Image.new('RGB', rgba.size, (255, 255, 255))
+        flattened.paste(rgba, mask=rgba.getchannel('A'))
+        image = flattened
+    elif pillow_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    buffer = BytesIO()
+    # No exif/icc arguments, so metadata is stripped
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue(), extension
+
+
+def _references():
+    """Return {file name: [(model, pk), ...]} for every stored image"""
+    references = {}
+    for model in (Product, Category):
+        for pk, name in model.objects.exclude(image='').exclude(image__isnull=True).values_list('pk', 'image'):
+            references.setdefault(name, []).append((model, pk))
+    return references
+
+
+def _expire(references, now):
+    """
+    Expire cached cards and catalog entries built from rewritten images
+
+    Card keys carry the product's updated_at and its category's version,
+    so bumping those moves the cards (and the derivative URLs inside
+    them) to fresh keys; the tagged catalog entries are purged.
+    """
+    product_ids = [pk for model, pk in references if model is Product]
+    category_ids = [pk for model, pk in references if model is Category]
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update(updated_at=now)
+        # After commit, so no request caches the old entries again
+        transaction.on_commit(lambda: catalog.purge_products(product_ids))
+    if category_ids:
+        Category.objects.filter(pk__in=category_ids).update(
+            version=F('version') + 1, updated_at=now
+        )
+        transaction.on_commit(catalog.purge_categories)
+
+
+def _replace_in_place(name, content, references):
+    """Overwrite a stored file with new content under the same name"""
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(content))
+    else:
+        temporary = f'{path}.optimizing'
+        with open(temporary, 'wb') as handle:
+            handle.write(content)
+        os.replace(temporary, path)
+    # Derivatives are found through the content hash, which is cached by file name
+    cache.delete(f'images:hash:{name}')
+    _expire(references, timezone.now())
+
+
+def _rewrite_paths(renames):
+    """Point ImageFields at their converted files with one bulk update per model"""
+    by_model = {}
+    for references, new_name in renames:
+        for model, pk in references:
+            by_model.setdefault(model, []).append((pk, new_name))
+    now = timezone.now()
+    with transaction.atomic():
+        for model, rows in by_model.items():
+            objects = []
+            for pk, new_name in rows:
+                obj = model(pk=pk)
+                obj.image = new_name
+                objects.append(obj)
+            model.objects.bulk_update(objects, ['image'], batch_size=500)
+        _expire([reference for references, _ in renames for reference in references], now)
+
+
+def optimize_media(manifest_path, workers=None, output_format=None, max_dimension=None,
+                   rewrite_paths=False, dry_run=False, progress=None):
+    """
+    Optimize every product and category image
+
+    Args:
+        manifest_path: JSON file tracking already processed content hashes
+        workers: Process pool size (default: CPU count)
+        output_format: Convert to 'JPEG', 'WEBP' or 'PNG' (requires rewrite_paths)
+        max_dimension: Optional maximum width/height in pixels
+        rewrite_paths: Save results under new names and bulk-update the
+            ImageFields; otherwise files are replaced in place (always on
+            for content-addressed storage)
+        dry_run: Compute the savings without writing anything
+        progress: Optional callable(done, total, name, bytes_before, bytes_after);
+            bytes_after is None for files that could not be read or decoded
+
+    Returns:
+        Dict of totals: files, skipped, optimized, unchanged, failed,
+        bytes_before, bytes_after
+    """
+    if getattr(default_storage, 'content_addressed', False):
+        # A blob's name is its hash, so new content always needs a new name
+        rewrite_paths = True
+    if output_format and not rewrite_paths:
+        raise ValueError('Converting formats changes file names; pass rewrite_paths=True')
+
+    manifest = Manifest(manifest_path)
+    # A file done for one format/size is not done for another
+    profile = f"{output_format or 'keep'}:{max_dimension or 0}"
+    references = _references()
+    stats = dict.fromkeys(
+        ('files', 'skipped', 'optimized', 'unchanged', 'failed', 'bytes_before', 'bytes_after'), 0
+    )
+    stats['files'] = len(references)
+    renames = []
+    done = 0
+    unsaved = 0
+
+    def report(name, before, after):
+        nonlocal done, unsaved
+        done += 1
+        unsaved += 1
+        if not dry_run and unsaved >= MANIFEST_FLUSH_EVERY:
+            flush()
+        if progress:
+            progress(done, stats['files'], name, before, after)
+
+    def flush():
+        nonlocal unsaved
+        unsaved = 0
+        # Paths first: a manifest entry must never point at an unreferenced file
+        if renames:
+            _rewrite_paths(renames)
+            renames.clear()
+        manifest.save()
+
+    def finish(name, digest, before, future):
+        try:
+            content, extension = future.result()
+        except (OSError, ValueError, Image.DecompressionBombError):
+            stats['failed'] += 1
+            report(name, before, None)
+            return
+
+        stats['bytes_before'] += before
+        if len(content) >= before:
+            # Already as small as we can make it
+            stats['unchanged'] += 1
+            stats['bytes_after'] += before
+            if not dry_run:
+                manifest.add(f'{profile}:{digest}', name=name, bytes=before)
+            report(name, before, before)
+            return
+
+        stats['optimized'] += 1
+        stats['bytes_after'] += len(content)
+        if not dry_run:
+            if rewrite_paths:
+                base = os.path.splitext(name)[0]
+                new_name = default_storage.save(f'{base}.{extension}', ContentFile(content))
+                renames.append((references[name], new_name))
+            else:
+                new_name = name
+                _replace_in_place(name, content, references[name])
+            manifest.add(
+                f'{profile}:{hashlib.sha256(content).hexdigest()}',
+                name=new_name, bytes=len(content), original_bytes=before,
+            )
+        report(name, before, len(content))
+
+    # Bound the files held in memory while workers are busy
+    max_pending = (workers or os.cpu_count() or 1) * 4
+    pending = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for name in references:
+                try:
+                    with default_storage.open(name, 'rb') as handle:
+                        data = handle.read()
+                except OSError:
+                    stats['failed'] += 1
+                    report(name, None, None)
+                    continue
+
+                digest = hashlib.sha256(data).hexdigest()
+                if f'{profile}:{digest}' in manifest:
+                    stats['skipped'] += 1
+                    report(name, len(data), len(data))
+                    continue
+
+                future = pool.submit(optimize_image, data, output_format, max_dimension)
+                pending[future] = (name, digest, len(data))
+                if len(pending) >= max_pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(*pending.pop(future), future)
+
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finish(*pending.pop(future), future)
+    finally:
+        if not dry_run:
+            flush()
+    return stats
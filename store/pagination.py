@@ -0,0 +1,237 @@
+"""
+Store Pagination
+Cursor (keyset) pagination for product listings with opaque next/prev tokens
+"""
+
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+
+
+CURSOR_SALT = 'store.pagination.cursor'
+
+# Approximate totals are recounted at most this often (seconds)
+TOTAL_CACHE_TIMEOUT = 300
+
+
+def encode_cursor(data):
+    """Sign and encode cursor data into an opaque URL-safe token"""
+    return signing.dumps(data, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    """Decode a cursor token, returning None if it is missing or tampered with"""
+    if not token:
+        return None
+    try:
+        return signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+
+
+def parse_page_number(value):
+    """Parse a legacy ?page= value, returning None if it is not a positive integer"""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+class CursorPage:
+    """
+    A single page of results with cursor tokens for its neighbours
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None,
+                 approximate_total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approximate_total = approximate_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by seeking past the last row seen instead of OFFSET
+
+    Every page is a single indexed range query, so deep pages cost the same
+    as the first one and no COUNT(*) is issued per request.
+
+    Args:
+        queryset: Filtered queryset to paginate
+        per_page: Number of items per page
+        ordering: Unique ordering, as field names with optional '-' prefix.
+            The last field must be unique (normally the primary key).
+        total_cache_key: Cache key for the approximate total; if omitted
+            no total is computed
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'),
+                 total_cache_key=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.total_cache_key = total_cache_key
+        self.model = queryset.model
+
+    def _fields(self):
+        return [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in self.ordering
+        ]
+
+    def _position(self, obj):
+        """Return the serializable ordering key of an object"""
+        return [
+            self.model._meta.get_field(name).value_to_string(obj)
+            for name, _ in self._fields()
+        ]
+
+    def _seek(self, position, backwards):
+        """
+        Build a filter matching rows strictly after (or before) a position
+        in the paginator's ordering
+        """
+        condition = Q()
+        equal = Q()
+        for (name, descending), raw in zip(self._fields(), position):
+            value = self.model._meta.get_field(name).to_python(raw)
+            # Descending fields move towards smaller values going forwards
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+    def approximate_total(self):
+        """Return a cached total that is recounted at most every few minutes"""
+        if not self.total_cache_key:
+            return None
+        return cache.get_or_set(
+            self.total_cache_key, self.queryset.count, TOTAL_CACHE_TIMEOUT
+        )
+
+    def page(self, cursor=None, page_number=None):
+        """
+        Return the page addressed by a cursor token
+
+        Args:
+            cursor: Token from a previous page's next/previous link
+            page_number: Legacy 1-based page number, used when no cursor is
+                given so old ?page= bookmarks keep working
+
+        Returns:
+            CursorPage
+        """
+        data = decode_cursor(cursor)
+        backwards = bool(data) and data.get('d') == 'p'
+
+        if data and 'k' in data:
+            queryset = self.queryset.filter(self._seek(data['k'], backwards))
+            ordering = self._reversed_ordering() if backwards else self.ordering
+            rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+            more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            if backwards:
+                rows.reverse()
+            has_next, has_previous = (True, more) if backwards else (more, True)
+        else:
+            # First page, or an old-style ?page= link resolved by offset once
+            number = parse_page_number(page_number) or 1
+            offset = (number - 1) * self.per_page
+            rows = list(
+                self.queryset.order_by(*self.ordering)[offset:offset + self.per_page + 1]
+            )
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = offset > 0 and bool(rows)
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor({'k': self._position(rows[-1]), 'd': 'n'})
+        if rows and has_previous:
+            previous_cursor = encode_cursor({'k': self._position(rows[0]), 'd': 'p'})
+
+        return CursorPage(
+            rows,
+            next_cursor=next_cursor,
+            previous_cursor=previous_cursor,
+            approximate_total=self.approximate_total(),
+        )
+
+
+class SequencePaginator:
+    """
+    Cursor pagination for ranked sequences such as search results
+
+    Relevance order has no stable column to seek on, so the token carries
+    the rank offset instead. It still skips the per-request COUNT(*) and
+    exposes the same page interface as KeysetPaginator.
+
+    Args:
+        sequence: Sliceable object with a count() method
+        per_page: Number of items per page
+        total_cache_key: Cache key for the approximate total
+    """
+
+    def __init__(self, sequence, per_page, total_cache_key=None):
+        self.sequence = sequence
+        self.per_page = per_page
+        self.total_cache_key = total_cache_key
+
+    def approximate_total(self):
+        """Return a cached total that is recounted at most every few minutes"""
+        if not self.total_cache_key:
+            return None
+        return cache.get_or_set(
+            self.total_cache_key, self.sequence.count, TOTAL_CACHE_TIMEOUT
+        )
+
+    def page(self, cursor=None, page_number=None):
+        """Return the page addressed by a cursor token or legacy page number"""
+        data = decode_cursor(cursor)
+        if data and 'o' in data:
+            offset = max(int(data['o']), 0)
+        else:
+            offset = ((parse_page_number(page_number) or 1) - 1) * self.per_page
+
+        rows = list(self.sequence[offset:offset + self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        next_cursor = previous_cursor = None
+        if has_next:
+            next_cursor = encode_cursor({'o': offset + self.per_page})
+        if offset > 0 and rows:
+            previous_cursor = encode_cursor({'o': max(offset - self.per_page, 0)})
+
+        return CursorPage(
+            rows,
+            next_cursor=next_cursor,
+            previous_cursor=previous_cursor,
+            approximate_total=self.approximate_total(),
+        )
@@ -0,0 +1,249 @@
+"""
+Product Rankings
+Best-seller and trending lists materialized from paid orders
+
+refresh() is incremental in both of its steps:
+
+1. Scores. Orders paid since the rankings watermark (read through
+   orders.rollups.consume) add their units to each product's
+   ProductSalesScore: lifetime units, and a trending score with
+   exponential time decay. Trending uses forward decay: a unit sold at
+   time t weighs 2 ** ((t - RANKING_EPOCH) / half-life), kept as a
+   base-2 log. Decaying every score to "now" would multiply them all by
+   the same factor, so it is never done; new sales are added to the old
+   scores as they are and the order stays correct. Refunds are read
+   after a watermark of their own and take their sale off again, with
+   the weight it was added with.
+2. Rankings. Only scopes whose scores changed are rebuilt: the whole
+   catalog and the categories of the products sold in this run, each a
+   top-N read over indexed score columns.
+
+A run therefore costs the number of new orders plus a few top-N reads,
+however large the order history grows. Pages read the result from
+ProductRanking in one indexed query (ProductQuerySet.ranked).
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from orders import rollups
+from orders.models import Order, OrderItem, RollupWatermark
+from . import catalog
+from .models import Category, ProductRanking, ProductSalesScore
+
+
+WATERMARK = 'rankings'
+REFUNDS_WATERMARK = 'rankings-refunds'
+
+# Landmark of the forward-decayed trending scores; any fixed time works
+RANKING_EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+# A sale counts half as much towards trending after this long
+TRENDING_HALF_LIFE = timedelta(days=7)
+
+# Products kept per list; pages show fewer after dropping unavailable ones
+RANKING_SIZE = 24
+
+# ranking kind -> ProductSalesScore column it is ordered by
+ORDER_FIELDS = {
+    'best_seller': 'units',
+    'trending': 'trending',
+}
+
+
+def _decay_exponent(moment):
+    """log2 weight of a sale at `moment`: half-lives since RANKING_EPOCH"""
+    return (moment - RANKING_EPOCH) / TRENDING_HALF_LIFE
+
+
+def _take_off(total, part):
+    """log2(2 ** total - 2 ** part): a trending score with one sale taken off"""
+    if part >= total:
+        # What is left is below float precision of the total
+        return total - 53
+    return total + float(np.log2(-np.expm1((part - total) * np.log(2))))
+
+
+def _score(batch, touched_categories, refunds=False):
+    """
+    Add a batch of paid orders to the product sales scores, or take refunded ones off
+
+    Args:
+        batch: List of (id, paid_at or refunded_at, total_amount) from rollups.consume
+        touched_categories: Set the categories of the sold products are added to
+        refunds: The batch holds refunded orders, whose sales are taken off
+    """
+    if refunds:
+        # Taken off with the weight of the sale, i.e. of when it was paid
+        batch = Order.objects.filter(id__in=[order_id for order_id, _, _ in batch]).values_list(
+            'id', 'paid_at', 'total_amount'
+        )
+    weights = {order_id: _decay_exponent(paid_at) for order_id, paid_at, _ in batch}
+    items = list(
+        OrderItem.objects.filter(order_id__in=weights, product__isnull=False)
+        .values_list('order_id', 'product_id', 'product__category_id', 'quantity')
+    )
+    if not items:
+        return
+    order_ids, product_ids, category_ids, quantities = zip(*items)
+    touched_categories.update(category_ids)
+
+    quantities = np.array(quantities, dtype=np.float64)
+    exponents = np.log2(quantities) + np.array([weights[order_id] for order_id in order_ids])
+    products, inverse = np.unique(np.array(product_ids, dtype=np.int64), return_inverse=True)
+    units = np.bincount(inverse, weights=quantities)
+    # Sum 2 ** exponent per product without ever leaving log space
+    trending = np.full(len(products), -np.inf)
+    np.logaddexp2.at(trending, inverse, exponents)
+
+    existing = ProductSalesScore.objects.select_for_update().in_bulk(products.tolist())
+    changed, created, emptied = [], [], []
+    for product_id, sold, score in zip(products.tolist(), units.tolist(), trending.tolist()):
+        row = existing.get(product_id)
+        if refunds:
+            # Sales are scored before their refunds, so the row is there
+            if row is None:
+                continue
+            row.units = max(row.units - int(sold), 0)
+            if not row.units:
+                emptied.append(product_id)
+                continue
+            row.trending = _take_off(row.trending, score)
+            changed.append(row)
+        elif row is None:
+            created.append(ProductSalesScore(product_id=product_id, units=int(sold), trending=score))
+        else:
+            row.units += int(sold)
+            row.trending = float(np.logaddexp2(row.trending, score))
+            changed.append(row)
+    ProductSalesScore.objects.bulk_update(changed, ['units', 'trending'], batch_size=rollups.BATCH_SIZE)
+    ProductSalesScore.objects.bulk_create(created, batch_size=rollups.BATCH_SIZE)
+    # Products with every sale refunded are no longer ranked
+    ProductSalesScore.objects.filter(pk__in=emptied).delete()
+
+
+def _ranking_rows(kind, category_ids, size, now_exponent):
+    """
+    Build the top `size` ProductRanking rows of one kind
+
+    Args:
+        kind: 'best_seller' or 'trending'
+        category_ids: Categories to rank, or None for the whole catalog
+        size: Products per list
+        now_exponent: _decay_exponent(now), turning trending into units per half-life
+    """
+    field = ORDER_FIELDS[kind]
+    scores = ProductSalesScore.objects.filter(product__available=True)
+    if category_ids is None:
+        top = (
+            scores.order_by(F(field).desc(), 'product_id')
+            .values_list('product_id', field)[:size]
+        )
+        rows = [(None, product_id, value) for product_id, value in top]
+    else:
+        # Top-N per category in one query
+        top = (
+            scores.filter(product__category_id__in=category_ids)
+            .annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F('product__category_id'),
+                order_by=(F(field).desc(), F('product_id').asc()),
+            ))
+            .filter(row_number__lte=size)
+            .order_by('product__category_id', 'row_number')
+            .values_list('product__category_id', 'product_id', field)
+        )
+        rows = list(top)
+
+    ranking = []
+    position = {}
+    for category_id, product_id, value in rows:
+        position[category_id] = position.get(category_id, 0) + 1
+        score = float(2 ** (value - now_exponent)) if kind == 'trending' else float(value)
+        ranking.append(ProductRanking(
+            kind=kind, category_id=category_id, position=position[category_id],
+            product_id=product_id, score=score,
+        ))
+    return ranking
+
+
+def rebuild_rankings(category_ids=(), size=RANKING_SIZE, now=None):
+    """
+    Replace the whole-catalog rankings and those of the given categories
+
+    Args:
+        category_ids: Categories whose rankings are rebuilt
+        size: Products per list
+        now: Time trending scores are expressed at (default: timezone.now())
+    """
+    now_exponent = _decay_exponent(now or timezone.now())
+    category_ids = sorted(set(category_ids))
+    with transaction.atomic():
+        ProductRanking.objects.filter(category__isnull=True).delete()
+        ProductRanking.objects.filter(category_id__in=category_ids).delete()
+        rows = []
+        for kind in ORDER_FIELDS:
+            rows += _ranking_rows(kind, None, size, now_exponent)
+            if category_ids:
+                rows += _ranking_rows(kind, category_ids, size, now_exponent)
+        ProductRanking.objects.bulk_create(rows, batch_size=rollups.BATCH_SIZE)
+        # After commit, so no request caches the old lists again
+        transaction.on_commit(catalog.purge_rankings)
+
+
+def _score_new_orders(batch_size, now):
+    """Score the orders paid and refunded since the watermarks; return (count, touched category ids)"""
+    touched_categories = set()
+    total = rollups.consume(
+        WATERMARK,
+        lambda batch: _score(batch, touched_categories),
+        batch_size=batch_size,
+        now=now,
+    )
+    # After the sales, so every refund finds the sale it takes off
+    total += rollups.consume(
+        REFUNDS_WATERMARK,
+        lambda batch: _score(batch, touched_categories, refunds=True),
+        batch_size=batch_size,
+        now=now,
+        field='refunded_at',
+    )
+    return total, touched_categories
+
+
+def refresh(batch_size=rollups.BATCH_SIZE, size=RANKING_SIZE, now=None):
+    """
+    Score the orders paid and refunded since the last run and rebuild the affected rankings
+
+    Returns:
+        (payments and refunds scored, categories re-ranked)
+    """
+    total, touched_categories = _score_new_orders(batch_size, now)
+    if total:
+        rebuild_rankings(touched_categories, size=size, now=now)
+    return total, len(touched_categories)
+
+
+def rebuild(batch_size=rollups.REBUILD_BATCH_SIZE, size=RANKING_SIZE, now=None):
+    """
+    Recompute every score and ranking from all payments and refunds
+
+    Needed after products move between categories or order history is
+    rewritten; refresh() only adds new sales and refunds.
+
+    Returns:
+        (payments and refunds scored, categories re-ranked)
+    """
+    with transaction.atomic():
+        ProductSalesScore.objects.all().delete()
+        RollupWatermark.objects.filter(name__in=[WATERMARK, REFUNDS_WATERMARK]).delete()
+    total, _ = _score_new_orders(batch_size, now)
+    # Every category, so ones without sales lose their old lists too
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    with transaction.atomic():
+        ProductRanking.objects.all().delete()
+        rebuild_rankings(category_ids, size=size, now=now)
+    return total, len(category_ids)
@@ -0,0 +1,268 @@
+"""
+Store Search
+Full-text product search backed by SQLite FTS5 or a PostgreSQL tsvector table
+"""
+
+import re
+from django.db import connection
+from django.db.models import Q
+from .models import Product
+
+
+# Name hits are weighted well above description hits when ranking
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Ignore anything past this many search terms
+MAX_TERMS = 8
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def get_terms(query):
+    """Split a raw search string into lowercase word terms"""
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def is_supported():
+    """Check if the current database has a full-text index backend"""
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+# ---------------------------------------------------------------------------
+# Index maintenance
+# ---------------------------------------------------------------------------
+
+def index_products(products):
+    """
+    Add or refresh the search index entries for the given products
+
+    Args:
+        products: Iterable of Product instances (only id, name, description are used)
+    """
+    rows = [(p.id, p.name, p.description) for p in products]
+    if not rows or not is_supported():
+        return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(
+                'DELETE FROM store_product_fts WHERE rowid = %s',
+                [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                'INSERT INTO store_product_fts (rowid, name, description) '
+                'VALUES (%s, %s, %s)',
+                rows
+            )
+        else:
+            cursor.executemany(
+                "INSERT INTO store_product_search (product_id, document) "
+                "VALUES (%s, setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'B')) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                rows
+            )
+
+
+def unindex_products(product_ids):
+    """
+    Remove search index entries for the given product ids
+    """
+    product_ids = list(product_ids)
+    if not product_ids or not is_supported():
+        return
+
+    table, column = (
+        ('store_product_fts', 'rowid')
+        if connection.vendor == 'sqlite'
+        else ('store_product_search', 'product_id')
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {table} WHERE {column} = %s',
+            [(product_id,) for product_id in product_ids]
+        )
+
+
+def clear_index():
+    """
+    Remove every entry from the search index
+    """
+    if not is_supported():
+        return
+
+    table = 'store_product_fts' if connection.vendor == 'sqlite' else 'store_product_search'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}')
+
+
+def rebuild_index(batch_size=1000, progress=None):
+    """
+    Rebuild the whole search index in primary key order, one batch at a time
+
+    Args:
+        batch_size: Number of products read and indexed per batch
+        progress: Optional callable receiving the running count after each batch
+
+    Returns:
+        Total number of products indexed
+    """
+    clear_index()
+
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Product.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'name', 'description')[:batch_size]
+        )
+        if not batch:
+            break
+
+        index_products(batch)
+        indexed += len(batch)
+        last_id = batch[-1].id
+        if progress:
+            progress(indexed)
+
+    return indexed
+
+
+# ---------------------------------------------------------------------------
+# Querying
+# ---------------------------------------------------------------------------
+
+def _match_expression(terms):
+    """Build a prefix-matching query string for the active backend"""
+    if connection.vendor == 'sqlite':
+        return ' '.join(f'"{term}"*' for term in terms)
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def _sqlite_sql(select, ranked):
+    sql = (
+        f'SELECT {select} FROM store_product_fts '
+        'JOIN store_product ON store_product.id = store_product_fts.rowid '
+        'WHERE store_product_fts MATCH %s AND store_product.available'
+    )
+    if ranked:
+        sql += (
+            f' ORDER BY bm25(store_product_fts, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}),'
+            ' store_product.created_at DESC LIMIT %s OFFSET %s'
+        )
+    return sql
+
+
+def _postgresql_sql(select, ranked):
+    sql = (
+        f'SELECT {select} FROM store_product_search '
+        'JOIN store_product ON store_product.id = store_product_search.product_id '
+        "WHERE store_product_search.document @@ to_tsquery('simple', %s) "
+        'AND store_product.available'
+    )
+    if ranked:
+        sql += (
+            " ORDER BY ts_rank(store_product_search.document, to_tsquery('simple', %s)) DESC,"
+            ' store_product.created_at DESC LIMIT %s OFFSET %s'
+        )
+    return sql
+
+
+class SearchResults:
+    """
+    Lazily evaluated, ranked search results
+
+    Behaves like a sliceable sequence so it can be handed straight to
+    Paginator. Counting and slicing each run a single indexed query; only
+    the products of the requested slice are loaded from the catalog.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.terms = get_terms(query)
+        self._count = None
+
+    def _fallback_queryset(self):
+        """Substring search for databases without a full-text backend"""
+        condition = Q()
+        for term in self.terms:
+            condition &= Q(name__icontains=term) | Q(description__icontains=term)
+        return Product.objects.available().filter(condition)
+
+    def count(self):
+        """Return the number of matching products"""
+        if self._count is None:
+            if not self.terms:
+                self._count = 0
+            elif not is_supported():
+                self._count = self._fallback_queryset().count()
+            else:
+                build = _sqlite_sql if connection.vendor == 'sqlite' else _postgresql_sql
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        build('COUNT(*)', ranked=False),
+                        [_match_expression(self.terms)]
+                    )
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def ranked_ids(self, offset, limit):
+        """
+        Return the ids of matching products, best match first
+
+        Args:
+            offset: Number of ranked results to skip
+            limit: Maximum number of ids to return
+        """
+        if not self.terms or limit <= 0:
+            return []
+
+        if not is_supported():
+            return list(
+                self._fallback_queryset()
+                .values_list('id', flat=True)[offset:offset + limit]
+            )
+
+        match = _match_expression(self.terms)
+        if connection.vendor == 'sqlite':
+            sql = _sqlite_sql('store_product.id', ranked=True)
+            params = [match, limit, offset]
+        else:
+            sql = _postgresql_sql('store_product.id', ranked=True)
+            params = [match, match, limit, offset]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = key.start or 0
+            stop = key.stop if key.stop is not None else self.count()
+            ids = self.ranked_ids(start, stop - start)
+        else:
+            ids = self.ranked_ids(key, 1)
+            if not ids:
+                raise IndexError(key)
+
+        products = Product.objects.for_listing().in_bulk(ids)
+        results = [products[pk] for pk in ids if pk in products]
+        return results if isinstance(key, slice) else results[0]
+
+
+def search_products(query):
+    """
+    Search available products by name and description
+
+    Args:
+        query: Raw search string from the user
+
+    Returns:
+        SearchResults ordered by relevance (name hits rank above description hits)
+    """
+    return SearchResults(query)
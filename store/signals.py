@@ -0,0 +1,47 @@
+"""
+Store Signals
+Keeps the search index, cached catalog entries and image derivatives in sync with catalog changes
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Product
+from . import catalog, images, search
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """Refresh the search entry whenever a product is saved"""
+    if raw:
+        # Skip fixture loading; run rebuild_search_index afterwards
+        return
+    search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Drop the search entry when a product is deleted"""
+    search.unindex_products([instance.id])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def purge_product(sender, instance, **kwargs):
+    """Purge cached entries tagged with a changed product"""
+    catalog.purge_products([instance.id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_category(sender, instance, **kwargs):
+    """Purge the category menu and product sets showing a changed category"""
+    catalog.purge_categories()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def prepare_image_derivatives(sender, instance, raw=False, **kwargs):
+    """Render image derivatives on upload so the first visitor does not wait"""
+    if raw or not instance.image:
+        return
+    images.get_derivatives(instance.image)
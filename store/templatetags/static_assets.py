@@ -0,0 +1,46 @@
+"""
+Static Asset Template Tags
+Inlines the critical CSS subset into pages so first paint needs no stylesheet request
+"""
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+# Inlining a large file would cost more than the request it saves
+MAX_INLINE_BYTES = 14 * 1024
+
+_inline_cache = {}
+
+
+def _read_static(path):
+    """Read a static file from STATIC_ROOT, falling back to the finders"""
+    if staticfiles_storage.exists(path):
+        with staticfiles_storage.open(path) as handle:
+            return handle.read().decode()
+    found = finders.find(path)
+    if found:
+        with open(found, encoding='utf-8') as handle:
+            return handle.read()
+    return ''
+
+
+@register.simple_tag
+def critical_css():
+    """
+    Return settings.CRITICAL_CSS for inlining in a <style> block
+
+    Returns an empty string when inlining is disabled or the file is
+    missing or too large, so templates can fall back to a plain <link>.
+    """
+    path = getattr(settings, 'CRITICAL_CSS', None)
+    if not path:
+        return ''
+    if path not in _inline_cache or settings.DEBUG:
+        content = _read_static(path)
+        _inline_cache[path] = content if len(content.encode()) <= MAX_INLINE_BYTES else ''
+    return mark_safe(_inline_cache[path])
@@ -0,0 +1,42 @@
+"""
+Store Template Tags
+Helpers for rendering cached product cards and responsive images
+"""
+
+from django import template
+from ..cards import render_cards
+from ..images import get_derivatives
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_cards(products, variant='listing'):
+    """
+    Render a list of cached product cards
+
+    Usage:
+        {% product_cards products 'listing' as cards %}
+        {% for card in cards %}<div class="col">{{ card }}</div>{% endfor %}
+    """
+    return render_cards(products, variant)
+
+
+@register.inclusion_tag('store/includes/picture.html')
+def responsive_image(image, preset, alt='', css_class='', style=''):
+    """
+    Render a <picture> with WebP and JPEG srcsets for an image preset
+
+    Falls back to the original upload if no derivatives can be made.
+
+    Usage:
+        {% responsive_image product.image 'card' alt=product.name css_class='card-img-top' %}
+    """
+    derivatives = get_derivatives(image)
+    return {
+        'image': image,
+        'derivative': derivatives[preset] if derivatives else None,
+        'alt': alt,
+        'css_class': css_class,
+        'style': style,
+    }
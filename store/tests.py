@@ -1,3 +1,402 @@
-from django.test import TestCase
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+import numpy as np
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core import signing
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from orders import rollups
+from orders.models import Order, OrderItem
+from . import catalog, optimizer, rankings, search
+from .cards import card_key, render_cards
+from .models import Category, Product, ProductRanking, ProductSalesScore
+from .pagination import KeysetPaginator
+from .templatetags import static_assets
 
-# Create your tests here.
+
+class StaticPipelineTests(TestCase):
+    """
+    collectstatic produces hashed, precompressed files served with long-lived headers
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(STATIC_ROOT=static_root))
+        static_assets._inline_cache.clear()
+        # Compressing the admin's assets is slow, so collect once per class
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_hashed_urls(self):
+        url = static('css/style.css')
+        self.assertRegex(url, r'^/static/css/style\.[0-9a-f]{12}\.css$')
+
+        response = self.client.get('/')
+        self.assertContains(response, url)
+        self.assertContains(response, '<style>')
+        self.assertContains(response, '.navbar-brand')
+
+    def test_compressed_immutable_responses(self):
+        url = static('css/style.css')
+        name = re.sub(r'^/static/', '', url)
+        self.assertTrue(staticfiles_storage.exists(f'{name}.gz'))
+        self.assertTrue(staticfiles_storage.exists(f'{name}.br'))
+
+        for encoding in ('br', 'gzip'):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertIn('immutable', response['Cache-Control'])
+            response.close()
+
+
+class CatalogQueryCountTests(TestCase):
+    """
+    Store pages run a fixed number of queries however many products they show
+    """
+
+    def setUp(self):
+        # The test cache is shared by the whole run
+        cache.clear()
+        self.categories = [
+            Category.objects.create(name=f'Category {number}') for number in range(2)
+        ]
+        for category in self.categories:
+            for number in range(15):
+                Product.objects.create(
+                    category=category, name=f'{category.name} widget {number}',
+                    description='A sturdy widget', price=10, stock=number % 3,
+                    featured=number < 5,
+                )
+        self.product = Product.objects.filter(category=self.categories[0]).first()
+
+    def assertPageQueries(self, count, url, **extra):
+        with self.assertNumQueries(count):
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_home(self):
+        # Featured products, the rankings, then the category menu
+        response = self.assertPageQueries(3, reverse('store:home'))
+        self.assertEqual(len(response.context['featured_products']), 8)
+        # Featured set, rankings and category menu come from the cache afterwards
+        self.assertPageQueries(0, reverse('store:home'))
+
+    def test_product_list(self):
+        # The page, then its approximate total (cached for later pages)
+        response = self.assertPageQueries(2, reverse('store:product_list'))
+        page = response.context['products']
+        self.assertEqual(len(page), 12)
+        self.assertPageQueries(1, reverse('store:product_list'), data={'cursor': page.next_cursor})
+
+    def test_product_detail(self):
+        # Two validator queries, the product, then its related products
+        response = self.assertPageQueries(4, self.product.get_absolute_url())
+        self.assertEqual(len(response.context['related_products']), 4)
+
+    def test_category_products(self):
+        # Two validator queries, the category's rankings, the category,
+        # the page and its total
+        self.assertPageQueries(6, self.categories[1].get_absolute_url())
+
+    def test_search(self):
+        # Count, ranked ids, then the products of the page
+        response = self.assertPageQueries(3, reverse('store:search'), data={'q': 'widget'})
+        self.assertEqual(len(response.context['products']), 12)
+
+    def test_listing_loads_card_columns(self):
+        product = Product.objects.for_listing().get(pk=self.product.pk)
+        with self.assertNumQueries(0):
+            render_cards([product], 'listing')
+
+
+class CatalogCacheControlTests(TestCase):
+    """
+    Reverse proxies may only keep catalog pages every anonymous visitor shares
+    """
+
+    def setUp(self):
+        # The test cache is shared by the whole run
+        cache.clear()
+        category = Category.objects.create(name='Widgets')
+        self.product = Product.objects.create(
+            category=category, name='Widget', description='A widget', price=10, stock=5,
+        )
+
+    def test_page_with_csrf_token_is_private(self):
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertIn('csrftoken', response.cookies)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        # Visitors who already have the cookie still get a token of their own
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_shared_page_is_public(self):
+        self.product.stock = 0
+        self.product.save()
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        self.assertNotIn('csrftoken', response.cookies)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=60', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+
+class KeysetPaginatorTests(TestCase):
+    """
+    Cursor pages walk the ordering both ways without gaps or repeats
+    """
+
+    def setUp(self):
+        category = Category.objects.create(name='Widgets')
+        products = [
+            Product.objects.create(
+                category=category, name=f'Widget {number}', description='A widget', price=10, stock=1,
+            )
+            for number in range(8)
+        ]
+        # Five products share one created_at, so ties across page boundaries are settled by id
+        now = timezone.now()
+        for product, age in zip(products, (0, 2, 2, 2, 2, 2, 3, 1)):
+            Product.objects.filter(pk=product.pk).update(created_at=now - timedelta(hours=age))
+        self.expected = [products[index].id for index in (0, 7, 5, 4, 3, 2, 1, 6)]
+        self.paginator = KeysetPaginator(Product.objects.all(), per_page=3)
+
+    def ids(self, page):
+        return [product.id for product in page]
+
+    def test_forward_and_backward(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual([product_id for page in pages for product_id in self.ids(page)], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self.paginator.page(page.previous_cursor)
+            self.assertEqual(self.ids(page), self.ids(expected))
+            self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+    def test_invalid_cursors_fall_back_to_the_first_page(self):
+        first = self.ids(self.paginator.page())
+        cursor = self.paginator.page().next_cursor
+        forged = signing.dumps({'k': ['2000-01-01T00:00:00Z', '1'], 'd': 'n'}, salt='other')
+        for token in ('garbage', cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B'), forged):
+            self.assertEqual(self.ids(self.paginator.page(token)), first)
+
+    def test_page_numbers(self):
+        page = self.paginator.page(page_number='2')
+        self.assertEqual(self.ids(page), self.expected[3:6])
+        self.assertEqual(self.ids(self.paginator.page(page.previous_cursor)), self.expected[:3])
+
+        for number in ('0', '-1', 'abc', None):
+            self.assertEqual(self.ids(self.paginator.page(page_number=number)), self.expected[:3])
+
+        page = self.paginator.page(page_number='99')
+        self.assertEqual(len(page), 0)
+        self.assertFalse(page.has_other_pages())
+
+
+class ProductSearchTests(TestCase):
+    """
+    The full-text index follows product changes and ranks name matches first
+    """
+
+    def setUp(self):
+        # The test cache is shared by the whole run
+        cache.clear()
+        self.category = Category.objects.create(name='Lighting')
+
+    def create(self, name, description, **fields):
+        return Product.objects.create(
+            category=self.category, name=name, description=description, price=10, stock=1, **fields
+        )
+
+    def names(self, query):
+        results = search.search_products(query)
+        return [product.name for product in results[:results.count()]]
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(self.names('walnut'), [])
+        product = self.create('Walnut Desk', 'A writing desk')
+        self.assertEqual(self.names('walnut'), ['Walnut Desk'])
+        self.assertEqual(self.names('wal des'), ['Walnut Desk'])
+
+        product.name = 'Oak Desk'
+        product.save()
+        self.assertEqual(self.names('walnut'), [])
+        self.assertEqual(self.names('oak'), ['Oak Desk'])
+
+        product.delete()
+        self.assertEqual(self.names('oak'), [])
+        self.assertEqual(search.search_products('oak').count(), 0)
+
+    def test_name_matches_rank_first(self):
+        lamp = self.create('Brass Lamp', 'Warm light for a reading corner')
+        # Newer, and mentions the term more often, but only in its description
+        shade = self.create('Linen Shade', 'Fits any lamp: floor lamp, desk lamp or table lamp')
+        Product.objects.filter(pk=shade.pk).update(created_at=lamp.created_at + timedelta(days=1))
+        self.create('Hidden Lamp', 'Not for sale', available=False)
+
+        self.assertEqual(self.names('lamp'), ['Brass Lamp', 'Linen Shade'])
+        self.assertEqual(search.search_products('lamp').count(), 2)
+
+        response = self.client.get(reverse('store:search'), {'q': 'lamp'})
+        self.assertContains(response, 'Brass Lamp')
+        self.assertNotContains(response, 'Hidden Lamp')
+
+    def test_rebuild_index(self):
+        self.create('Walnut Desk', 'A writing desk')
+        search.clear_index()
+        self.assertEqual(self.names('walnut'), [])
+        self.assertEqual(search.rebuild_index(), 1)
+        self.assertEqual(self.names('walnut'), ['Walnut Desk'])
+
+
+class ProductRankingTests(TestCase):
+    """
+    Best-seller and trending rankings are refreshed incrementally and read in one query
+    """
+
+    def setUp(self):
+        # The test cache is shared by the whole run
+        cache.clear()
+        self.user = User.objects.create_user('customer', 'customer@example.com', 'password')
+        self.books, self.games = (
+            Category.objects.create(name=name) for name in ('Books', 'Games')
+        )
+        self.novel, self.atlas = (
+            Product.objects.create(category=self.books, name=name, description='A book', price=10, stock=50)
+            for name in ('Novel', 'Atlas')
+        )
+        self.chess = Product.objects.create(
+            category=self.games, name='Chess', description='A game', price=30, stock=50
+        )
+        self.now = timezone.now()
+
+    def pay(self, days_ago, *lines):
+        order = Order.objects.create(
+            user=self.user, first_name='A', last_name='B', email='a@example.com',
+            phone='1', address='Street', city='City', state='State',
+            postal_code='1', country='Country', total_amount=0,
+        )
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, price=product.price, quantity=quantity)
+        Order.objects.filter(id=order.id).update(
+            payment_status='completed', paid_at=self.now - timedelta(days=days_ago)
+        )
+        return order
+
+    def ranking(self, kind, category=None):
+        return list(
+            ProductRanking.objects.filter(kind=kind, category=category)
+            .order_by('position').values_list('product__name', flat=True)
+        )
+
+    def test_best_sellers_and_trending(self):
+        # The atlas sold more, but weeks ago; the novel sold this week
+        self.pay(30, (self.atlas, 10))
+        self.pay(1, (self.novel, 4), (self.chess, 1))
+
+        self.assertEqual(rankings.refresh(now=self.now), (2, 2))
+        self.assertEqual(self.ranking('best_seller'), ['Atlas', 'Novel', 'Chess'])
+        self.assertEqual(self.ranking('trending'), ['Novel', 'Chess', 'Atlas'])
+        self.assertEqual(self.ranking('best_seller', self.games), ['Chess'])
+        trending = ProductRanking.objects.get(kind='trending', category=None, position=1)
+        self.assertAlmostEqual(trending.score, 4 * 2 ** (-1 / 7))
+
+    def test_refunds_take_their_sales_off(self):
+        self.pay(30, (self.atlas, 10))
+        recent = self.pay(1, (self.atlas, 2), (self.novel, 4))
+        self.pay(2, (self.chess, 1))
+        refunded = self.pay(1, (self.chess, 5))
+        rankings.refresh(now=self.now)
+        self.assertEqual(self.ranking('trending'), ['Chess', 'Novel', 'Atlas'])
+
+        for order in (recent, refunded):
+            order.refresh_from_db()
+            order.payment_status = 'refunded'
+            order.save()
+        later = timezone.now() + rollups.SETTLE_DELAY
+        self.assertEqual(rankings.refresh(now=later), (2, 2))
+        self.assertEqual(self.ranking('best_seller'), ['Atlas', 'Chess'])
+        self.assertEqual(self.ranking('trending'), ['Chess', 'Atlas'])
+        self.assertEqual(ProductSalesScore.objects.get(product=self.atlas).units, 10)
+        self.assertAlmostEqual(
+            ProductSalesScore.objects.get(product=self.atlas).trending,
+            rankings._decay_exponent(self.now - timedelta(days=30)) + np.log2(10),
+        )
+        self.assertFalse(ProductSalesScore.objects.filter(product=self.novel).exists())
+        self.assertEqual(rankings.rebuild(now=later), (6, 2))
+        self.assertEqual(self.ranking('best_seller'), ['Atlas', 'Chess'])
+
+    def test_refresh_is_incremental(self):
+        self.pay(2, (self.novel, 1))
+        rankings.refresh(now=self.now)
+        self.assertEqual(rankings.refresh(now=self.now), (0, 0))
+
+        # Only the games category is re-ranked; the books ranking is kept
+        self.pay(1, (self.chess, 3))
+        self.assertEqual(rankings.refresh(now=self.now), (1, 1))
+        self.assertEqual(self.ranking('best_seller'), ['Chess', 'Novel'])
+        self.assertEqual(self.ranking('best_seller', self.books), ['Novel'])
+        self.assertEqual(ProductSalesScore.objects.get(product=self.chess).units, 3)
+        self.assertEqual(rankings.rebuild(now=self.now), (2, 2))
+        self.assertEqual(self.ranking('trending'), ['Chess', 'Novel'])
+
+    def test_pages_read_rankings(self):
+        self.pay(1, (self.novel, 2), (self.atlas, 1))
+        rankings.refresh(now=self.now)
+        Product.objects.filter(id=self.atlas.id).update(available=False)
+
+        with self.assertNumQueries(1):
+            ranked = catalog.ranked_products(self.books.id)
+        self.assertEqual(ranked['best_seller'], [self.novel])
+
+        response = self.client.get(reverse('store:home'))
+        self.assertEqual(response.context['best_sellers'], [self.novel])
+        self.assertContains(response, 'Trending Now')
+        response = self.client.get(self.books.get_absolute_url())
+        self.assertContains(response, 'Best Sellers in Books')
+
+
+class OptimizerCacheTests(TestCase):
+    """
+    Rewriting image paths expires the cached cards that showed the old file
+    """
+
+    def test_rewrite_paths_moves_card_keys(self):
+        category = Category.objects.create(name='Widgets', image='categories/old.png')
+        product = Product.objects.create(
+            category=category, name='Widget', description='A widget', price=10,
+            stock=1, image='products/old.png',
+        )
+        product = Product.objects.for_listing().get(pk=product.pk)
+        old_key = card_key(product, 'listing')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            optimizer._rewrite_paths([
+                ([(Product, product.pk)], 'products/new.webp'),
+                ([(Category, category.pk)], 'categories/new.webp'),
+            ])
+        self.assertEqual(len(callbacks), 2)
+
+        product = Product.objects.for_listing().get(pk=product.pk)
+        self.assertEqual(product.image.name, 'products/new.webp')
+        self.assertEqual(product.category.version, category.version + 1)
+        self.assertNotEqual(card_key(product, 'listing'), old_key)
@@ -3,47 +3,60 @@ Store Views
 Handles home page, product listing, product detail, search, and category filtering
 """
 
+import hashlib
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q
+from ecommerce_project.stale import stale_while_revalidate
 from .models import Product, Category
+from . import catalog
+from .http import (
+    category_validator, conditional_page, home_validator, product_validator
+)
+from .pagination import KeysetPaginator, SequencePaginator
+from .search import search_products
 
+# Products shown per listing page
+PRODUCTS_PER_PAGE = 12
 
+# Catalog changes that make a stored page stale
+CATALOG_TAGS = (catalog.PRODUCTS_TAG, catalog.CATEGORIES_TAG)
+# Pages that also show the materialized rankings
+RANKED_TAGS = CATALOG_TAGS + (catalog.RANKINGS_TAG,)
+
+
+@conditional_page(home_validator)
+@stale_while_revalidate('store:home', tags=RANKED_TAGS)
 def home(request):
     """
-    Home page view with featured products and categories
+    Home page view with featured, best-selling and trending products and categories
     """
-    featured_products = Product.objects.filter(
-        featured=True, 
-        available=True
-    )[:8]
-    categories = Category.objects.all()[:6]
-    
+    # Hot keys, rebuilt by a single request per expiry
+    ranked = catalog.ranked_products()
     context = {
-        'featured_products': featured_products,
-        'categories': categories,
+        'featured_products': catalog.featured_products(),
+        'best_sellers': ranked['best_seller'],
+        'trending_products': ranked['trending'],
+        'categories': catalog.menu_categories(),
     }
     return render(request, 'store/home.html', context)
 
 
+@stale_while_revalidate('store:product_list', tags=CATALOG_TAGS)
 def product_list(request):
     """
     Display all available products with pagination
     """
-    products = Product.objects.filter(available=True)
-    
-    # Pagination - 12 products per page
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page')
+    products = Product.objects.for_listing()
     
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        # If page is not an integer, deliver first page
-        products = paginator.page(1)
-    except EmptyPage:
-        # If page is out of range, deliver last page
-        products = paginator.page(paginator.num_pages)
+    # Cursor pagination on the (available, -created_at) index
+    paginator = KeysetPaginator(
+        products,
+        PRODUCTS_PER_PAGE,
+        total_cache_key='store:product_list:total'
+    )
+    products = paginator.page(
+        cursor=request.GET.get('cursor'),
+        page_number=request.GET.get('page')
+    )
     
     context = {
         'products': products,
@@ -52,83 +65,77 @@ def product_list(request):
     return render(request, 'store/product_list.html', context)
 
 
+@conditional_page(product_validator)
+@stale_while_revalidate('store:product_detail', tags=CATALOG_TAGS)
 def product_detail(request, slug):
     """
     Display individual product details
     """
-    product = get_object_or_404(
-        Product, 
-        slug=slug, 
-        available=True
-    )
+    product = get_object_or_404(Product.objects.for_detail(), slug=slug)
     
     # Get related products from same category
-    related_products = Product.objects.filter(
-        category=product.category,
-        available=True
-    ).exclude(id=product.id)[:4]
+    related_products = Product.objects.related_to(product)[:4]
     
     context = {
         'product': product,
         'related_products': related_products,
     }
-    return render(request, 'store/product_detail.html', context)
+    return render(request, 'store/product_details.html', context)
 
 
+@conditional_page(category_validator)
+@stale_while_revalidate('store:category_products', tags=RANKED_TAGS)
 def category_products(request, slug):
     """
     Display products filtered by category
     """
     category = get_object_or_404(Category, slug=slug)
-    products = Product.objects.filter(
-        category=category, 
-        available=True
-    )
-    
-    # Pagination
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page')
+    products = Product.objects.for_listing().filter(category=category)
     
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        products = paginator.page(1)
-    except EmptyPage:
-        products = paginator.page(paginator.num_pages)
+    # Cursor pagination
+    paginator = KeysetPaginator(
+        products,
+        PRODUCTS_PER_PAGE,
+        total_cache_key=f'store:category:{category.id}:total'
+    )
+    products = paginator.page(
+        cursor=request.GET.get('cursor'),
+        page_number=request.GET.get('page')
+    )
     
     context = {
         'category': category,
         'products': products,
         'page_title': f'{category.name} Products',
+        # Shown above the first page only
+        'best_sellers': (
+            [] if products.has_previous()
+            else catalog.ranked_products(category.id)['best_seller']
+        ),
     }
     return render(request, 'store/product_list.html', context)
 
 
 def search(request):
     """
-    Search products by name or description
+    Search products by name or description using the full-text index
     """
     query = request.GET.get('q', '')
-    products = Product.objects.none()
     
-    if query:
-        # Search in product name and description
-        products = Product.objects.filter(
-            Q(name__icontains=query) | 
-            Q(description__icontains=query),
-            available=True
-        ).distinct()
+    # Ranked results; name hits come before description hits
+    products = search_products(query)
     
-    # Pagination
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page')
-    
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        products = paginator.page(1)
-    except EmptyPage:
-        products = paginator.page(paginator.num_pages)
+    # Cursor pagination over the ranked results
+    terms_key = hashlib.md5(' '.join(products.terms).encode()).hexdigest()
+    paginator = SequencePaginator(
+        products,
+        PRODUCTS_PER_PAGE,
+        total_cache_key=f'store:search:{terms_key}:total'
+    )
+    products = paginator.page(
+        cursor=request.GET.get('cursor'),
+        page_number=request.GET.get('page')
+    )
     
     context = {
         'products': products,